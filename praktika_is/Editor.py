@@ -1,30 +1,82 @@
 import json
 import sys
 import os
-import random
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import xml.etree.ElementTree as ET
-from math import atan2, sin, cos
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QPushButton, QDialog, QLineEdit,
     QLabel, QHBoxLayout, QMessageBox, QComboBox, QFormLayout, QGraphicsScene, QGraphicsView,
-    QGraphicsItem, QGraphicsRectItem, QGraphicsEllipseItem, QGraphicsPathItem, QGraphicsTextItem,
-    QMenu, QColorDialog, QDialogButtonBox, QGraphicsPolygonItem, QAction, QFileDialog, QInputDialog
+    QGraphicsItem, QGraphicsRectItem, QGraphicsEllipseItem, QGraphicsPathItem, QGraphicsLineItem,
+    QMenu, QColorDialog, QDialogButtonBox, QAction, QFileDialog, QInputDialog,
+    QStyleOptionGraphicsItem, QProgressDialog, QListWidget, QListWidgetItem
 )
-from PyQt5.QtCore import Qt, QRectF, QPointF, QPoint
+from PyQt5.QtCore import Qt, QRect, QRectF, QPointF, QPoint, QLineF, QTimer, pyqtSignal
 from PyQt5.QtGui import (
-    QPainter, QColor, QPainterPath, QPen, QFont, QBrush,
-    QTransform, QPolygonF
+    QPainter, QColor, QPainterPath, QPen, QFont, QFontMetrics, QBrush,
+    QTransform, QPolygonF, QStaticText, QKeySequence, QMouseEvent
 )
 
-# Константы для стилей соединений
-LINE_STYLE_STRAIGHT = 0
-LINE_STYLE_POLYLINE = 1
-LINE_STYLE_CURVE = 2
+from history import (
+    AddConnection, AddDevice, AddGroup, CommandGroup, MoveDevices, RemoveConnection, RemoveDevice, RemoveGroup,
+    RestyleConnection, UndoStack
+)
+from importer import IMPORT_ERRORS, import_files
+from perf_stats import PERF, profiled
+from router import ROUTE_MARGIN, OrthogonalRouter, dogleg
+try:
+    from layout import force_directed_layout, layered_layout, place_new_devices
+except ImportError:  # без numpy автоматическая раскладка недоступна, устройства ставятся случайно
+    force_directed_layout = layered_layout = place_new_devices = None
+from schema_binary import binary_file_path, load_binary
+from schema_export import PAGE_SIZES, export_file
+from schema_tool import read_equipment_types
+from search_index import MATCH_CONNECTION, MATCH_DEVICE, MATCH_PORT, MATCH_TYPE
+from schema_model import (
+    LINE_STYLE_STRAIGHT, LINE_STYLE_POLYLINE, LINE_STYLE_CURVE,
+    END_STYLE_NONE, END_STYLE_ARROW, END_STYLE_CIRCLE, END_STYLE_SQUARE,
+    DEVICE_WIDTH, DEVICE_HEIGHT, PORT_SIZE, LABEL_MARGIN,
+    SchemaModel, SchemaError, SpatialGrid, port_offset, schema_file_path, write_schema_file
+)
+
+EXPORT_CONNECTION_CELL = 1000  # Размер ячейки сетки соединений при экспорте (длинные линии покрывают много ячеек)
+EXPORT_SELECTION_MARGIN = 20  # Поля вокруг выделения при экспорте его области
+IMPORT_REJECTS_SHOWN = 20  # Сколько отказов импорта показывается в окне итогов
+BULK_DRAG_SIZE = 50  # С какого числа выделенных элементов перетаскивание идет одной транзакцией
+AUTOSAVE_DELAY_MS = 500  # Окно, в течение которого изменения схемы объединяются в одно сохранение
+
+# Пороги детализации (масштаб вида), ниже которых элементы рисуются упрощенно
+LOD_TEXT = 0.6         # подписи портов и текст устройств
+LOD_DECORATIONS = 0.4  # окончания линий, сглаживание
+LOD_SIMPLE = 0.25      # порты квадратами, соединения прямыми линиями
+
+# Виртуализация: графические элементы создаются только около видимой области
+VIRTUAL_MARGIN = 0.5      # запас вокруг видимой области (доля ее размера)
+VIRTUAL_POOL_SIZE = 256   # сколько выгруженных устройств хранится для повторного использования
+
+ZOOM_STEP = 1.15
+MIN_ZOOM = 0.02
+MAX_ZOOM = 8.0
+
+PERF_OVERLAY_INTERVAL_MS = 500  # Период обновления панели замеров
+
+LOAD_CHUNK_MS = 15  # Время на создание элементов за один проход цикла событий при открытии схемы
+ROUTE_CHUNK_MS = 8  # Время на трассировку ломаных соединений за один проход цикла событий
+
+PORT_HIT_RADIUS = PORT_SIZE / 2 + 2  # Радиус попадания по порту
+SNAP_RADIUS = 30  # Радиус притягивания временной линии к свободному порту того же типа
 
-END_STYLE_NONE = 0
-END_STYLE_ARROW = 1
-END_STYLE_CIRCLE = 2
-END_STYLE_SQUARE = 3
+# Группы устройств (стойки, помещения)
+GROUP_NODE_WIDTH = 200   # Размер узла свернутой группы
+GROUP_NODE_HEIGHT = 80
+GROUP_FRAME_MARGIN = 20  # Отступ рамки развернутой группы от ее содержимого
+GROUP_LABEL_HEIGHT = 16  # Место под название группы над содержимым рамки
+GROUP_LINK_MAX_WIDTH = 10  # Предельная толщина сводной связи
+
+def level_of_detail(painter): #Текущий масштаб отрисовки элемента
+    return QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
 
 class ConnectionStyleDialog(QDialog): #Диалог настройки стилей соединений
     def __init__(self, connection=None, parent=None):
@@ -95,175 +147,421 @@ class ConnectionStyleDialog(QDialog): #Диалог настройки стил
             'width': int(self.width_spin.text())
         }
 
+class PortLabelItem(QGraphicsItem): #Подпись типа порта (дочерний элемент устройства)
+    _font = None
+    _texts = {}  # Текст -> подготовленный QStaticText, общий для всех подписей
+    GAP = 8  # Расстояние от центра порта до подписи
+
+    def __init__(self, port_item, parent):
+        super().__init__(parent)
+        self.setAcceptedMouseButtons(Qt.NoButton)
+        self.setZValue(200)
+        self.setPos(port_item.pos())
+        self.set_text(port_item.port_type, port_item.port_index % 2 == 0)
+
+    @classmethod
+    def static_font(cls): #Шрифт подписей (создается один раз)
+        if cls._font is None:
+            cls._font = QFont()
+        return cls._font
+
+    @classmethod
+    def static_text(cls, text): #Текст с однажды рассчитанной раскладкой
+        static = cls._texts.get(text)
+        if static is None:
+            static = QStaticText(text)
+            static.setPerformanceHint(QStaticText.AggressiveCaching)
+            static.prepare(QTransform(), cls.static_font())
+            cls._texts[text] = static
+        return static
+
+    @classmethod
+    def text_rect(cls, static, left): #Область подписи относительно центра порта
+        size = static.size()
+        x = -cls.GAP - size.width() if left else cls.GAP
+        return QRectF(x, -size.height() / 2, size.width(), size.height())
+
+    def set_text(self, text, left): #Задает текст; подпись левых портов стоит слева от порта
+        self.prepareGeometryChange()
+        self._static = self.static_text(text)
+        self._rect = self.text_rect(self._static, left)
+
+    def boundingRect(self):
+        return self._rect
+
+    def paint(self, painter, option, widget=None): #Подпись не рисуется при малом масштабе
+        if level_of_detail(painter) < LOD_TEXT:
+            return
+        painter.setFont(self.static_font())
+        painter.setPen(Qt.darkBlue)
+        painter.drawStaticText(self._rect.topLeft(), self._static)
+
+_port_colors = {}  # port_type -> QColor
+
+def port_type_color(port_type): #Цвет порта по его типу (считается один раз на тип)
+    color = _port_colors.get(port_type)
+    if color is None:
+        color = _port_colors[port_type] = QColor(hash(port_type) % 256,
+                                                 hash(port_type + "1") % 256,
+                                                 hash(port_type + "2") % 256)
+    return color
+
+def show_port_menu(scene, port, screen_pos): #Контекстное меню порта: удаление его соединения
+    if not scene or not hasattr(scene, 'get_connections_for_port'):
+        return
+
+    connections = scene.get_connections_for_port(port)
+    if not connections:
+        return
+
+    menu = QMenu()
+    delete_action = menu.addAction("Удалить соединение")
+    action = menu.exec_(screen_pos)
+
+    if action == delete_action:
+        for conn in connections:
+            scene.delete_connection(conn)
+
 class PortItem(QGraphicsEllipseItem): #Порт оборудования
-    def __init__(self, port_type, pos, size, parent, port_index):
+    def __init__(self, record, size, parent):
         super().__init__(-size//2, -size//2, size, size, parent)
-        self.port_type = port_type
         self.size = size
-        self.port_index = port_index
-        self.parent_name = parent.name  # Сохраняем имя родительского оборудования
-        self.unique_id = f"{self.parent_name}_{port_type}_{port_index}"  # Уникальный идентификатор
-        
-        self.setBrush(QBrush(QColor(hash(self.unique_id) % 256,
-                           hash(self.unique_id + "1") % 256,
-                           hash(self.unique_id + "2") % 256)))
+        self.bind(record)
         
-        self.setFlag(QGraphicsItem.ItemSendsScenePositionChanges, True)
         self.setZValue(100)
         self.setAcceptHoverEvents(True)
         self.setCursor(Qt.CrossCursor)
-        self.label = None
+        self.label = None  # PortLabelItem, создается устройством
+
+    def bind(self, record): #Связывает порт с записью модели (также при повторном использовании)
+        self.record = record  # PortRecord модели схемы
+        self.port_type = record.port_type
+        self.port_index = record.index
+        self.parent_name = record.device.name  # Сохраняем имя родительского оборудования
+        self.unique_id = record.unique_id  # Уникальный идентификатор
+        self.setBrush(QBrush(port_type_color(self.port_type)))
 
     def contextMenuEvent(self, event): #Показывает контекстное меню для удаления соединений
-        scene = self.scene()
-        if not scene or not hasattr(scene, 'get_connections_for_port'):
-            return
+        show_port_menu(self.scene(), self, event.screenPos())
 
-        connections = scene.get_connections_for_port(self)
-        if not connections:
+    def paint(self, painter, option, widget=None): #Упрощенная отрисовка порта при малом масштабе
+        if level_of_detail(painter) < LOD_SIMPLE:
+            painter.fillRect(self.rect(), self.brush())
             return
-
-        menu = QMenu()
-        delete_action = menu.addAction("Удалить соединение")
-        action = menu.exec_(event.screenPos())
-
-        if action == delete_action:
-            for conn in connections:
-                scene.delete_connection(conn)
+        super().paint(painter, option, widget)
 
     def shape(self): #Определяет область взаимодействия
         path = super().shape()
         path.addEllipse(self.rect().adjusted(-5, -5, 5, 5))
         return path
 
-    def add_label_to_scene(self, scene): #Добавляет подпись типа порта
-        self.label = QGraphicsTextItem(self.port_type)
-        self.label.setZValue(200)
-        self.label.setDefaultTextColor(Qt.darkBlue)
-        scene.addItem(self.label)
-        self.update_label_position()
-
-    def update_label_position(self): #Обновляет позицию подписи типа порта при перемещении
-        if not self.label:
-            return
-        port_pos = self.scenePos()
-        label_width = self.label.boundingRect().width()
-        label_height = self.label.boundingRect().height()
-        offset_y = -label_height / 2
-        if self.port_index % 2 == 0:
-            self.label.setPos(port_pos.x() - 10 - label_width, port_pos.y() + offset_y)
-        else:
-            self.label.setPos(port_pos.x() + 10, port_pos.y() + offset_y)
-
     def hoverEnterEvent(self, event): #Изменяет цвет при наведении курсора
         self.setBrush(QBrush(Qt.yellow))
         super().hoverEnterEvent(event)
 
     def hoverLeaveEvent(self, event): #Изменяет цвет при отводе курсора
-        color = QColor(hash(self.port_type) % 256,
-                     hash(self.port_type + "1") % 256,
-                     hash(self.port_type + "2") % 256)
-        self.setBrush(QBrush(color))
+        self.setBrush(QBrush(port_type_color(self.port_type)))
         super().hoverLeaveEvent(event)
 
-    def update_connections(self): #Обновляет связанные соединения при перемещении
-        scene = self.scene()
-        if scene and hasattr(scene, 'update_connections_for_port'):
-            scene.update_connections_for_port(self)
+class PortHandle: #Порт компактного устройства: не графический элемент, а точка на устройстве
+    __slots__ = ('device_item', 'record', 'offset')
 
-    def itemChange(self, change, value): #Обрабатывает изменения позиции устройтсва
-        if change == QGraphicsItem.ItemScenePositionHasChanged:
-            self.update_connections()
-            self.update_label_position()
-        return super().itemChange(change, value)
+    def __init__(self, device_item, record, offset):
+        self.device_item = device_item
+        self.record = record  # PortRecord модели схемы
+        self.offset = offset  # Положение центра порта относительно устройства
+
+    @property
+    def port_type(self):
+        return self.record.port_type
+
+    @property
+    def port_index(self):
+        return self.record.index
+
+    @property
+    def unique_id(self):
+        return self.record.unique_id
+
+    @property
+    def parent_name(self):
+        return self.record.device.name
+
+    def pos(self):
+        return self.offset
+
+    def scenePos(self): #Положение порта на сцене (устройства не поворачиваются и не масштабируются)
+        return self.device_item.pos() + self.offset
+
+    def parentItem(self):
+        return self.device_item
 
 class EquipmentItem(QGraphicsRectItem): #Графический элемент оборудования (экземпляр оборудования)
-    def __init__(self, rect, name, eq_type, ports, parent=None):
+    _font = None  # Шрифт подписи создается один раз на все устройства
+
+    def __init__(self, record, rect=None, parent=None):
+        if rect is None:
+            rect = QRectF(0, 0, DEVICE_WIDTH, DEVICE_HEIGHT)
         super().__init__(rect, parent)
-        self.name = name
-        self.eq_type = eq_type
-        self.ports = ports
-        self.port_size = 10
+        self.record = record  # DeviceRecord модели схемы
+        self.port_size = PORT_SIZE
+        self.pool_key = (record.eq_type, tuple(port.port_type for port in record.ports))
 
         self.setBrush(QBrush(Qt.white))
         self.setPen(QPen(Qt.black, 2))
-        self.setFlags(QGraphicsItem.ItemIsMovable | QGraphicsItem.ItemSendsGeometryChanges)
+        self.setFlags(QGraphicsItem.ItemIsMovable | QGraphicsItem.ItemIsSelectable |
+                      QGraphicsItem.ItemSendsGeometryChanges)
         self.setZValue(0)
 
-        self.text = f"{name} ({eq_type})"
-
-        self.port_items = []
-        for i, port in enumerate(ports):
-            port_pos = self.get_port_position(i, len(ports))
-            port_item = PortItem(port['type'], port_pos, self.port_size, self, i)
-            port_item.setPos(port_pos)
-            self.port_items.append(port_item)
-
-    def contextMenuEvent(self, event): #Показывает меня для удаления экземпляра оборудования
+        self.text = f"{self.name} ({self.eq_type})"
+        self.port_items = self.create_ports(record)
+
+    def create_ports(self, record): #Создает графические элементы портов с подписями
+        port_items = []
+        for port in record.ports:
+            port_item = PortItem(port, self.port_size, self)
+            port_item.setPos(self.get_port_position(port.index, len(record.ports)))
+            # Подпись - дочерний элемент устройства (а не порта, чтобы наведение
+            # на подпись не подсвечивало порт), поэтому двигается вместе с ним
+            port_item.label = PortLabelItem(port_item, self)
+            port_items.append(port_item)
+        return port_items
+
+    def bind(self, record): #Переиспользует элемент для другого устройства с тем же набором портов
+        self.record = record
+        self.text = f"{self.name} ({self.eq_type})"
+        for port_item, port in zip(self.port_items, record.ports):
+            port_item.bind(port)
+        self.update()
+
+    @property
+    def name(self):
+        return self.record.name
+
+    @property
+    def eq_type(self):
+        return self.record.eq_type
+
+    def contextMenuEvent(self, event): #Показывает меня для удаления экземпляра оборудования (или всего выделенного)
+        scene = self.scene()
+        selected = len(scene.selectedItems()) if scene and self.isSelected() else 0
         menu = QMenu()
-        delete_action = menu.addAction("Удалить оборудование")
+        if selected > 1:
+            delete_action = menu.addAction(f"Удалить выделенное ({selected})")
+        else:
+            delete_action = menu.addAction("Удалить оборудование")
+
+        component_action = downstream_action = path_action = None
+        if scene and hasattr(scene, 'select_path'):
+            menu.addSeparator()
+            component_action = menu.addAction("Выделить связанные устройства")
+            downstream_action = menu.addAction("Выделить нижестоящие устройства")
+            # Путь строится до единственного другого выделенного устройства
+            others = [item for item in scene.selectedItems()
+                      if isinstance(item, EquipmentItem) and item is not self]
+            if len(others) == 1:
+                target = others[0]
+                path_action = menu.addAction(f"Путь до {target.name}")
+
+        group_action = collapse_action = None
+        if scene and hasattr(scene, 'group_selection'):
+            menu.addSeparator()
+            group_action = menu.addAction("Сгруппировать выделенное..." if selected > 1 else "Создать группу...")
+            if self.record.group is not None:
+                collapse_action = menu.addAction(f"Свернуть группу {self.record.group.name}")
         action = menu.exec_(event.screenPos())
 
-        if action == delete_action:
-            scene = self.scene()
-            if scene and hasattr(scene, 'delete_equipment_item'):
+        if action is None:
+            return
+        if action == component_action:
+            scene.select_component(self.record)
+        elif action == downstream_action:
+            scene.select_downstream(self.record)
+        elif action == path_action:
+            if not scene.select_path(self.record, target.record):
+                QMessageBox.information(None, "Путь", f"Устройства {self.name} и {target.name} не связаны")
+        elif action == group_action:
+            if not self.isSelected():
+                scene.clearSelection()
+                self.setSelected(True)
+            scene.group_selection()
+        elif action == collapse_action:
+            scene.set_group_collapsed(self.record.group, True)
+        elif action == delete_action:
+            if selected > 1 and hasattr(scene, 'delete_selection'):
+                scene.delete_selection()
+            elif scene and hasattr(scene, 'delete_equipment_item'):
                 scene.delete_equipment_item(self)
 
-    def add_labels_to_scene(self, scene): #Добавляет подписи для всех портов на сцену
-        for port in self.port_items:
-            port.add_label_to_scene(scene)
+    def itemChange(self, change, value): #Передает перемещение устройства сцене для пакетного обновления
+        if change == QGraphicsItem.ItemPositionHasChanged:
+            scene = self.scene()
+            if scene and hasattr(scene, 'mark_device_moved'):
+                scene.remember_move_origin(self.record)
+                scene.model.move_device(self.record, value.x(), value.y())
+                scene.mark_device_moved(self)
+                scene.schedule_save()
+        return super().itemChange(change, value)
 
     def get_port_position(self, port_index, total_ports): #Вычисляет позицию порта на устройстве
         rect = self.rect()
-        port_side = port_index % 2
-        pos_on_side = (port_index // 2) + 1
-        ports_per_side = (total_ports + 1) // 2
-
-        if port_side == 0:
-            x = rect.left() - self.port_size // 2
-            y = rect.top() + rect.height() * pos_on_side // (ports_per_side + 1)
-        else:
-            x = rect.right() + self.port_size // 2
-            y = rect.top() + rect.height() * pos_on_side // (ports_per_side + 1)
-
-        return QPointF(x, y)
+        x, y = port_offset(port_index, total_ports, rect.width(), rect.height(), self.port_size)
+        return QPointF(rect.left() + x, rect.top() + y)
 
+    @profiled("EquipmentItem.paint")
     def paint(self, painter, option, widget=None): #Отрисовка текста внутри прямоугольника (устройства)
         super().paint(painter, option, widget)
-        painter.setFont(QFont("Arial", 8))
+        if level_of_detail(painter) < LOD_TEXT:
+            return
+        if EquipmentItem._font is None:
+            EquipmentItem._font = QFont("Arial", 8)
+        painter.setFont(EquipmentItem._font)
         text_rect = self.rect().adjusted(5, 5, -5, -5)
         painter.drawText(text_rect, Qt.AlignTop | Qt.AlignLeft, self.text)
 
+class CompactEquipmentItem(EquipmentItem): #Устройство одним элементом: порты и подписи рисуются им самим
+    def __init__(self, record, rect=None, parent=None):
+        self._hover_port = None
+        super().__init__(record, rect, parent)
+        self.setAcceptHoverEvents(True)
+
+    def create_ports(self, record): #Порты без графических элементов; геометрия рассчитывается один раз
+        size = self.port_size
+        port_items = []
+        self._port_rects = []
+        self._labels = []  # (QStaticText, левый верхний угол)
+        bounds = self.rect().adjusted(-1, -1, 1, 1)
+        shape = QPainterPath()
+        shape.addRect(self.rect())
+        for port in record.ports:
+            offset = self.get_port_position(port.index, len(record.ports))
+            port_items.append(PortHandle(self, port, offset))
+
+            port_rect = QRectF(offset.x() - size / 2, offset.y() - size / 2, size, size)
+            self._port_rects.append(port_rect)
+            shape.addEllipse(port_rect.adjusted(-5, -5, 5, 5))
+
+            static = PortLabelItem.static_text(port.port_type)
+            label_rect = PortLabelItem.text_rect(static, port.index % 2 == 0).translated(offset)
+            self._labels.append((static, label_rect.topLeft()))
+            bounds = bounds.united(port_rect.adjusted(-6, -6, 6, 6)).united(label_rect)
+        self._bounds = bounds
+        self._shape = shape
+        return port_items
+
+    def bind(self, record): #Переиспользует элемент для другого устройства с тем же набором портов
+        self.record = record
+        self.text = f"{self.name} ({self.eq_type})"
+        for handle, port in zip(self.port_items, record.ports):
+            handle.record = port
+        self._hover_port = None
+        self.update()
+
+    def boundingRect(self):
+        return self._bounds
+
+    def shape(self): #Прямоугольник устройства и увеличенные области портов
+        return self._shape
+
+    def port_at(self, pos): #Порт под точкой в координатах устройства или None
+        for handle, rect in zip(self.port_items, self._port_rects):
+            if rect.adjusted(-5, -5, 5, 5).contains(pos):
+                return handle
+        return None
+
+    def hoverMoveEvent(self, event): #Подсветка порта под курсором
+        port = self.port_at(event.pos())
+        index = port.port_index if port else None
+        if index != self._hover_port:
+            self._hover_port = index
+            if port:
+                self.setCursor(Qt.CrossCursor)
+            else:
+                self.unsetCursor()
+            self.update()
+        super().hoverMoveEvent(event)
+
+    def hoverLeaveEvent(self, event):
+        if self._hover_port is not None:
+            self._hover_port = None
+            self.unsetCursor()
+            self.update()
+        super().hoverLeaveEvent(event)
+
+    def contextMenuEvent(self, event): #Меню порта, если щелчок по порту, иначе меню устройства
+        port = self.port_at(event.pos())
+        if port:
+            show_port_menu(self.scene(), port, event.screenPos())
+        else:
+            super().contextMenuEvent(event)
+
+    def paint(self, painter, option, widget=None): #Отрисовка устройства, его портов и подписей
+        super().paint(painter, option, widget)
+        lod = level_of_detail(painter)
+        painter.setPen(QPen(Qt.black, 1))
+        for handle, rect in zip(self.port_items, self._port_rects):
+            color = Qt.yellow if handle.port_index == self._hover_port else port_type_color(handle.port_type)
+            if lod < LOD_SIMPLE:
+                painter.fillRect(rect, color)
+            else:
+                painter.setBrush(color)
+                painter.drawEllipse(rect)
+        if lod < LOD_TEXT:
+            return
+        painter.setFont(PortLabelItem.static_font())
+        painter.setPen(Qt.darkBlue)
+        for static, point in self._labels:
+            painter.drawStaticText(point, static)
+
 class ConnectionItem(QGraphicsPathItem): #Соединение между устройствами
-    def __init__(self, start_port, end_port, style=None):
+    def __init__(self, start_port, end_port, record, router=None):
         super().__init__()
         self.start_port = start_port
         self.end_port = end_port
+        self.record = record  # ConnectionRecord модели схемы (хранит стиль)
+        self.router = router  # OrthogonalRouter сцены для ломаных линий
+
+        self._caps = []
+        self._caps_rect = QRectF()
+        self._start = self._end = QPointF()
+        self.update_pen()
         
-        self.name = ""
-        self.line_style = LINE_STYLE_CURVE
-        self.start_style = END_STYLE_NONE
-        self.end_style = END_STYLE_ARROW
-        self.width = 2
-        self.color = QColor(Qt.black)
-        
-        if style:
-            self.apply_style(style)
-        
+        self.setFlag(QGraphicsItem.ItemIsSelectable)
         self.setZValue(10)
         self.update_path()
-    
+
+    @property
+    def name(self):
+        return self.record.name
+
+    @property
+    def line_style(self):
+        return self.record.line_style
+
+    @property
+    def start_style(self):
+        return self.record.start_style
+
+    @property
+    def end_style(self):
+        return self.record.end_style
+
+    @property
+    def width(self):
+        return self.record.width
+
     def apply_style(self, style): #Применяет параметры стиля к соединению
-        self.name = style.get('name', "")
-        self.line_style = style.get('line_style', LINE_STYLE_CURVE)
-        self.start_style = style.get('start_style', END_STYLE_NONE)
-        self.end_style = style.get('end_style', END_STYLE_ARROW)
-        self.width = style.get('width', 2)
-        self.color = QColor(style.get('color', Qt.black))
-        
+        self.record.apply_style(style)
+        if self.router is not None:
+            self.router.forget(self.record)
+        self.update_pen()
+
+    def update_pen(self): #Обновляет перо по стилю из модели
+        self.color = QColor(self.record.color)
         pen = QPen(self.color, self.width)
         self.setPen(pen)
     
+    @profiled("ConnectionItem.update_path")
     def update_path(self): #Обновляет форму линии (прямая/ломанная/кривая)
         path = QPainterPath()
         start = self.start_port.scenePos()
@@ -273,11 +571,19 @@ class ConnectionItem(QGraphicsPathItem): #Соединение между уст
         
         if self.line_style == LINE_STYLE_STRAIGHT:
             path.lineTo(end)
+            points = [start, end]
         elif self.line_style == LINE_STYLE_POLYLINE:
-            mid_x = (start.x() + end.x()) / 2
-            path.lineTo(mid_x, start.y())
-            path.lineTo(mid_x, end.y())
-            path.lineTo(end)
+            # Маршрут в обход устройств; пока он не рассчитан, линия
+            # рисуется простой ломаной через середину
+            route = self.router.cached_or_queue(self.record) if self.router is not None else None
+            if route is None:
+                route = dogleg((start.x(), start.y()), (end.x(), end.y()))
+                scene = self.scene()
+                if scene and hasattr(scene, 'schedule_routes'):
+                    scene.schedule_routes()
+            points = [start] + [QPointF(x, y) for x, y in route[1:-1]] + [end]
+            for point in points[1:]:
+                path.lineTo(point)
         else:  # LINE_STYLE_CURVE
             dx = end.x() - start.x()
             dy = end.y() - start.y()
@@ -290,74 +596,80 @@ class ConnectionItem(QGraphicsPathItem): #Соединение между уст
                 ctrl2 = QPointF(end.x(), end.y() - dy * 0.25)
             
             path.cubicTo(ctrl1, ctrl2, end)
+            points = [start, ctrl1, ctrl2, end]
         
+        self._start = start
+        self._end = end
+
+        # Окончания рассчитываются до setPath, чтобы boundingRect их учитывал
+        self._caps = []
+        self._caps_rect = QRectF()
+        self._add_cap(self.start_style, start, self._end_direction(points))
+        self._add_cap(self.end_style, end, self._end_direction(points[::-1]))
         self.setPath(path)
-        
-        # Удаляем старые окончания
-        for item in self.childItems():
-            if isinstance(item, (QGraphicsPolygonItem, QGraphicsEllipseItem, QGraphicsRectItem)):
-                if item.scene():
-                    self.scene().removeItem(item)
-                item.setParentItem(None)
-        
-        # Добавляем новые окончания
-        self.draw_end_style(start, end, self.start_style, True)
-        self.draw_end_style(end, start, self.end_style, False)
 
-    def draw_end_style(self, pos, opposite_pos, style, is_start): #Отрисовка окончаний линий
-        if style == END_STYLE_NONE:
+    @staticmethod
+    def _end_direction(points): #Направление касательной в первой точке (наружу от линии)
+        # Касательная отрезка, ломаной и кривой Безье в конце совпадает с
+        # направлением на ближайшую несовпадающую контрольную точку
+        first = points[0]
+        for point in points[1:]:
+            dx = first.x() - point.x()
+            dy = first.y() - point.y()
+            length = (dx * dx + dy * dy) ** 0.5
+            if length > 0:
+                return dx / length, dy / length
+        return None
+
+    def _add_cap(self, style, pos, direction): #Кэширует геометрию окончания линии
+        if style == END_STYLE_NONE or direction is None:
             return
-        
-        # Вычисляем реальное направление линии
-        path = self.path()
-        if path.isEmpty():
-            return
-            
-        t = 0.99 if not is_start else 0.01
-        p1 = path.pointAtPercent(t)
-        p2 = path.pointAtPercent(1.0 if not is_start else 0.0)
-        
-        direction = p2 - p1
-        if direction.x() == 0 and direction.y() == 0:
-            direction = pos - opposite_pos
-        
-        length = (direction.x()**2 + direction.y()**2)**0.5
-        if length > 0:
-            direction = QPointF(direction.x() / length, direction.y() / length)
+
+        size = self.pen().width() * 3
+        if style == END_STYLE_ARROW:
+            dx, dy = direction
+            length = size * 2
+            base = QPointF(pos.x() - dx * length, pos.y() - dy * length)
+            normal = QPointF(dy * size, -dx * size)
+            shape = QPolygonF([pos, base + normal, base - normal])
+            rect = shape.boundingRect()
         else:
+            shape = QRectF(pos.x() - size / 2, pos.y() - size / 2, size, size)
+            rect = shape
+
+        self._caps.append((style, shape))
+        self._caps_rect = self._caps_rect.united(rect)
+
+    def boundingRect(self): #Область линии вместе с окончаниями
+        return super().boundingRect().united(self._caps_rect)
+
+    def shape(self): #Область взаимодействия линии вместе с окончаниями
+        path = super().shape()
+        path.addRect(self._caps_rect)
+        return path
+
+    def paint(self, painter, option, widget=None): #Отрисовка линии и окончаний без дочерних элементов
+        lod = level_of_detail(painter)
+        if lod < LOD_SIMPLE:
+            painter.setPen(self.pen())
+            painter.drawLine(self._start, self._end)
             return
-        
-        size = self.pen().width() * 3
-        
+        super().paint(painter, option, widget)
+        if not self._caps or lod < LOD_DECORATIONS:
+            return
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(self.color)
+        for style, shape in self._caps:
+            self.draw_end_style(painter, style, shape)
+
+    @profiled("ConnectionItem.draw_end_style")
+    def draw_end_style(self, painter, style, shape): #Отрисовка окончаний линий
         if style == END_STYLE_ARROW:
-            arrow_size = QPointF(size * 2, size * 2)
-            
-            angle = atan2(-direction.y(), direction.x())
-            arrow_p1 = pos - direction * arrow_size.x() + QPointF(
-                -arrow_size.y() * 0.5 * sin(angle),
-                -arrow_size.y() * 0.5 * cos(angle)
-            )
-            arrow_p2 = pos - direction * arrow_size.x() + QPointF(
-                arrow_size.y() * 0.5 * sin(angle),
-                arrow_size.y() * 0.5 * cos(angle)
-            )
-            
-            arrow_head = QPolygonF([pos, arrow_p1, arrow_p2])
-            arrow = QGraphicsPolygonItem(arrow_head, self)
-            arrow.setBrush(QBrush(self.color))
-            arrow.setPen(QPen(Qt.NoPen))
-        
+            painter.drawPolygon(shape)
         elif style == END_STYLE_CIRCLE:
-            circle = QGraphicsEllipseItem(-size/2, -size/2, size, size, self)
-            circle.setPos(pos)
-            circle.setBrush(QBrush(self.color))
-            circle.setPen(QPen(Qt.NoPen))
-        
+            painter.drawEllipse(shape)
         elif style == END_STYLE_SQUARE:
-            square = QGraphicsRectItem(-size/2, -size/2, size, size, self)
-            square.setPos(pos)
-            square.setBrush(QBrush(self.color))
-            square.setPen(QPen(Qt.NoPen))
+            painter.drawRect(shape)
     
     def contextMenuEvent(self, event): #Меню для изменения стиля/удаления соединения
         menu = QMenu()
@@ -386,19 +698,277 @@ class ConnectionItem(QGraphicsPathItem): #Соединение между уст
         dialog = ConnectionStyleDialog(self)
         if dialog.exec_() == QDialog.Accepted:
             new_style = dialog.get_style()
-            self.apply_style(new_style)
-            self.update_path()
             scene = self.scene()
-            if scene and hasattr(scene, 'save_schema'):
-                scene.save_schema()
+            if scene and hasattr(scene, 'change_connections_style'):
+                # Стиль выделенного соединения применяется ко всем выделенным соединениям
+                records = [self.record]
+                if self.isSelected():
+                    records = [item.record for item in scene.selectedItems() if isinstance(item, ConnectionItem)]
+                scene.change_connections_style(records, new_style)
+            else:
+                self.apply_style(new_style)
+                self.update_path()
+
+class GroupItem(QGraphicsRectItem): #Свернутая группа: один узел вместо всех устройств группы
+    _font = None
+
+    def __init__(self, record):
+        super().__init__(0, 0, GROUP_NODE_WIDTH, GROUP_NODE_HEIGHT)
+        self.record = record  # GroupRecord модели схемы
+        self.anchor = QPointF()  # Положение узла по устройствам группы (до перетаскивания)
+        self.text = record.name
+
+        self.setBrush(QBrush(QColor(225, 235, 250)))
+        self.setPen(QPen(Qt.darkBlue, 2))
+        self.setFlags(QGraphicsItem.ItemIsMovable | QGraphicsItem.ItemIsSelectable |
+                      QGraphicsItem.ItemSendsGeometryChanges)
+        self.setZValue(20)
+
+    def place(self, rect): #Ставит узел в левый верхний угол области устройств группы
+        self.anchor = rect.topLeft()
+        self.setPos(self.anchor)
+
+    def set_summary(self, devices, links): #Обновляет подпись: число устройств и внешних соединений группы
+        self.text = f"{self.record.name}\nустройств: {devices}\nвнешних соединений: {links}"
+        self.setToolTip(self.text)
+        self.update()
+
+    def itemChange(self, change, value): #Сводные связи следуют за перетаскиваемым узлом
+        if change == QGraphicsItem.ItemPositionHasChanged:
+            scene = self.scene()
+            if scene and hasattr(scene, 'group_node_moved'):
+                scene.group_node_moved(self)
+        return super().itemChange(change, value)
+
+    def mouseDoubleClickEvent(self, event): #Двойной щелчок разворачивает группу
+        scene = self.scene()
+        if scene and hasattr(scene, 'set_group_collapsed'):
+            scene.set_group_collapsed(self.record, False)
+            return
+        super().mouseDoubleClickEvent(event)
+
+    def contextMenuEvent(self, event): #Меню группы: развернуть, разгруппировать, сгруппировать выделенное
+        scene = self.scene()
+        if not scene or not hasattr(scene, 'ungroup'):
+            return
+        menu = QMenu()
+        expand_action = menu.addAction("Развернуть группу")
+        ungroup_action = menu.addAction("Разгруппировать")
+        group_action = None
+        if self.isSelected() and len(scene.selectedItems()) > 1:
+            group_action = menu.addAction("Сгруппировать выделенное...")
+        action = menu.exec_(event.screenPos())
+
+        if action is None:
+            return
+        if action == expand_action:
+            scene.set_group_collapsed(self.record, False)
+        elif action == ungroup_action:
+            scene.ungroup(self.record)
+        elif action == group_action:
+            scene.group_selection()
+
+    def paint(self, painter, option, widget=None): #Отрисовка узла и подписи
+        super().paint(painter, option, widget)
+        if level_of_detail(painter) < LOD_TEXT:
+            return
+        if GroupItem._font is None:
+            GroupItem._font = QFont("Arial", 9)
+        painter.setFont(GroupItem._font)
+        painter.drawText(self.rect().adjusted(8, 6, -8, -6), Qt.AlignTop | Qt.AlignLeft, self.text)
+
+class GroupFrameItem(QGraphicsRectItem): #Рамка развернутой группы вокруг ее устройств
+    def __init__(self, record):
+        super().__init__()
+        self.record = record  # GroupRecord модели схемы
+        self.setPen(QPen(QColor(90, 110, 160), 1.5, Qt.DashLine))
+        # Рамка лежит под устройствами и соединениями, вложенная - над внешней
+        self.setZValue(-20 + sum(1 for _ in record.ancestors()))
+
+    def place(self, rect): #Задает область рамки
+        self.setRect(rect)
+
+    def mouseDoubleClickEvent(self, event): #Двойной щелчок внутри рамки сворачивает группу
+        scene = self.scene()
+        if scene and hasattr(scene, 'set_group_collapsed'):
+            scene.set_group_collapsed(self.record, True)
+            return
+        super().mouseDoubleClickEvent(event)
+
+    def contextMenuEvent(self, event): #Меню группы: свернуть или разгруппировать
+        scene = self.scene()
+        if not scene or not hasattr(scene, 'ungroup'):
+            return
+        menu = QMenu()
+        collapse_action = menu.addAction(f"Свернуть группу {self.record.name}")
+        ungroup_action = menu.addAction("Разгруппировать")
+        action = menu.exec_(event.screenPos())
+
+        if action == collapse_action:
+            scene.set_group_collapsed(self.record, True)
+        elif action == ungroup_action:
+            scene.ungroup(self.record)
+
+    def paint(self, painter, option, widget=None): #Отрисовка рамки и названия группы
+        super().paint(painter, option, widget)
+        if level_of_detail(painter) < LOD_TEXT:
+            return
+        painter.setFont(PortLabelItem.static_font())
+        painter.setPen(QColor(90, 110, 160))
+        rect = self.rect()
+        painter.drawText(QRectF(rect.left() + 6, rect.top() + 2, rect.width() - 12, GROUP_LABEL_HEIGHT),
+                         Qt.AlignLeft | Qt.AlignVCenter, self.record.name)
+
+class GroupLinkItem(QGraphicsLineItem): #Сводная связь свернутой группы: все соединения между двумя узлами одной линией
+    def __init__(self, first, second, connections):
+        super().__init__()
+        self.nodes = (first, second)  # GroupRecord или DeviceRecord
+        self.connections = connections  # ConnectionRecord, которые представляет связь
+        count = len(connections)
+        self.setPen(QPen(QColor(60, 60, 160), min(1 + count, GROUP_LINK_MAX_WIDTH)))
+        self.setZValue(-1)  # концы линии уходят под узлы
+        names = [connection.name for connection in connections[:10] if connection.name]
+        self.setToolTip(f"Соединений: {count}" + (f"\n{', '.join(names)}" if names else ""))
+
+    def boundingRect(self): #Линия вместе с подписью числа соединений
+        return super().boundingRect().adjusted(-20, -20, 20, 20)
+
+    def paint(self, painter, option, widget=None): #Отрисовка линии и числа соединений в ее середине
+        super().paint(painter, option, widget)
+        if len(self.connections) < 2 or level_of_detail(painter) < LOD_TEXT:
+            return
+        painter.setFont(PortLabelItem.static_font())
+        painter.setPen(Qt.darkBlue)
+        painter.drawText(self.line().center() + QPointF(4, -4), f"×{len(self.connections)}")
 
 class EquipmentView(QGraphicsView): #Отображения сцены с оборудованием
     def __init__(self, scene, parent=None):
         super().__init__(scene, parent)
         self.setRenderHint(QPainter.Antialiasing)
-        self.setDragMode(QGraphicsView.NoDrag)
-        self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
+        self.setDragMode(QGraphicsView.RubberBandDrag)
+        self.setRubberBandSelectionMode(Qt.ContainsItemShape)  # рамкой выделяется только то, что в нее попало целиком
+        # Перерисовываются только измененные области, а не весь viewport
+        self.setViewportUpdateMode(QGraphicsView.MinimalViewportUpdate)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
         self.setInteractive(True)
+        self._pan_start = None
+
+        # Видимая область передается сцене не чаще одного раза за проход цикла событий
+        self._region_timer = QTimer(self)
+        self._region_timer.setSingleShot(True)
+        self._region_timer.setInterval(0)
+        self._region_timer.timeout.connect(self.push_visible_region)
+        self.horizontalScrollBar().valueChanged.connect(lambda value: self._region_timer.start())
+        self.verticalScrollBar().valueChanged.connect(lambda value: self._region_timer.start())
+
+        # Панель FPS и счетчиков горячих участков (только при EDITOR_PROFILE=1)
+        self._frame_times = deque()
+        self._overlay_rect = QRect(8, 8, 460, 40)
+        self._overlay_font = QFont("Monospace", 8)
+        if PERF.enabled:
+            self._overlay_timer = QTimer(self)
+            self._overlay_timer.timeout.connect(lambda: self.viewport().update(self._overlay_rect))
+            self._overlay_timer.start(PERF_OVERLAY_INTERVAL_MS)
+
+    def fps(self): #Число кадров за последнюю секунду
+        now = time.perf_counter()
+        while self._frame_times and now - self._frame_times[0] > 1.0:
+            self._frame_times.popleft()
+        return len(self._frame_times)
+
+    def paintEvent(self, event): #Отрисовка с учетом кадров для FPS
+        super().paintEvent(event)
+        if PERF.enabled:
+            self._frame_times.append(time.perf_counter())
+
+    def drawForeground(self, painter, rect): #Панель замеров поверх сцены
+        super().drawForeground(painter, rect)
+        if not PERF.enabled:
+            return
+
+        lines = [f"FPS: {self.fps()}"]
+        for name, stats in sorted(PERF.summary().items()):
+            lines.append(f"{name}: {stats['count']} выз., среднее {stats['mean'] * 1000:.2f} мс, "
+                         f"p95 {stats['p95'] * 1000:.2f} мс")
+
+        painter.save()
+        painter.resetTransform()
+        metrics = QFontMetrics(self._overlay_font)
+        width = max(metrics.horizontalAdvance(line) for line in lines) + 12
+        self._overlay_rect = QRect(8, 8, width, 16 * len(lines) + 8)
+        painter.fillRect(self._overlay_rect, QColor(255, 255, 255, 220))
+        painter.setPen(Qt.black)
+        painter.setFont(self._overlay_font)
+        for i, line in enumerate(lines):
+            painter.drawText(14, 22 + 16 * i, line)
+        painter.restore()
+
+    def scrollContentsBy(self, dx, dy): #Прокрутка сдвигает пиксели viewport: панель замеров перерисовывается на месте
+        super().scrollContentsBy(dx, dy)
+        if PERF.enabled:
+            # Перерисовываются сдвинутая копия панели и ее место в углу
+            self.viewport().update(self._overlay_rect.translated(dx, dy))
+            self.viewport().update(self._overlay_rect)
+
+    def push_visible_region(self): #Сообщает сцене видимую область (нужно для виртуализированного режима)
+        scene = self.scene()
+        if scene is not None and hasattr(scene, 'set_visible_region'):
+            scene.set_visible_region(self.mapToScene(self.viewport().rect()).boundingRect())
+
+    def resizeEvent(self, event): #Обновляет видимую область при изменении размера
+        super().resizeEvent(event)
+        self._region_timer.start()
+
+    def current_zoom(self): #Текущий масштаб вида
+        return self.transform().m11()
+
+    def zoom_by(self, factor): #Масштабирует вид с ограничением по MIN_ZOOM/MAX_ZOOM
+        zoom = self.current_zoom()
+        factor = max(MIN_ZOOM / zoom, min(MAX_ZOOM / zoom, factor))
+        self.scale(factor, factor)
+        self._region_timer.start()
+        # Сглаживание незаметно при сильном отдалении, но дорого на больших схемах
+        self.setRenderHint(QPainter.Antialiasing, self.current_zoom() >= LOD_DECORATIONS)
+
+    def wheelEvent(self, event): #Масштабирование колесом мыши относительно курсора
+        steps = event.angleDelta().y() / 120
+        if steps:
+            self.zoom_by(ZOOM_STEP ** steps)
+        event.accept()
+
+    @staticmethod
+    def _shift_to_control(event): #Shift работает как Ctrl Qt: добавляет к выделению рамкой и переключает выделение щелчком
+        if not event.modifiers() & Qt.ShiftModifier:
+            return event
+        modifiers = (event.modifiers() & ~Qt.ShiftModifier) | Qt.ControlModifier
+        return QMouseEvent(event.type(), event.localPos(), event.windowPos(), event.screenPos(),
+                           event.button(), event.buttons(), modifiers)
+
+    def mousePressEvent(self, event): #Начало панорамирования средней кнопкой мыши
+        if event.button() == Qt.MiddleButton:
+            self._pan_start = event.pos()
+            self.viewport().setCursor(Qt.ClosedHandCursor)
+            event.accept()
+            return
+        super().mousePressEvent(self._shift_to_control(event))
+
+    def mouseMoveEvent(self, event): #Панорамирование
+        if self._pan_start is not None:
+            delta = event.pos() - self._pan_start
+            self._pan_start = event.pos()
+            self.horizontalScrollBar().setValue(self.horizontalScrollBar().value() - delta.x())
+            self.verticalScrollBar().setValue(self.verticalScrollBar().value() - delta.y())
+            event.accept()
+            return
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event): #Завершение панорамирования
+        if self._pan_start is not None and event.button() == Qt.MiddleButton:
+            self._pan_start = None
+            self.viewport().unsetCursor()
+            event.accept()
+            return
+        super().mouseReleaseEvent(self._shift_to_control(event))
 
 class EquipmentTypeDialog(QDialog): #Диалог создания нового типа оборудования
     def __init__(self, schema_path):
@@ -527,231 +1097,1153 @@ class PortsEntryDialog(QDialog): #Диалог создания экземпля
             QMessageBox.warning(self, "Ошибка", "Введите название.")
             return
 
-        self.scene.add_equipment_instance(name, self.eq_type, self.ports)
+        try:
+            self.scene.add_equipment_instance(name, self.eq_type, self.ports)
+        except SchemaError as e:
+            QMessageBox.warning(self, "Ошибка", str(e))
+            return
         self.accept()
 
 class EquipmentScene(QGraphicsScene): #Сцена для работы с графическими элементами
+    drag_finished = pyqtSignal(int)  # Число перестроений линий за одно перетаскивание
+    load_progress = pyqtSignal(int, int)  # Загружено устройств, всего устройств
+    load_finished = pyqtSignal(bool)  # False - открытие отменено или завершилось ошибкой
+    _model_ready = pyqtSignal(int, object)  # Номер загрузки и future чтения (из рабочего потока)
+    history_changed = pyqtSignal()  # Изменились возможности отмены/повтора
+
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.connections = []
+        # Сцена является представлением модели: индексы соединений живут в модели,
+        # а здесь хранится соответствие записей модели и графических элементов
+        self.model = SchemaModel()
+        self.router = OrthogonalRouter(self.model)
+        self.device_items = {}  # DeviceRecord -> EquipmentItem
+        self.connection_items = {}  # ConnectionRecord -> ConnectionItem
+        self.virtualized = False
+        self.compact_devices = False  # Устройства одним элементом (CompactEquipmentItem)
+        self._visible_rect = None
+        self._export_connections = None  # SpatialGrid соединений на время экспорта в виртуализированном режиме
+        self._device_pool = {}  # pool_key -> список выгруженных EquipmentItem
+        # Группы: узлы свернутых, рамки развернутых и сводные связи свернутых групп.
+        # Устройства внутри свернутой группы не получают графических элементов
+        self.group_items = {}  # GroupRecord -> GroupItem
+        self.group_frames = {}  # GroupRecord -> GroupFrameItem
+        self.group_link_items = []
+        self._node_links = {}  # GroupRecord или DeviceRecord -> сводные связи узла
+        self._groups_dirty = False
         self.temp_connection = None
         self.connection_start = None
+        self._snap_port = None  # PortRecord, к которому притянута временная линия
+        self._snap_marker = None
         self.port_size = 10
         self.schema_path = None
 
-    def load_schema(self, schema_path): #Загружает схему из json файла
-        self.schema_path = schema_path
-        schema_file = os.path.join(schema_path, os.path.basename(schema_path) + ".json")
-        
-        if not os.path.exists(schema_file):
+        # Отложенное автосохранение: изменения копятся AUTOSAVE_DELAY_MS,
+        # затем снимок схемы записывается на диск в фоновом потоке
+        self._save_pending = False
+        self._save_future = None
+        self._save_executor = ThreadPoolExecutor(max_workers=1)
+        self._autosave_timer = QTimer(self)
+        self._autosave_timer.setSingleShot(True)
+        self._autosave_timer.setInterval(AUTOSAVE_DELAY_MS)
+        self._autosave_timer.timeout.connect(self._autosave)
+        self._bulk_depth = 0
+        self.last_load_timings = {}
+
+        # Перемещенные устройства копятся до следующего кадра, и каждое
+        # затронутое соединение перестраивается один раз за кадр
+        self._moved_devices = set()
+        self.path_rebuild_count = 0
+        self._drag_rebuild_base = 0
+        self._frame_timer = QTimer(self)
+        self._frame_timer.setSingleShot(True)
+        self._frame_timer.setInterval(0)
+        self._frame_timer.timeout.connect(self.flush_moved_devices)
+
+        # Открытие без блокировки: файл читается в рабочем потоке, а элементы
+        # создаются частями по LOAD_CHUNK_MS между событиями интерфейса
+        self.loading = False
+        self._load_executor = ThreadPoolExecutor(max_workers=1)
+        self._load_generation = 0
+        self._load_path = None
+        self._load_queue = deque()
+        self._load_total = 0
+        self._load_started = 0.0
+        self._edited_while_loading = False  # Схему меняли, пока ее элементы еще создавались
+        self._load_timer = QTimer(self)
+        self._load_timer.setInterval(0)
+        self._load_timer.timeout.connect(self._load_next_chunk)
+        self._model_ready.connect(self._on_model_ready)
+
+        # Ломаные соединения трассируются порциями между событиями интерфейса
+        self._route_timer = QTimer(self)
+        self._route_timer.setSingleShot(True)
+        self._route_timer.setInterval(0)
+        self._route_timer.timeout.connect(self._process_routes)
+
+        # История изменений: команды хранят только разницу и применяются точечно
+        self.history = UndoStack()
+        self._move_origins = {}  # DeviceRecord -> положение до начала текущего перемещения
+        self._replaying = False  # Идет отмена/повтор (изменения не записываются в историю)
+        self._drag_transaction = None  # Перетаскивание большого выделения (ExitStack с bulk_update)
+
+    @property
+    def connections(self): #Графические элементы всех соединений
+        return self.connection_items.values()
+
+    def set_model(self, model): #Заменяет модель схемы (элементы сцены должны быть уже удалены)
+        self.model = model
+        self.router = OrthogonalRouter(model)
+        self._move_origins = {}
+        self.history.clear()
+        self.history_changed.emit()
+        self.refresh_groups()
+
+    def clear_schema(self): #Удаляет все элементы сцены и начинает пустую модель
+        self._stop_loading()
+        self.clear()
+        self.group_items = {}
+        self.group_frames = {}
+        self.group_link_items = []
+        self._node_links = {}
+        self.set_model(SchemaModel())
+        self.device_items = {}
+        self.connection_items = {}
+        self._device_pool = {}
+        self._moved_devices.clear()
+
+    def _create_device_item(self, record, rect=None): #Создает графический элемент для устройства модели
+        pool = self._device_pool.get((record.eq_type, tuple(port.port_type for port in record.ports)))
+        if pool and rect is None:
+            item = pool.pop()
+            item.bind(record)
+        elif self.compact_devices:
+            item = CompactEquipmentItem(record, rect)
+        else:
+            item = EquipmentItem(record, rect)
+        item.setPos(QPointF(record.x, record.y))
+        self.addItem(item)
+        self.device_items[record] = item
+        return item
+
+    def _create_connection_item(self, record): #Создает графический элемент для соединения модели
+        start_port = self.device_items[record.start.device].port_items[record.start.index]
+        end_port = self.device_items[record.end.device].port_items[record.end.index]
+        connection = ConnectionItem(start_port, end_port, record, self.router)
+        self.addItem(connection)
+        self.connection_items[record] = connection
+        if self.router.pending:
+            self.schedule_routes()
+        return connection
+
+    def _release_device_item(self, record): #Убирает элемент устройства со сцены и сохраняет его для повторного использования
+        item = self.device_items.pop(record)
+        self._moved_devices.discard(item)
+        item.setSelected(False)
+        self.removeItem(item)
+        pool = self._device_pool.setdefault(item.pool_key, [])
+        if sum(len(items) for items in self._device_pool.values()) < VIRTUAL_POOL_SIZE:
+            pool.append(item)
+
+    def _release_connection_item(self, record): #Убирает элемент соединения со сцены
+        self.removeItem(self.connection_items.pop(record))
+
+    def set_virtualized(self, enabled): #Включает режим, в котором элементы создаются только около видимой области
+        if enabled == self.virtualized:
+            return
+        self.virtualized = enabled
+        if enabled:
+            self.update_virtual_scene_rect()
+            self.refresh_virtual_items()
+        else:
+            self.setSceneRect(QRectF())
+            self.materialize_all()
+
+    def set_compact_devices(self, enabled): #Переключает устройства между обычным и компактным представлением
+        if enabled == self.compact_devices:
+            return
+        self.compact_devices = enabled
+        with self.bulk_update():
+            records = list(self.device_items)
+            for record in list(self.connection_items):
+                self._release_connection_item(record)
+            for record in records:
+                self._release_device_item(record)
+            self._device_pool = {}  # в пуле остались элементы прежнего вида
+
+            for record in records:
+                self._create_device_item(record)
+            for record in self.model.connections:
+                if record.start.device in self.device_items and record.end.device in self.device_items:
+                    self._create_connection_item(record)
+
+    def materialize_all(self): #Создает графические элементы для всей модели (кроме устройств свернутых групп)
+        with self.bulk_update():
+            for record in self.model.devices.values():
+                if record not in self.device_items and not self.is_hidden(record):
+                    self._create_device_item(record)
+            for record in self.model.connections:
+                if (record not in self.connection_items and record.start.device in self.device_items
+                        and record.end.device in self.device_items):
+                    self._create_connection_item(record)
+
+    def update_virtual_scene_rect(self): #Размер сцены по всей модели, а не только по созданным элементам
+        bounds = self.model.device_grid.bounds()
+        if bounds:
+            x0, y0, x1, y1 = bounds
+            self.setSceneRect(QRectF(x0, y0, x1 - x0, y1 - y0).adjusted(-200, -200, 200, 200))
+
+    def set_visible_region(self, rect): #Запоминает видимую область вида и обновляет созданные элементы
+        self._visible_rect = QRectF(rect)
+        if self.virtualized:
+            self.refresh_virtual_items()
+
+    def refresh_virtual_items(self): #Создает элементы около видимой области и выгружает остальные
+        if self._visible_rect is None:
+            return
+        rect = self._visible_rect
+        margin_x = rect.width() * VIRTUAL_MARGIN
+        margin_y = rect.height() * VIRTUAL_MARGIN
+        visible_devices = self.model.devices_in_rect((rect.left() - margin_x, rect.top() - margin_y,
+                                                      rect.right() + margin_x, rect.bottom() + margin_y))
+        if self.model.groups:
+            visible_devices = [device for device in visible_devices if not self.is_hidden(device)]
+
+        # Соединения видимых устройств показываются целиком, поэтому их
+        # противоположные концы тоже получают графические элементы
+        wanted_connections = set()
+        for device in visible_devices:
+            wanted_connections.update(self.model.device_connections(device))
+        if self._export_connections is not None:
+            # При экспорте нужны и длинные соединения, которые только проходят через область
+            wanted_connections.update(self._export_connections.query(
+                (rect.left(), rect.top(), rect.right(), rect.bottom())))
+        if self.model.groups:
+            # Соединения с устройствами свернутых групп показываются сводными связями
+            wanted_connections = {conn for conn in wanted_connections
+                                  if not self.is_hidden(conn.start.device) and not self.is_hidden(conn.end.device)}
+        wanted_devices = set(visible_devices)
+        for conn in wanted_connections:
+            wanted_devices.add(conn.start.device)
+            wanted_devices.add(conn.end.device)
+        grabber = self.mouseGrabberItem()
+        if isinstance(grabber, EquipmentItem):
+            wanted_devices.add(grabber.record)
+        # Выделенные устройства не выгружаются, чтобы выделение не терялось при прокрутке
+        wanted_devices.update(item.record for item in self.selectedItems() if isinstance(item, EquipmentItem))
+
+        for record in [r for r in self.connection_items if r not in wanted_connections]:
+            self._release_connection_item(record)
+        for record in [r for r in self.device_items if r not in wanted_devices]:
+            self._release_device_item(record)
+        for record in wanted_devices:
+            if record not in self.device_items:
+                self._create_device_item(record)
+        for record in wanted_connections:
+            if record not in self.connection_items:
+                self._create_connection_item(record)
+
+    def ensure_device_item(self, record): #Возвращает элемент устройства, создавая его при необходимости (свернутые группы разворачиваются)
+        item = self.device_items.get(record)
+        if item is None:
+            group = self.model.collapsed_group(record)
+            while group is not None:
+                self.set_group_collapsed(group, False)
+                group = self.model.collapsed_group(record)
+            item = self.device_items.get(record) or self._create_device_item(record)
+        return item
+
+    def port_item(self, record): #Графический элемент порта модели (элемент устройства создается при необходимости)
+        return self.ensure_device_item(record.device).port_items[record.index]
+
+    def port_item_at(self, pos): #Порт под точкой сцены (поиск по индексу портов модели)
+        ports = [port for port in self.model.ports_near(pos.x(), pos.y(), PORT_HIT_RADIUS)
+                 if not self.is_hidden(port.device)]
+        return self.port_item(ports[0]) if ports else None
+
+    def snap_target(self, start, pos): #Ближайший к точке свободный порт того же типа, который можно соединить с start
+        for port in self.model.ports_near(pos.x(), pos.y(), SNAP_RADIUS, start.port_type):
+            if not self.is_hidden(port.device) and self.model.connection_error(start.record, port) is None:
+                return port
+        return None
+
+    def is_hidden(self, record): #Скрыто ли устройство внутри свернутой группы
+        return record.group is not None and self.model.collapsed_group(record) is not None
+
+    # Группы устройств
+
+    def _group_rect(self, group): #Область узла свернутой группы или рамки развернутой (None, если в группе нет устройств)
+        if group.collapsed:
+            bounds = self.model.group_bounds(group)
+            if bounds is None:
+                return None
+            return QRectF(bounds[0] + LABEL_MARGIN, bounds[1], GROUP_NODE_WIDTH, GROUP_NODE_HEIGHT)
+        rect = QRectF()
+        for device in group.members:
+            x0, y0, x1, y1 = self.model.device_rect(device)
+            rect = rect.united(QRectF(x0, y0, x1 - x0, y1 - y0))
+        for child in group.children:
+            child_rect = self._group_rect(child)
+            if child_rect is not None:
+                rect = rect.united(child_rect)
+        if rect.isNull():
+            return None
+        return rect.adjusted(-GROUP_FRAME_MARGIN, -GROUP_FRAME_MARGIN - GROUP_LABEL_HEIGHT,
+                             GROUP_FRAME_MARGIN, GROUP_FRAME_MARGIN)
+
+    def _node_center(self, node): #Центр узла сводной связи: узла свернутой группы или устройства
+        item = self.group_items.get(node)
+        if item is not None:
+            return item.pos() + item.rect().center()
+        return QPointF(node.x + DEVICE_WIDTH / 2, node.y + DEVICE_HEIGHT / 2)
+
+    def _update_link(self, link):
+        first, second = link.nodes
+        link.setLine(QLineF(self._node_center(first), self._node_center(second)))
+
+    def refresh_groups(self): #Пересоздает узлы, рамки и сводные связи групп по модели
+        self._groups_dirty = False
+        shown = {}
+        for group in self.model.groups.values():
+            if self.model.group_shown(group):
+                rect = self._group_rect(group)
+                if rect is not None:
+                    shown[group] = rect
+
+        for items, collapsed in ((self.group_items, True), (self.group_frames, False)):
+            for group in [g for g in items if g not in shown or g.collapsed != collapsed]:
+                self.removeItem(items.pop(group))
+        for group, rect in shown.items():
+            items, item_class = ((self.group_items, GroupItem) if group.collapsed
+                                 else (self.group_frames, GroupFrameItem))
+            item = items.get(group)
+            if item is None:
+                item = items[group] = item_class(group)
+                self.addItem(item)
+            item.place(rect)
+
+        for link in self.group_link_items:
+            self.removeItem(link)
+        self.group_link_items = []
+        self._node_links = {}
+        if self.group_items:
+            for (first, second), connections in ((tuple(pair), conns)
+                                                 for pair, conns in self.model.group_links().items()):
+                link = GroupLinkItem(first, second, connections)
+                self._update_link(link)
+                self.addItem(link)
+                self.group_link_items.append(link)
+                for node in (first, second):
+                    self._node_links.setdefault(node, []).append(link)
+        for group, item in self.group_items.items():
+            item.set_summary(sum(1 for _ in group.devices()),
+                             sum(len(link.connections) for link in self._node_links.get(group, ())))
+
+    def invalidate_groups(self): #Обновляет группы сейчас или, внутри транзакции, один раз в ее конце
+        if self._bulk_depth:
+            self._groups_dirty = True
+        else:
+            self.refresh_groups()
+
+    def sync_groups(self, devices=None): #Создает или убирает элементы устройств после сворачивания/разворачивания групп
+        if self.virtualized:
+            self.refresh_virtual_items()
+        else:
+            devices = list(self.model.devices.values()) if devices is None else devices
+            with self.bulk_update():
+                hidden, shown = set(), []
+                for record in devices:
+                    if self.model.devices.get(record.name) is not record:
+                        continue
+                    if self.is_hidden(record):
+                        if record in self.device_items:
+                            hidden.add(record)
+                    elif record not in self.device_items:
+                        self._create_device_item(record)
+                        shown.append(record)
+
+                # Элементы убираются в порядке создания: сцена ищет их в списке
+                # элементов с начала, и так каждое удаление не просматривает весь список
+                if hidden:
+                    for conn in [conn for conn in self.connection_items
+                                 if conn.start.device in hidden or conn.end.device in hidden]:
+                        self._release_connection_item(conn)
+                    for record in [record for record in self.device_items if record in hidden]:
+                        self._release_device_item(record)
+                for record in shown:
+                    for conn in self.model.device_connections(record):
+                        if (conn not in self.connection_items and conn.start.device in self.device_items
+                                and conn.end.device in self.device_items):
+                            self._create_connection_item(conn)
+        self.invalidate_groups()
+
+    def update_group_geometry(self, records): #Двигает рамки и узлы групп и сводные связи вслед за устройствами
+        if not self.model.groups:
+            return
+        groups = set()
+        for record in records:
+            if record.group is not None:
+                groups.update(record.group.ancestors())
+        for group in groups:
+            item = self.group_items.get(group) or self.group_frames.get(group)
+            rect = self._group_rect(group) if item is not None else None
+            if rect is not None:
+                item.place(rect)
+        for node in [*records, *groups]:
+            for link in self._node_links.get(node, ()):
+                self._update_link(link)
+
+    def group_node_moved(self, item): #Сводные связи следуют за перетаскиваемым узлом группы
+        for link in self._node_links.get(item.record, ()):
+            self._update_link(link)
+
+    def _finish_group_drags(self): #Переносит устройства перетащенных узлов групп (отменяется вместе с перемещением)
+        positions = {}
+        for item in self.group_items.values():
+            dx, dy = item.pos().x() - item.anchor.x(), item.pos().y() - item.anchor.y()
+            if dx or dy:
+                for record in item.record.devices():
+                    self.remember_move_origin(record)
+                    positions[record] = (record.x + dx, record.y + dy)
+        if positions:
+            self.move_devices(positions)
+
+    def set_group_collapsed(self, group, collapsed): #Сворачивает группу в узел или разворачивает ее (не записывается в историю)
+        if group.collapsed == collapsed:
             return
+        group.collapsed = collapsed
+        self.sync_groups(list(group.devices()))
+        self.schedule_save()
 
+    def set_all_groups_collapsed(self, collapsed): #Сворачивает или разворачивает все группы
+        changed = [group for group in self.model.groups.values() if group.collapsed != collapsed]
+        if not changed:
+            return
+        for group in changed:
+            group.collapsed = collapsed
+        self.sync_groups()
+        self.schedule_save()
+
+    def group_records(self, name, devices=(), groups=(), collapsed=False): #Объединяет устройства и группы в новую группу с записью в историю
+        # Выделение из разных групп поднимается до общей родительской:
+        # устройства двух стоек объединяют сами стойки
+        devices, groups = self.model.common_level(devices, groups)
+        group = self.model.add_group(name, devices, groups, collapsed)
+        self.sync_groups(list(group.devices()))
+        self.schedule_save()
+        self.record_command(AddGroup(group))
+        return group
+
+    def group_selection(self): #Запрашивает название и объединяет выделенные устройства и узлы групп
+        selected = self.selectedItems()
+        devices = [item.record for item in selected if isinstance(item, EquipmentItem)]
+        groups = [item.record for item in selected if isinstance(item, GroupItem)]
+        if not devices and not groups:
+            return None
+        number = len(self.model.groups) + 1
+        while f"Группа {number}" in self.model.groups:
+            number += 1
+        name, ok = QInputDialog.getText(None, "Группа", "Название группы (стойка, помещение):",
+                                        text=f"Группа {number}")
+        if not ok:
+            return None
         try:
-            with open(schema_file, "r", encoding="utf-8") as f:
-                schema = json.load(f)
+            return self.group_records(name.strip(), devices, groups)
+        except SchemaError as e:
+            QMessageBox.warning(None, "Ошибка", str(e))
+            return None
+
+    def ungroup(self, group): #Убирает группу (устройства остаются на схеме) с записью в историю
+        self.remove_group(group)
+        self.record_command(RemoveGroup(group))
+
+    def is_port_used(self, port): #Проверяет, занят ли порт соединением
+        return port.record in self.model.port_connections
+
+    def get_connection_between(self, first_device, second_device): #Возвращает соединение между двумя устройствами
+        record = self.model.connection_between(first_device.record, second_device.record)
+        return self.connection_items.get(record)
+
+    def schema_file_path(self): #Возвращает путь к json файлу текущей схемы
+        return schema_file_path(self.schema_path)
+
+    @contextmanager
+    def bulk_update(self): #Транзакция массовых изменений: без промежуточных сохранений и перестроения индекса сцены
+        self._bulk_depth += 1
+        if self._bulk_depth == 1:
+            self.setItemIndexMethod(QGraphicsScene.NoIndex)
+        try:
+            yield
+        finally:
+            self._bulk_depth -= 1
+            if self._bulk_depth == 0:
+                if self._groups_dirty:
+                    self.refresh_groups()
+                self.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+                if self._save_pending:
+                    self._autosave_timer.start()
+
+    @staticmethod
+    def read_schema_model(schema_path): #Читает модель схемы из файла, возвращает (модель или None, ошибки)
+        schema_file = schema_file_path(schema_path)
+        binary_file = binary_file_path(schema_path)
+
+        # json остается основным форматом, двоичный файл читается, если json нет
+        errors = []
+        if os.path.exists(schema_file):
+            model = SchemaModel.load_json(schema_file, errors)
+        elif os.path.exists(binary_file):
+            model = load_binary(binary_file)
+        else:
+            return None, errors
+
+        # Устройства без координат расставляются рядом с соединенными с ними
+        if model.unplaced and place_new_devices:
+            for record, (x, y) in place_new_devices(model, model.unplaced).items():
+                model.move_device(record, x, y)
+            model.unplaced = []
+        return model, errors
+
+    @profiled("EquipmentScene.load_schema")
+    def load_schema(self, schema_path): #Загружает схему из файла целиком (блокирующий вызов)
+        self._stop_loading()
+        self.schema_path = schema_path
 
-            self.clear()
-            self.connections = []
-            
-            # Загрузка экземпляров оборудования
-            for instance in schema.get("instances", []):
-                name = instance['name']
-                eq_type = instance['type']
-                ports = instance['ports']
-                x = instance.get('x', random.randint(50, 500))
-                y = instance.get('y', random.randint(50, 400))
-
-                rect = QRectF(0, 0, 160, 110)
-                self.add_equipment_instance(name, eq_type, ports, rect, QPointF(x, y))
-
-            # Создаем словарь всех портов по их unique_id
-            port_dict = {}
-            for item in self.items():
-                if isinstance(item, EquipmentItem):
-                    for port in item.port_items:
-                        port_dict[port.unique_id] = port
-
-            # Загрузка соединений
-            for connection in schema.get("connections", []):
-                try:
-                    # Пробуем загрузить по новому формату (с unique_id)
-                    if 'from_port_id' in connection and 'to_port_id' in connection:
-                        start_port = port_dict[connection['from_port_id']]
-                        end_port = port_dict[connection['to_port_id']]
-                    else:
-                        # Fallback для старых схем (загрузка по индексам)
-                        from_item = next((item for item in self.items() 
-                                        if isinstance(item, EquipmentItem) and 
-                                        item.name == connection['from']), None)
-                        to_item = next((item for item in self.items() 
-                                    if isinstance(item, EquipmentItem) and 
-                                    item.name == connection['to']), None)
-                        
-                        if from_item and to_item:
-                            from_ports = [p for p in from_item.port_items 
-                                        if p.port_type == connection['from_port']]
-                            to_ports = [p for p in to_item.port_items 
-                                    if p.port_type == connection['to_port']]
-                            
-                            from_port_idx = connection.get('from_port_index', 0)
-                            to_port_idx = connection.get('to_port_index', 0)
-                            
-                            if from_port_idx < len(from_ports) and to_port_idx < len(to_ports):
-                                start_port = from_ports[from_port_idx]
-                                end_port = to_ports[to_port_idx]
-
-                    # Проверяем, что порты не заняты
-                    if (start_port and end_port and
-                        not any(conn.start_port == start_port or conn.end_port == start_port 
-                            for conn in self.connections) and
-                        not any(conn.start_port == end_port or conn.end_port == end_port 
-                            for conn in self.connections)):
-                        self.add_connection(start_port, end_port, connection.get('style'))
-                        
-                except Exception as e:
-                    print(f"Ошибка загрузки соединения: {e}")
+        timings = {}
+        started = time.perf_counter()
+        try:
+            model, errors = self.read_schema_model(schema_path)
+            for error in errors:
+                print(error)
+            if model is None:
+                return
+            timings['read'] = time.perf_counter() - started
+
+            self.clear_schema()
+            self.set_model(model)
+
+            if self.virtualized:
+                phase_start = time.perf_counter()
+                self.update_virtual_scene_rect()
+                self.refresh_virtual_items()
+                timings['visible'] = time.perf_counter() - phase_start
+            else:
+                with self.bulk_update():
+                    phase_start = time.perf_counter()
+                    for record in model.devices.values():
+                        if not self.is_hidden(record):
+                            self._create_device_item(record)
+                    timings['instances'] = time.perf_counter() - phase_start
+
+                    phase_start = time.perf_counter()
+                    for record in model.connections:
+                        if record.start.device in self.device_items and record.end.device in self.device_items:
+                            self._create_connection_item(record)
+                    timings['connections'] = time.perf_counter() - phase_start
+
+            # Загруженная схема совпадает с файлом, сохранять нечего
+            self._autosave_timer.stop()
+            self._save_pending = False
+
+        except Exception as e:
+            print("Ошибка при загрузке схемы:", e)
+
+        timings['total'] = time.perf_counter() - started
+        self.last_load_timings = timings
+        PERF.report("EquipmentScene.load_schema", timings)
+
+    @classmethod
+    def _read_schema_in_background(cls, schema_path): #Чтение в рабочем потоке; там же строится индекс поиска
+        model, errors = cls.read_schema_model(schema_path)
+        if model is not None:
+            model.enable_search()
+        return model, errors
+
+    def load_schema_async(self, schema_path): #Открывает схему без блокировки интерфейса
+        self.clear_schema()
+        self.schema_path = None  # до окончания чтения сохранять нечего
+        self.loading = True
+        self._load_path = schema_path
+        self._load_started = time.perf_counter()
+        generation = self._load_generation
+        future = self._load_executor.submit(self._read_schema_in_background, schema_path)
+        # Сигнал из рабочего потока доставляется в GUI поток через очередь событий
+        future.add_done_callback(lambda f: self._model_ready.emit(generation, f))
+
+    def _on_model_ready(self, generation, future): #Модель прочитана: начинает создавать элементы частями
+        if generation != self._load_generation:
+            return  # загрузка отменена или уже открыта другая схема
 
+        try:
+            model, errors = future.result()
         except Exception as e:
             print("Ошибка при загрузке схемы:", e)
+            self._finish_loading(False)
+            return
+        for error in errors:
+            print(error)
+
+        if model is not None:
+            self.set_model(model)
+        self._edited_while_loading = False
+        self.schema_path = self._load_path
+        self.last_load_timings = {'read': time.perf_counter() - self._load_started}
+
+        # Сцена сразу получает размер всей схемы, чтобы ее можно было
+        # панорамировать, пока остальные элементы еще создаются
+        self.update_virtual_scene_rect()
+        if self.virtualized:
+            self.refresh_virtual_items()
+            self._finish_loading(True)
+            return
+
+        devices = list(self.model.devices.values())
+        if self._visible_rect is not None:
+            # Сначала создаются устройства около видимой области
+            center = self._visible_rect.center()
+            cx, cy = center.x(), center.y()
+            devices.sort(key=lambda d: (d.x - cx) ** 2 + (d.y - cy) ** 2)
+        self._load_queue = deque(devices)
+        self._load_total = len(devices)
+        self.load_progress.emit(0, self._load_total)
+        self._load_timer.start()
+
+    def _load_next_chunk(self): #Создает очередную порцию элементов в пределах LOAD_CHUNK_MS
+        if self.virtualized:
+            # В виртуализированном режиме элементы создаются только около видимой области
+            self.refresh_virtual_items()
+            self._finish_loading(True)
+            return
+
+        deadline = time.perf_counter() + LOAD_CHUNK_MS / 1000
+        while self._load_queue and time.perf_counter() < deadline:
+            record = self._load_queue.popleft()
+            if self.model.devices.get(record.name) is not record or self.is_hidden(record):
+                continue  # устройство удалено, пока схема загружалась, или скрыто в свернутой группе
+            if record not in self.device_items:
+                self._create_device_item(record)
+            # Соединение создается вместе со вторым из своих устройств
+            for conn in self.model.device_connections(record):
+                if (conn not in self.connection_items and conn.start.device in self.device_items
+                        and conn.end.device in self.device_items):
+                    self._create_connection_item(conn)
+
+        self.load_progress.emit(self._load_total - len(self._load_queue), self._load_total)
+        if not self._load_queue:
+            self._finish_loading(True)
+
+    def _stop_loading(self): #Прекращает текущую загрузку (результат чтения файла будет проигнорирован)
+        self._load_generation += 1
+        self._load_timer.stop()
+        self._load_queue.clear()
+        self.loading = False
+
+    def _finish_loading(self, ok): #Завершает загрузку и сообщает результат
+        if not self.loading:
+            return
+        self._stop_loading()
+        if not self.virtualized:
+            self.setSceneRect(QRectF())  # дальше размер сцены снова следует за элементами
+        if ok:
+            if not self._edited_while_loading:
+                # Загруженная схема совпадает с файлом, сохранять нечего
+                self._autosave_timer.stop()
+                self._save_pending = False
+            self.last_load_timings['total'] = time.perf_counter() - self._load_started
+            PERF.report("EquipmentScene.load_schema_async", self.last_load_timings)
+        self.load_finished.emit(ok)
+
+    def cancel_loading(self): #Отменяет открытие схемы и убирает частично загруженную схему
+        if not self.loading:
+            return
+        self.clear_schema()
+        self.schema_path = None
+        if not self.virtualized:
+            self.setSceneRect(QRectF())
+        self.load_finished.emit(False)
 
-    def save_schema(self): #Сохраняет текущую схему в файл
+    def schema_snapshot(self): #Собирает данные схемы в словарь для сохранения
+        return self.model.to_dict()
+
+    def schedule_save(self): #Помечает схему измененной и планирует автосохранение
+        if not self.schema_path:
+            return
+        if self.loading:
+            self._edited_while_loading = True
+        self._save_pending = True
+        if not self._bulk_depth and not self._autosave_timer.isActive():
+            self._autosave_timer.start()
+
+    def _autosave(self): #Записывает снимок схемы на диск в фоновом потоке
+        if not self._save_pending or not self.schema_path:
+            return
+        self._save_pending = False
+        self._save_future = self._save_executor.submit(
+            self._write_snapshot, self.schema_file_path(), self.schema_snapshot())
+
+    @staticmethod
+    @profiled("EquipmentScene.autosave_write")
+    def _write_snapshot(schema_file, schema): #Запись снимка (выполняется вне GUI потока)
+        try:
+            write_schema_file(schema_file, schema)
+        except Exception as e:
+            print("Ошибка при автосохранении схемы:", e)
+
+    def wait_for_save(self): #Дожидается завершения фоновой записи
+        if self._save_future is not None:
+            self._save_future.result()
+            self._save_future = None
+
+    def flush_pending_save(self): #Сохраняет схему, только если есть несохраненные изменения
+        if self._save_pending:
+            self.save_schema()
+        else:
+            self.wait_for_save()
+
+    @profiled("EquipmentScene.save_schema")
+    def save_schema(self): #Немедленно сохраняет текущую схему в файл
         if not self.schema_path:
             return False
-            
-        schema_file = os.path.join(self.schema_path, os.path.basename(self.schema_path) + ".json")
-        schema = {
-            "instances": [],
-            "connections": []
-        }
 
-        # Сохраняем экземпляры оборудования
-        for item in self.items():
-            if isinstance(item, EquipmentItem):
-                pos = item.pos()
-                schema["instances"].append({
-                    'name': item.name,
-                    'type': item.eq_type,
-                    'ports': item.ports,
-                    'x': pos.x(),
-                    'y': pos.y()
-                })
-
-        # Сохраняем соединения с уникальными ID портов
-        for conn in self.connections:
-            start_eq = conn.start_port.parentItem()
-            end_eq = conn.end_port.parentItem()
-            
-            connection_data = {
-                'from': start_eq.name,
-                'to': end_eq.name,
-                'from_port_id': conn.start_port.unique_id,  # Используем unique_id
-                'to_port_id': conn.end_port.unique_id,
-                'style': {
-                    'name': conn.name,
-                    'color': conn.color.name(),
-                    'line_style': conn.line_style,
-                    'start_style': conn.start_style,
-                    'end_style': conn.end_style,
-                    'width': conn.width
-                }
-            }
-            schema["connections"].append(connection_data)
-
-        with open(schema_file, "w", encoding="utf-8") as f:
-            json.dump(schema, f, indent=2, ensure_ascii=False)
+        self._autosave_timer.stop()
+        self._save_pending = False
+        self.wait_for_save()
+
+        try:
+            write_schema_file(self.schema_file_path(), self.schema_snapshot())
+        except Exception as e:
+            print("Ошибка при сохранении схемы:", e)
+            return False
         
         return True
 
-    def delete_equipment_item(self, equipment): #Удаляет экземпляр оборудования и связанные соединения
-        connections_to_delete = []
-        for conn in self.connections:
-            start_eq = conn.start_port.parentItem()
-            end_eq = conn.end_port.parentItem()
-            if start_eq == equipment or end_eq == equipment:
-                connections_to_delete.append(conn)
+    def search(self, query): #Поиск устройств, типов, портов и соединений: [(вид, текст, запись модели)]
+        return self.model.enable_search().search(query)
 
-        for conn in connections_to_delete:
-            self.delete_connection(conn)
+    def show_search_result(self, kind, record): #Создает (при необходимости) и выделяет элемент результата поиска, возвращает его
+        if kind == MATCH_CONNECTION:
+            if record not in self.model.connections:
+                return None
+            self.ensure_device_item(record.start.device)
+            self.ensure_device_item(record.end.device)
+            item = self.connection_items.get(record) or self._create_connection_item(record)
+        else:
+            device = record.device if kind == MATCH_PORT else record
+            if device.name not in self.model.devices:
+                return None
+            item = self.ensure_device_item(device)
+        self.clearSelection()
+        item.setSelected(True)
+        return item
+
+    def import_tables(self, paths): #Импортирует устройства и соединения из файлов одной транзакцией, возвращает ImportResult
+        self.commit_moves()
+        problems = []
+        types = read_equipment_types(self.schema_path, problems) if self.schema_path else {}
+        for _, _, message in problems:
+            print(message)
+
+        started = time.perf_counter()
+        with self.bulk_update():
+            result = import_files(self.model, paths, types, place_new_devices)
+            if self.virtualized:
+                self.update_virtual_scene_rect()
+                self.refresh_virtual_items()
+            else:
+                for record in result.devices:
+                    self._create_device_item(record)
+                for record in result.connections:
+                    if record not in self.connection_items:
+                        self._create_connection_item(record)
+            # Уже расставленные устройства могут попасть в коридоры ломаных
+            self.update_routes(self.router.devices_changed(result.devices))
+            if result.devices or result.connections:
+                self.schedule_save()
+
+        self.record_commands([AddDevice(record) for record in result.devices] +
+                             [AddConnection(record) for record in result.connections])
+        PERF.report("EquipmentScene.import_tables", {'total': time.perf_counter() - started})
+        return result
+
+    @property
+    def analytics(self): #Аналитика графа схемы (SchemaGraph модели)
+        return self.model.enable_analytics()
+
+    def _connection_bounds_grid(self): #Сетка областей, которые занимают линии соединений
+        grid = SpatialGrid(EXPORT_CONNECTION_CELL)
+        routes = self.router.routes
+        for record in self.model.connections:
+            # Трассированная ломаная может уйти за коридор (он расширяется при повторах),
+            # поэтому берутся точки ее маршрута; иначе - прямоугольник концов с запасом коридора
+            points = routes.get(record)
+            if points is None:
+                points = (record.start.device.port_position(record.start),
+                          record.end.device.port_position(record.end))
+                margin = ROUTE_MARGIN
+            else:
+                margin = EXPORT_SELECTION_MARGIN  # окончания линий
+            xs = [x for x, _ in points]
+            ys = [y for _, y in points]
+            grid.insert(record, (min(xs) - margin, min(ys) - margin, max(xs) + margin, max(ys) + margin))
+        return grid
+
+    @contextmanager
+    def export_session(self): #На время экспорта снимает выделение; затем возвращает выделение и видимую область
+        selected = self.selectedItems()
+        devices = [item.record for item in selected if isinstance(item, EquipmentItem)]
+        connections = [item.record for item in selected if isinstance(item, ConnectionItem)]
+        visible = self._visible_rect
+        self.clearSelection()
+        with ExitStack() as stack:
+            if self.virtualized:
+                # Элементы пересоздаются для каждой полосы или страницы; без индекса
+                # сцены это дешевле, чем обновлять BSP дерево на каждом шаге
+                stack.enter_context(self.bulk_update())
+                self._export_connections = self._connection_bounds_grid()
+            try:
+                yield
+            finally:
+                self._export_connections = None
+                if self.virtualized and visible is not None:
+                    self.set_visible_region(visible)
+        if devices or connections:
+            self.select_records(devices, connections)
+
+    def select_records(self, devices, connections=()): #Выделяет устройства и соединения модели (элементы создаются при необходимости)
+        # Устройства свернутых групп выделяются узлом группы, группы не разворачиваются
+        self.clearSelection()
+        for record in devices:
+            group = self.model.collapsed_group(record)
+            if group is None:
+                self.ensure_device_item(record).setSelected(True)
+            elif group in self.group_items:
+                self.group_items[group].setSelected(True)
+        for record in connections:
+            if self.is_hidden(record.start.device) or self.is_hidden(record.end.device):
+                continue
+            item = self.connection_items.get(record)
+            if item is None:
+                self.ensure_device_item(record.start.device)
+                self.ensure_device_item(record.end.device)
+                item = self._create_connection_item(record)
+            item.setSelected(True)
+
+    def select_component(self, record): #Выделяет все устройства, связанные с устройством
+        self.select_records(self.analytics.component_of(record))
+
+    def select_downstream(self, record): #Выделяет устройство и все устройства ниже него по направлению соединений
+        self.select_records([record, *self.analytics.downstream(record)])
+
+    def select_path(self, start, goal): #Выделяет кратчайший путь между устройствами, возвращает False, если пути нет
+        path = self.analytics.shortest_path(start, goal)
+        if path is None:
+            return False
+        connections = [self.model.connection_between(first, second) for first, second in zip(path, path[1:])]
+        self.select_records(path, connections)
+        return True
 
-        for port in equipment.port_items:
-            if port.label:
-                self.removeItem(port.label)
+    def record_command(self, command): #Записывает выполненное изменение в историю
+        if self._replaying:
+            return
+        self.commit_moves()
+        self.history.push(command)
+        self.history_changed.emit()
+
+    def record_commands(self, commands): #Записывает несколько изменений одной командой истории
+        if len(commands) == 1:
+            self.record_command(commands[0])
+        elif commands:
+            self.record_command(CommandGroup(commands))
+
+    def remember_move_origin(self, record): #Запоминает положение устройства до перемещения (для отмены)
+        if not self._replaying and record not in self._move_origins:
+            self._move_origins[record] = (record.x, record.y)
+
+    def commit_moves(self): #Записывает накопленные перемещения устройств одной командой
+        origins, self._move_origins = self._move_origins, {}
+        moves = {record: (x, y, record.x, record.y) for record, (x, y) in origins.items()
+                 if record.name in self.model.devices and (x, y) != (record.x, record.y)}
+        if moves:
+            self.history.push(MoveDevices(moves))
+            self.history_changed.emit()
+
+    def undo(self): #Отменяет последнее изменение схемы
+        self._replay(self.history.undo)
+
+    def redo(self): #Повторяет отмененное изменение схемы
+        self._replay(self.history.redo)
+
+    def _replay(self, action): #Применяет отмену/повтор к сцене одной транзакцией
+        if self.loading or self.connection_start:
+            return
+        self.flush_moved_devices()
+        self.commit_moves()
+        self._replaying = True
+        try:
+            with self.bulk_update():
+                command = action(self)
+        finally:
+            self._replaying = False
+        if command is not None:
+            self.history_changed.emit()
+
+    # Изменения, которые выполняют и команды истории (сами в историю не записываются)
+
+    def insert_device(self, record): #Возвращает на схему устройство модели
+        self.model.insert_device(record)
+        if not self.is_hidden(record):
+            self._create_device_item(record)
+        if record.group is not None:
+            self.invalidate_groups()
+        self.update_routes(self.router.devices_changed([record]))
+        if self.virtualized:
+            self.update_virtual_scene_rect()
+        self.schedule_save()
+
+    def remove_device(self, record): #Удаляет устройство модели вместе с соединениями, возвращает удаленные соединения
+        connections = self._remove_device(record)
+        self.update_routes(self.router.devices_changed([record]))
+        return connections
+
+    def _remove_device(self, record): #Удаляет устройство без перестроения маршрутов соседних соединений
+        connections = self.model.device_connections(record)
+        for connection in connections:
+            self.remove_connection(connection)
+        if record in self.device_items:
+            self._release_device_item(record)
+        self.model.remove_device(record)
+        if record.group is not None:
+            self.invalidate_groups()
+        self.schedule_save()
+        return connections
+
+    def insert_connection(self, record): #Возвращает на схему соединение модели
+        self.model.insert_connection(record)
+        if record.start.device in self.device_items and record.end.device in self.device_items:
+            self._create_connection_item(record)
+        if self.is_hidden(record.start.device) or self.is_hidden(record.end.device):
+            self.invalidate_groups()  # соединение входит в сводную связь
+        self.schedule_save()
+
+    def remove_connection(self, record): #Удаляет соединение модели и его графический элемент, если он создан
+        if record in self.connection_items:
+            self._release_connection_item(record)
+        self.router.forget(record)
+        self.model.remove_connection(record)
+        if self.is_hidden(record.start.device) or self.is_hidden(record.end.device):
+            self.invalidate_groups()
+        self.schedule_save()
+
+    def move_devices(self, positions): #Переносит устройства в новые координаты одной транзакцией
+        with self.bulk_update():
+            self.router.devices_changed(positions)
+            for record, (x, y) in positions.items():
+                item = self.device_items.get(record)
+                if item is not None:
+                    item.setPos(x, y)  # модель обновится в itemChange
+                else:
+                    self.model.move_device(record, x, y)
+            self.flush_moved_devices()
+            self.update_group_geometry(list(positions))  # устройства свернутых групп двигаются без элементов
+            self.schedule_save()
+        if self.virtualized:
+            self.update_virtual_scene_rect()
+            self.refresh_virtual_items()
+
+    def insert_group(self, record): #Возвращает группу устройств
+        self.model.insert_group(record)
+        self.sync_groups(list(record.devices()))
+        self.schedule_save()
+
+    def remove_group(self, record): #Убирает группу; ее устройства переходят в родительскую группу
+        devices = list(record.devices())
+        self.model.remove_group(record)
+        self.sync_groups(devices)
+        self.schedule_save()
+
+    def restyle_connection(self, record, style): #Применяет стиль к соединению модели
+        self.model.set_connection_style(record, style)
+        self.router.forget(record)
+        connection = self.connection_items.get(record)
+        if connection is not None:
+            connection.update_pen()
+            connection.update_path()
+        self.schedule_save()
+
+    # Действия пользователя (записываются в историю)
 
-        self.removeItem(equipment)
-        self.save_schema()
+    def delete_equipment_item(self, equipment): #Удаляет экземпляр оборудования и связанные соединения
+        self.commit_moves()  # перемещение устройства до удаления отменяется отдельно
+        record = equipment.record
+        self.record_command(RemoveDevice(record, self.remove_device(record)))
 
     def delete_connection(self, connection): #Удаляет соединение
-        if connection in self.connections:
-            self.removeItem(connection)
-            self.connections.remove(connection)
-            self.save_schema()
+        if connection.record in self.model.connections:
+            self.delete_connection_record(connection.record)
+
+    def delete_connection_record(self, record): #Удаляет соединение модели с записью в историю
+        self.remove_connection(record)
+        self.record_command(RemoveConnection(record))
+
+    def change_connections_style(self, records, style): #Меняет стиль соединений одной транзакцией с записью в историю
+        commands = []
+        with self.bulk_update():
+            for record in records:
+                old_style = record.style()
+                self.restyle_connection(record, style)
+                commands.append(RestyleConnection(record, old_style, record.style()))
+        self.record_commands(commands)
+
+    def delete_selection(self): #Удаляет выделенные устройства и соединения одной транзакцией
+        selected = self.selectedItems()
+        devices = [item.record for item in selected if isinstance(item, EquipmentItem)]
+        connections = [item.record for item in selected if isinstance(item, ConnectionItem)]
+        if not devices and not connections:
+            return
+        self.commit_moves()
+
+        commands = []
+        with self.bulk_update():
+            for record in connections:
+                self.remove_connection(record)
+                commands.append(RemoveConnection(record))
+            for record in devices:
+                commands.append(RemoveDevice(record, self._remove_device(record)))
+            # Маршруты соседних соединений перестраиваются один раз для всех удаленных устройств
+            self.update_routes(self.router.devices_changed(devices))
+        self.record_commands(commands)
+
+    def keyPressEvent(self, event): #Delete удаляет выделенное
+        if event.key() == Qt.Key_Delete and not self.loading and self.selectedItems():
+            self.delete_selection()
+            event.accept()
+            return
+        super().keyPressEvent(event)
 
     def get_connections_for_port(self, port): #Возвращает соединение для порта
-        return [conn for conn in self.connections
-                if conn.start_port == port or conn.end_port == port]
+        connection = self.connection_items.get(self.model.connection_for_port(port.record))
+        return [connection] if connection else []
 
     def add_equipment_instance(self, name, eq_type, ports, rect=None, pos=None): #Добавляет новые устройства на схему
-        if rect is None:
-            rect = QRectF(0, 0, 160, 110)
-
-        if pos is None:
-            pos = QPointF(random.randint(50, 500), random.randint(50, 400))
-
-        item = EquipmentItem(rect, name, eq_type, ports)
-        item.setPos(pos)
-        self.addItem(item)
-        item.add_labels_to_scene(self)
-        self.save_schema()
+        x, y = (None, None) if pos is None else (pos.x(), pos.y())
+        record = self.model.add_device(name, eq_type, [port['type'] for port in ports], x, y)
+        if pos is None and place_new_devices:
+            # Новое устройство ставится на свободное место в видимой области
+            anchor = None
+            if self._visible_rect is not None:
+                center = self._visible_rect.center()
+                anchor = (center.x() - DEVICE_WIDTH / 2, center.y() - DEVICE_HEIGHT / 2)
+            x, y = place_new_devices(self.model, [record], anchor)[record]
+            self.model.move_device(record, x, y)
+        item = self._create_device_item(record, rect)
+        self.update_routes(self.router.devices_changed([record]))
+        if self.virtualized:
+            self.update_virtual_scene_rect()
+        self.schedule_save()
+        self.record_command(AddDevice(record))
+        return item
 
     def add_connection(self, start_port, end_port, style=None): #Создает соединение между портами устройств
-        # Проверка на соединение с самим собой
-        if start_port.parentItem() == end_port.parentItem():
-            QMessageBox.warning(None, "Ошибка", "Нельзя соединять порты одного устройства!")
-            return
+        # Проверки: разные устройства, устройства еще не соединены, порты свободны
+        error = self.model.connection_error(start_port.record, end_port.record)
+        if error:
+            QMessageBox.warning(None, "Ошибка", error)
+            return None
 
-        # Проверка на уже существующее соединение между устройствами
-        for conn in self.connections:
-            conn_devices = {conn.start_port.parentItem(), conn.end_port.parentItem()}
-            current_devices = {start_port.parentItem(), end_port.parentItem()}
-            if conn_devices == current_devices:
-                QMessageBox.warning(None, "Ошибка", "Эти устройства уже соединены!")
-                return
+        if style is None:
+            dialog = ConnectionStyleDialog()
+            if dialog.exec_() != QDialog.Accepted:
+                return None
+            style = dialog.get_style()
 
-        # Проверка занятости конкретных портов
-        if any(conn.start_port == start_port or conn.end_port == start_port 
-            for conn in self.connections):
-            QMessageBox.warning(None, "Ошибка", f"Порт {start_port.port_type} уже используется!")
-            return
-            
-        if any(conn.start_port == end_port or conn.end_port == end_port 
-            for conn in self.connections):
-            QMessageBox.warning(None, "Ошибка", f"Порт {end_port.port_type} уже используется!")
+        # Создаем соединение
+        record = self.model.add_connection(start_port.record, end_port.record, style)
+        connection = self._create_connection_item(record)
+        self.schedule_save()
+        self.record_command(AddConnection(record))
+        return connection
+
+    def mark_device_moved(self, device): #Откладывает обновление соединений устройства до следующего кадра
+        self._moved_devices.add(device)
+        if not self._frame_timer.isActive():
+            self._frame_timer.start()
+
+    def flush_moved_devices(self): #Перестраивает соединения перемещенных устройств
+        self._frame_timer.stop()
+        if not self._moved_devices:
             return
 
-        # Создаем соединение
-        connection = ConnectionItem(start_port, end_port, style)
-        self.addItem(connection)
+        dirty_connections = set()
+        for device in self._moved_devices:
+            for port in device.port_items:
+                conn = self.connection_items.get(self.model.connection_for_port(port.record))
+                if conn:
+                    dirty_connections.add(conn)
+
+        # Ломаные, в коридоры которых попали перемещенные устройства, трассируются заново
+        records = [device.record for device in self._moved_devices]
+        for record in self.router.devices_changed(records):
+            conn = self.connection_items.get(record)
+            if conn:
+                dirty_connections.add(conn)
+        self._moved_devices.clear()
+        self.update_group_geometry(records)
+        if self.virtualized:
+            # Устройство могли утащить за границы сцены - полосы прокрутки должны его охватывать.
+            # Границы модели пересчитываются, только если оно вышло за текущую область
+            scene_rect = self.sceneRect()
+            if any(not scene_rect.contains(QRectF(record.x, record.y, DEVICE_WIDTH, DEVICE_HEIGHT))
+                   for record in records):
+                self.update_virtual_scene_rect()
+
+        for conn in dirty_connections:
+            conn.update_path()
+        self.path_rebuild_count += len(dirty_connections)
+
+    def apply_layout(self, positions): #Переносит устройства в новые координаты (отменяется одной командой)
+        self.commit_moves()
+        moves = {record: (record.x, record.y, x, y) for record, (x, y) in positions.items()}
+        self._replaying = True  # перемещения записываются ниже одной командой
+        try:
+            self.move_devices(positions)
+        finally:
+            self._replaying = False
+        self.record_command(MoveDevices(moves))
 
-        if style is None:
-            dialog = ConnectionStyleDialog()
-            if dialog.exec_() == QDialog.Accepted:
-                connection.apply_style(dialog.get_style())
-                connection.update_path()
-            else:
-                self.removeItem(connection)
-                return
+    def auto_layout(self, layered=False): #Автоматическая раскладка всей схемы
+        if force_directed_layout is None:
+            return False
+        started = time.perf_counter()
+        positions = layered_layout(self.model) if layered else force_directed_layout(self.model)
+        self.apply_layout(positions)
+        PERF.report("EquipmentScene.auto_layout", {'total': time.perf_counter() - started})
+        return True
 
-        self.connections.append(connection)
-        self.save_schema()
+    def schedule_routes(self): #Планирует трассировку ломаных соединений из очереди
+        if not self._route_timer.isActive():
+            self._route_timer.start()
+
+    @profiled("EquipmentScene.process_routes")
+    def _process_routes(self): #Трассирует очередную порцию ломаных соединений в пределах ROUTE_CHUNK_MS
+        routed = self.router.process_pending(time.perf_counter() + ROUTE_CHUNK_MS / 1000)
+        self.update_routes(routed)
+        if self.router.pending:
+            self._route_timer.start()
+
+    def update_routes(self, records): #Перестраивает графические элементы ломаных соединений
+        for record in records:
+            conn = self.connection_items.get(record)
+            if conn and conn.line_style == LINE_STYLE_POLYLINE:
+                conn.update_path()
 
     def update_connections_for_port(self, port): #Обновляет соединения при перемещении устройства
-        for conn in self.connections:
-            if conn.start_port == port or conn.end_port == port:
-                conn.update_path()
+        for conn in self.get_connections_for_port(port):
+            conn.update_path()
 
+    @profiled("EquipmentScene.mousePressEvent")
     def mousePressEvent(self, event): #Начало перетаскивания
-        item = self.itemAt(event.scenePos(), QTransform())
-        if event.button() == Qt.LeftButton and isinstance(item, PortItem):
+        item = self.port_item_at(event.scenePos()) if event.button() == Qt.LeftButton else None
+        if item is not None:
             self.connection_start = item
             self.temp_connection = QGraphicsPathItem()
             self.temp_connection.setPen(QPen(Qt.red, 2, Qt.DashLine))
@@ -763,15 +2255,39 @@ class EquipmentScene(QGraphicsScene): #Сцена для работы с гра
             self.temp_connection.setPath(path)
 
             self.addItem(self.temp_connection)
+
+            # Отметка порта, к которому притянется линия
+            radius = self.port_size
+            self._snap_marker = QGraphicsEllipseItem(-radius, -radius, 2 * radius, 2 * radius)
+            self._snap_marker.setPen(QPen(Qt.green, 2))
+            self._snap_marker.setZValue(1001)
+            self._snap_marker.hide()
+            self.addItem(self._snap_marker)
+            event.accept()  # иначе вид начнет выделение рамкой
             return
 
+        self._drag_rebuild_base = self.path_rebuild_count
         super().mousePressEvent(event)
+        if isinstance(self.mouseGrabberItem(), EquipmentItem) and len(self.selectedItems()) >= BULK_DRAG_SIZE:
+            # Большое выделение двигается без перестроения индекса сцены,
+            # а схема сохраняется один раз после отпускания кнопки
+            self._drag_transaction = ExitStack()
+            self._drag_transaction.enter_context(self.bulk_update())
 
+    @profiled("EquipmentScene.mouseMoveEvent")
     def mouseMoveEvent(self, event): #Перетаскивание линии
         if self.connection_start and self.temp_connection:
             start_pos = self.connection_start.scenePos()
             end_pos = event.scenePos()
 
+            self._snap_port = self.snap_target(self.connection_start, end_pos)
+            if self._snap_port is not None:
+                end_pos = QPointF(*self._snap_port.device.port_position(self._snap_port))
+                self._snap_marker.setPos(end_pos)
+                self._snap_marker.show()
+            else:
+                self._snap_marker.hide()
+
             path = QPainterPath()
             path.moveTo(start_pos)
 
@@ -791,15 +2307,13 @@ class EquipmentScene(QGraphicsScene): #Сцена для работы с гра
 
         super().mouseMoveEvent(event)
 
+    @profiled("EquipmentScene.mouseReleaseEvent")
     def mouseReleaseEvent(self, event): #Завершение соединения
         if self.connection_start and event.button() == Qt.LeftButton:
-            items = self.items(event.scenePos())
-            end_port = None
-
-            for item in items:
-                if isinstance(item, PortItem):
-                    end_port = item
-                    break
+            if self._snap_port is not None:
+                end_port = self.port_item(self._snap_port)
+            else:
+                end_port = self.port_item_at(event.scenePos())
 
             if end_port and end_port != self.connection_start:
                 if end_port.port_type == self.connection_start.port_type:
@@ -811,11 +2325,24 @@ class EquipmentScene(QGraphicsScene): #Сцена для работы с гра
             if self.temp_connection:
                 self.removeItem(self.temp_connection)
                 self.temp_connection = None
+            if self._snap_marker:
+                self.removeItem(self._snap_marker)
+                self._snap_marker = None
 
+            self._snap_port = None
             self.connection_start = None
             return
 
         super().mouseReleaseEvent(event)
+        self.flush_moved_devices()
+        self._finish_group_drags()
+        if self._drag_transaction is not None:
+            self._drag_transaction.close()
+            self._drag_transaction = None
+        self.commit_moves()
+        rebuilds = self.path_rebuild_count - self._drag_rebuild_base
+        if rebuilds:
+            self.drag_finished.emit(rebuilds)
 
 class MainWindow(QMainWindow): #Главное окно приложения
     def __init__(self):
@@ -823,6 +2350,7 @@ class MainWindow(QMainWindow): #Главное окно приложения
         self.setWindowTitle("Создание и соединение оборудования")
         self.setGeometry(100, 100, 1000, 700)
         self.current_schema_path = None
+        self.progress_dialog = None
         
         self.create_scene_and_view()
         self.create_bottom_buttons()
@@ -832,22 +2360,245 @@ class MainWindow(QMainWindow): #Главное окно приложения
         self.scene = EquipmentScene()
         self.view = EquipmentView(self.scene)
         self.setCentralWidget(self.view)
+        self.scene.drag_finished.connect(
+            lambda count: self.statusBar().showMessage(f"Перестроено линий при перемещении: {count}", 3000))
+        self.scene.load_progress.connect(self.update_load_progress)
+        self.scene.load_finished.connect(self.schema_loaded)
     
     def create_bottom_buttons(self): #Добавляет кнопки управления
         self.bottom_layout = QVBoxLayout()
         self.type_button = QPushButton("Создать тип оборудования")
         self.instance_button = QPushButton("Создать экземпляр оборудования")
+        self.virtual_button = QPushButton("Режим больших схем")
+        self.virtual_button.setCheckable(True)
+        self.compact_button = QPushButton("Компактные устройства")
+        self.compact_button.setCheckable(True)
+        self.layout_button = QPushButton("Расставить устройства")
+        self.layout_button.setEnabled(force_directed_layout is not None)
+        self.import_button = QPushButton("Импорт из таблиц")
+        self.stats_button = QPushButton("Статистика схемы")
+        self.export_button = QPushButton("Экспорт в PNG / SVG / PDF")
+        self.group_button = QPushButton("Сгруппировать выделенное")
+        self.collapse_groups_button = QPushButton("Свернуть все группы")
+        self.expand_groups_button = QPushButton("Развернуть все группы")
+        self.undo_button = QPushButton("Отменить")
+        self.undo_button.setShortcut(QKeySequence("Ctrl+Z"))
+        self.undo_button.setToolTip("Ctrl+Z")
+        self.redo_button = QPushButton("Повторить")
+        self.redo_button.setShortcut(QKeySequence("Ctrl+Y"))
+        self.redo_button.setToolTip("Ctrl+Y")
 
         self.type_button.clicked.connect(self.add_equipment_type)
         self.instance_button.clicked.connect(self.create_instance)
+        self.virtual_button.toggled.connect(self.set_virtualized)
+        self.compact_button.toggled.connect(self.scene.set_compact_devices)
+        self.layout_button.clicked.connect(self.auto_layout)
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Поиск: имя или тип устройства, тип порта, название соединения")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_results = QListWidget()
+        self.search_results.setMaximumHeight(120)
+        self.search_results.hide()
+
+        self.search_edit.textChanged.connect(self.update_search_results)
+        self.search_edit.returnPressed.connect(
+            lambda: self.show_search_result(self.search_results.item(0)))
+        self.search_results.itemActivated.connect(self.show_search_result)
+        self.search_results.itemClicked.connect(self.show_search_result)
+        self.scene.history_changed.connect(self.update_search_results)
+        self.import_button.clicked.connect(self.import_tables)
+        self.stats_button.clicked.connect(self.show_statistics)
+        self.export_button.clicked.connect(self.export_schema)
+        self.group_button.clicked.connect(self.scene.group_selection)
+        self.collapse_groups_button.clicked.connect(lambda: self.scene.set_all_groups_collapsed(True))
+        self.expand_groups_button.clicked.connect(lambda: self.scene.set_all_groups_collapsed(False))
+        self.undo_button.clicked.connect(self.scene.undo)
+        self.redo_button.clicked.connect(self.scene.redo)
+        self.scene.history_changed.connect(self.update_history_buttons)
+        self.update_history_buttons()
 
         self.bottom_layout.addWidget(self.type_button)
         self.bottom_layout.addWidget(self.instance_button)
+        self.bottom_layout.addWidget(self.virtual_button)
+        self.bottom_layout.addWidget(self.compact_button)
+        self.bottom_layout.addWidget(self.layout_button)
+        self.bottom_layout.addWidget(self.import_button)
+        self.bottom_layout.addWidget(self.stats_button)
+        self.bottom_layout.addWidget(self.export_button)
+        groups_layout = QHBoxLayout()
+        groups_layout.addWidget(self.group_button)
+        groups_layout.addWidget(self.collapse_groups_button)
+        groups_layout.addWidget(self.expand_groups_button)
+        self.bottom_layout.addLayout(groups_layout)
+        self.bottom_layout.addWidget(self.undo_button)
+        self.bottom_layout.addWidget(self.redo_button)
+        self.bottom_layout.addWidget(self.search_edit)
+        self.bottom_layout.addWidget(self.search_results)
 
         bottom_widget = QWidget()
         bottom_widget.setLayout(self.bottom_layout)
         self.setMenuWidget(bottom_widget)
     
+    def update_search_results(self): #Обновляет список найденного при вводе текста поиска
+        self.search_results.clear()
+        query = self.search_edit.text()
+        results = self.scene.search(query) if query.strip() else []
+        for kind, text, record in results:
+            if kind == MATCH_DEVICE:
+                title = f"{record.name} ({record.eq_type})"
+            elif kind == MATCH_TYPE:
+                title = f"Тип {text}: {record.name}"
+            elif kind == MATCH_PORT:
+                title = f"Порт {text}: {record.device.name}"
+            else:
+                title = f"Соединение {text}: {record.start.device.name} - {record.end.device.name}"
+            item = QListWidgetItem(title)
+            item.setData(Qt.UserRole, (kind, record))
+            self.search_results.addItem(item)
+        self.search_results.setVisible(bool(results))
+
+    def show_search_result(self, list_item): #Переходит к найденному элементу и выделяет его
+        if list_item is None:
+            return
+        kind, record = list_item.data(Qt.UserRole)
+        item = self.scene.show_search_result(kind, record)
+        if item is not None:
+            self.view.centerOn(item)
+            self.view.push_visible_region()
+
+    def import_tables(self): #Импортирует устройства и соединения из csv таблиц и списков цепей
+        if not self.current_schema_path:
+            QMessageBox.warning(self, 'Ошибка', 'Сначала создайте или откройте схему!')
+            return
+        if self.scene.loading:
+            QMessageBox.warning(self, 'Ошибка', 'Дождитесь окончания загрузки схемы!')
+            return
+        paths, _ = QFileDialog.getOpenFileNames(
+            self, "Импорт устройств и соединений", self.current_schema_path,
+            "Таблицы и списки цепей (*.csv *.txt *.net *.netlist);;Все файлы (*)")
+        if not paths:
+            return
+
+        try:
+            result = self.scene.import_tables(paths)
+        except IMPORT_ERRORS as e:
+            QMessageBox.warning(self, 'Ошибка', f'Не удалось прочитать файл, импорт отменен: {e}')
+            return
+        self.view.push_visible_region()
+
+        lines = [f"Добавлено устройств: {len(result.devices)}",
+                 f"Добавлено соединений: {len(result.connections)}"]
+        if result.rejects:
+            lines.append(f"Отклонено строк: {len(result.rejects)}")
+            for filename, line, reason in result.rejects[:IMPORT_REJECTS_SHOWN]:
+                lines.append(f"    {filename}:{line}: {reason}")
+            if len(result.rejects) > IMPORT_REJECTS_SHOWN:
+                lines.append("    ... (полный список выведен в консоль)")
+                for filename, line, reason in result.rejects:
+                    print(f"{filename}:{line}: {reason}")
+        QMessageBox.information(self, "Импорт", "\n".join(lines))
+
+    def export_schema(self): #Экспортирует схему или выделенную область в PNG, SVG или PDF
+        if self.scene.loading:
+            QMessageBox.warning(self, 'Ошибка', 'Дождитесь окончания загрузки схемы!')
+            return
+        if not self.scene.model.devices:
+            QMessageBox.warning(self, 'Ошибка', 'Схема пуста!')
+            return
+        path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Экспорт схемы", self.current_schema_path or "",
+            "Изображение PNG (*.png);;Векторный рисунок SVG (*.svg);;Документ PDF (*.pdf)")
+        if not path:
+            return
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in (".png", ".svg", ".pdf"):
+            extension = "." + selected_filter.split("*.")[-1].rstrip(")")
+            path += extension
+
+        # Если что-то выделено, экспортируется только область выделения
+        rect = None
+        selected = self.scene.selectedItems()
+        if selected:
+            rect = QRectF()
+            for item in selected:
+                rect = rect.united(item.sceneBoundingRect())
+            rect.adjust(-EXPORT_SELECTION_MARGIN, -EXPORT_SELECTION_MARGIN,
+                        EXPORT_SELECTION_MARGIN, EXPORT_SELECTION_MARGIN)
+
+        dpi, page = 150, "A4"
+        if extension == ".png":
+            dpi, ok = QInputDialog.getInt(self, "Экспорт в PNG", "Разрешение (dpi):", 150, 24, 1200)
+        else:
+            page, ok = QInputDialog.getItem(self, "Экспорт", "Размер страницы:", list(PAGE_SIZES), 0, False)
+        if not ok:
+            return
+
+        progress = QProgressDialog("Экспорт схемы...", None, 0, 0, self)
+        progress.setWindowTitle("Экспорт")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(300)
+
+        def update_progress(done, total):
+            progress.setMaximum(total)
+            progress.setValue(done)
+
+        started = time.perf_counter()
+        try:
+            result = export_file(self.scene, path, rect, dpi=dpi, page=page, progress=update_progress)
+        except OSError as e:
+            QMessageBox.warning(self, 'Ошибка', f'Не удалось записать файл: {e}')
+            return
+        finally:
+            progress.close()
+            self.view.push_visible_region()
+        elapsed = time.perf_counter() - started
+
+        if extension == ".png":
+            text = f"Изображение {result[0]} x {result[1]} сохранено за {elapsed:.1f} с:\n{path}"
+        elif extension == ".pdf":
+            text = f"Страниц: {result}, сохранено за {elapsed:.1f} с:\n{path}"
+        else:
+            text = f"Страниц: {len(result)}, сохранено за {elapsed:.1f} с:\n" + "\n".join(result[:5])
+            if len(result) > 5:
+                text += "\n..."
+        QMessageBox.information(self, "Экспорт", text)
+
+    def show_statistics(self): #Показывает связность схемы и занятость портов по типам
+        analytics = self.scene.analytics
+        components = analytics.components()
+        lines = [
+            f"Устройств: {len(self.scene.model.devices)}",
+            f"Соединений: {len(self.scene.model.connections)}",
+            f"Связанных групп устройств: {len(components)}",
+        ]
+        if components:
+            isolated = sum(1 for component in components if len(component) == 1)
+            lines.append(f"Самая большая группа: {len(components[0])} устройств")
+            lines.append(f"Устройств без соединений: {isolated}")
+        lines.append("")
+        lines.append("Порты по типам (занято / свободно):")
+        for port_type, (used, free) in analytics.port_utilization().items():
+            lines.append(f"    {port_type}: {used} / {free}")
+        QMessageBox.information(self, "Статистика схемы", "\n".join(lines))
+
+    def update_history_buttons(self): #Доступность отмены и повтора
+        self.undo_button.setEnabled(self.scene.history.can_undo())
+        self.redo_button.setEnabled(self.scene.history.can_redo())
+
+    def set_virtualized(self, enabled): #Переключает виртуализированный режим сцены
+        self.view.push_visible_region()
+        self.scene.set_virtualized(enabled)
+
+    def auto_layout(self): #Запрашивает вид раскладки и расставляет все устройства схемы
+        if self.scene.loading:
+            QMessageBox.warning(self, 'Ошибка', 'Дождитесь окончания загрузки схемы!')
+            return
+        kinds = ["Слоями слева направо", "Силовая"]
+        kind, ok = QInputDialog.getItem(self, 'Расстановка устройств', 'Вид раскладки:', kinds, 0, False)
+        if ok:
+            self.scene.auto_layout(layered=(kind == kinds[0]))
+            self.view.push_visible_region()
+
     def prompt_for_schema_action(self): #Запрашивает действие при запуске
         reply = QMessageBox.question(
             self, 
@@ -868,12 +2619,13 @@ class MainWindow(QMainWindow): #Главное окно приложения
         )
         
         if ok and filename:
+            self.scene.cancel_loading()
+            self.scene.flush_pending_save()
             self.current_schema_path = os.path.join("schemas", filename)
             os.makedirs(self.current_schema_path, exist_ok=True)
             os.makedirs(os.path.join(self.current_schema_path, "equipment_types"), exist_ok=True)
             
-            self.scene.clear()
-            self.scene.connections = []
+            self.scene.clear_schema()
             self.scene.schema_path = self.current_schema_path
             
             # Создаем пустую схему
@@ -904,13 +2656,40 @@ class MainWindow(QMainWindow): #Главное окно приложения
             self, "Открыть схему", "schemas", options=options)
         
         if schema_dir:
+            self.scene.cancel_loading()
+            self.scene.flush_pending_save()
             self.current_schema_path = schema_dir
-            self.scene.clear()
-            self.scene.connections = []
-            self.scene.load_schema(schema_dir)
+            self.show_load_progress()
+            self.scene.load_schema_async(schema_dir)
+            self.view.push_visible_region()
             
             base_name = os.path.basename(schema_dir)
             self.setWindowTitle(f"Схема оборудования - {base_name}")
+
+    def show_load_progress(self): #Показывает ход открытия схемы с возможностью отмены
+        progress = QProgressDialog("Чтение файла схемы...", "Отмена", 0, 0, self)
+        progress.setWindowTitle("Открытие схемы")
+        progress.setWindowModality(Qt.NonModal)
+        progress.setMinimumDuration(300)
+        progress.setAutoReset(False)
+        progress.canceled.connect(self.scene.cancel_loading)
+        self.progress_dialog = progress
+
+    def update_load_progress(self, done, total): #Обновляет число загруженных устройств
+        if self.progress_dialog:
+            self.progress_dialog.setLabelText(f"Загружено устройств: {done} из {total}")
+            self.progress_dialog.setMaximum(total)
+            self.progress_dialog.setValue(done)
+
+    def schema_loaded(self, ok): #Закрывает индикатор загрузки
+        if self.progress_dialog:
+            progress, self.progress_dialog = self.progress_dialog, None
+            progress.canceled.disconnect()  # закрытие диалога тоже посылает canceled
+            progress.close()
+            progress.deleteLater()
+        if not ok:
+            self.current_schema_path = None
+            self.setWindowTitle("Создание и соединение оборудования")
     
     def save_schema(self): #Сохраняет схему
         if not self.current_schema_path:
@@ -927,6 +2706,7 @@ class MainWindow(QMainWindow): #Главное окно приложения
         
         if schema_dir:
             self.current_schema_path = schema_dir
+            self.scene.schema_path = schema_dir
             self.save_schema()
             
             base_name = os.path.basename(schema_dir)
@@ -944,13 +2724,23 @@ class MainWindow(QMainWindow): #Главное окно приложения
         if not self.current_schema_path:
             QMessageBox.warning(self, 'Ошибка', 'Сначала создайте или откройте схему!')
             return
+        if self.scene.loading:
+            QMessageBox.warning(self, 'Ошибка', 'Дождитесь окончания загрузки схемы!')
+            return
             
         dialog = EquipmentInstanceDialog(self.scene, self.current_schema_path)
         dialog.exec_()
 
+    def closeEvent(self, event): #Дописывает несохраненные изменения перед выходом
+        self.scene.flush_pending_save()
+        super().closeEvent(event)
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     os.makedirs("schemas", exist_ok=True)
+    if PERF.enabled:
+        perf_output = os.environ.get("EDITOR_PROFILE_OUTPUT", "perf_stats.json")
+        app.aboutToQuit.connect(lambda: PERF.export_json(perf_output))
     window = MainWindow()
     window.show()
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,246 @@
+"""Нагрузочные замеры редактора схем на синтетических схемах.
+
+Генерирует схему из N устройств с M типами портов и K соединениями
+(в формате from_port_id/to_port_id или в старом формате с индексами),
+запускает Qt без дисплея (платформа offscreen) и замеряет загрузку,
+сохранение, перетаскивание устройств, добавление соединений и отрисовку
+всей сцены. Результаты пишутся в json, чтобы сравнивать версии.
+
+Пример:
+    python bench_editor.py --devices 3000 --connections 2500 --output bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QPointF, QRectF, QT_VERSION_STR, PYQT_VERSION_STR
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtWidgets import QApplication
+
+from Editor import EquipmentScene
+from schema_model import DEFAULT_STYLE, SchemaModel, schema_file_path
+
+def generate_schema(devices, port_types, ports_per_device, connections, legacy=False, seed=0): #Генерирует словарь синтетической схемы
+    rng = random.Random(seed)
+    types = [f"P{i}" for i in range(port_types)]
+    columns = max(1, int(devices ** 0.5))
+
+    instances = []
+    free_ports = {port_type: [] for port_type in types}
+    for i in range(devices):
+        name = f"dev{i}"
+        ports = [types[(i + j) % port_types] for j in range(ports_per_device)]
+        instances.append({
+            'name': name,
+            'type': f"Type{i % port_types}",
+            'ports': [{'type': port_type} for port_type in ports],
+            'x': (i % columns) * 300,
+            'y': (i // columns) * 200
+        })
+        for j, port_type in enumerate(ports):
+            free_ports[port_type].append((i, j))
+
+    for ports in free_ports.values():
+        rng.shuffle(ports)
+
+    result = []
+    connected = set()
+    attempts = 0
+    while len(result) < connections and attempts < connections * 10:
+        attempts += 1
+        port_type = types[attempts % port_types]
+        ports = free_ports[port_type]
+        if len(ports) < 2:
+            continue
+        a, b = ports[-1], ports[-2]
+        pair = frozenset((a[0], b[0]))
+        if a[0] == b[0] or pair in connected:
+            rng.shuffle(ports)
+            continue
+        ports.pop()
+        ports.pop()
+        connected.add(pair)
+
+        from_inst, to_inst = instances[a[0]], instances[b[0]]
+        style = dict(DEFAULT_STYLE, name=f"c{len(result)}", line_style=len(result) % 3)
+        connection = {'from': from_inst['name'], 'to': to_inst['name'], 'style': style}
+        if legacy:
+            connection['from_port'] = port_type
+            connection['to_port'] = port_type
+            connection['from_port_index'] = [p['type'] for p in from_inst['ports'][:a[1]]].count(port_type)
+            connection['to_port_index'] = [p['type'] for p in to_inst['ports'][:b[1]]].count(port_type)
+        else:
+            connection['from_port_id'] = f"{from_inst['name']}_{port_type}_{a[1]}"
+            connection['to_port_id'] = f"{to_inst['name']}_{port_type}_{b[1]}"
+        result.append(connection)
+
+    return {"instances": instances, "connections": result}
+
+def write_schema_dir(root, name, schema): #Создает каталог схемы в формате редактора
+    path = os.path.join(root, name)
+    os.makedirs(os.path.join(path, "equipment_types"), exist_ok=True)
+    with open(schema_file_path(path), "w", encoding="utf-8") as f:
+        json.dump(schema, f)
+    return path
+
+def summarize(runs): #Статистика по повторам замера
+    return {
+        'runs': runs,
+        'min': min(runs),
+        'median': statistics.median(runs),
+        'mean': statistics.fmean(runs)
+    }
+
+def measure(func, repeat, setup=None): #Замеряет func repeat раз (setup выполняется вне замера)
+    runs = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            if setup:
+                func(state)
+            else:
+                func()
+            runs.append(time.perf_counter() - started)
+    return summarize(runs)
+
+def load_scene(schema_dir, compact=False): #Сцена с загруженной схемой
+    scene = EquipmentScene()
+    scene.compact_devices = compact
+    with contextlib.redirect_stdout(io.StringIO()):
+        scene.load_schema(schema_dir)
+    return scene
+
+def bench_drag(scene, steps): #Перетаскивание устройств с соединениями (update_connections_for_port/update_path)
+    devices = [item for item in scene.device_items.values()
+               if scene.model.device_connections(item.record)][:20]
+    for step in range(steps):
+        offset = QPointF(3, 2) if step % 2 == 0 else QPointF(-3, -2)
+        for item in devices:
+            item.setPos(item.pos() + offset)
+        scene.flush_moved_devices()
+    return len(devices)
+
+def bench_port_updates(scene): #Прямой вызов update_connections_for_port для всех портов
+    for item in scene.device_items.values():
+        for port in item.port_items:
+            scene.update_connections_for_port(port)
+
+def free_port_pairs(scene, count): #Пары свободных портов одного типа, которые можно соединить
+    free = {}
+    for item in scene.device_items.values():
+        for port in item.port_items:
+            if not scene.is_port_used(port):
+                free.setdefault(port.port_type, []).append(port)
+
+    pairs = []
+    chosen = set()
+    for ports in free.values():
+        while len(ports) >= 2 and len(pairs) < count:
+            start = ports.pop()
+            end = next((p for p in reversed(ports)
+                        if frozenset((start.record.device, p.record.device)) not in chosen
+                        and not scene.model.connection_error(start.record, p.record)), None)
+            if end is None:
+                continue
+            ports.remove(end)
+            chosen.add(frozenset((start.record.device, end.record.device)))
+            pairs.append((start, end))
+    return pairs
+
+def bench_render(scene, size): #Отрисовка всей сцены в изображение
+    image = QImage(size, size, QImage.Format_ARGB32_Premultiplied)
+    image.fill(0xffffffff)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    scene.render(painter, QRectF(0, 0, size, size), scene.itemsBoundingRect())
+    painter.end()
+
+def run(args): #Выполняет все замеры и возвращает словарь результатов
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        schema = generate_schema(args.devices, args.port_types, args.ports_per_device,
+                                 args.connections, seed=args.seed)
+        legacy = generate_schema(args.devices, args.port_types, args.ports_per_device,
+                                 args.connections, legacy=True, seed=args.seed)
+        schema_dir = write_schema_dir(root, "bench", schema)
+        legacy_dir = write_schema_dir(root, "bench_legacy", legacy)
+
+        started = time.perf_counter()
+        SchemaModel.from_dict(schema)
+        results['model_from_dict'] = summarize([time.perf_counter() - started])
+
+        results['load_schema'] = measure(lambda: load_scene(schema_dir, args.compact), args.repeat)
+        results['load_schema_legacy'] = measure(lambda: load_scene(legacy_dir, args.compact), args.repeat)
+
+        scene = load_scene(schema_dir, args.compact)
+        app.processEvents()
+        results['save_schema'] = measure(scene.save_schema, args.repeat)
+        results['update_connections_for_port'] = measure(lambda: bench_port_updates(scene), args.repeat)
+
+        rebuilds_before = scene.path_rebuild_count
+        results['drag'] = measure(lambda: bench_drag(scene, args.drag_steps), args.repeat)
+        results['drag']['path_rebuilds'] = scene.path_rebuild_count - rebuilds_before
+
+        results['add_connection'] = measure(
+            lambda pairs: [scene.add_connection(start, end, dict(DEFAULT_STYLE)) for start, end in pairs],
+            args.repeat, setup=lambda: free_port_pairs(scene, args.add_connections))
+        results['render'] = measure(lambda: bench_render(scene, args.render_size), args.repeat)
+
+        scene.flush_pending_save()
+        connections = len(scene.model.connections)
+
+    return {
+        'meta': {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(),
+            'qt': QT_VERSION_STR,
+            'pyqt': PYQT_VERSION_STR,
+            'platform': platform.platform(),
+            'params': vars(args),
+            'connections_after_add': connections
+        },
+        'results': results
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности редактора схем")
+    parser.add_argument("--devices", type=int, default=1000, help="число устройств")
+    parser.add_argument("--port-types", type=int, default=4, help="число типов портов")
+    parser.add_argument("--ports-per-device", type=int, default=8, help="портов на устройство")
+    parser.add_argument("--connections", type=int, default=800, help="число соединений")
+    parser.add_argument("--add-connections", type=int, default=100,
+                        help="сколько соединений добавлять в замере add_connection")
+    parser.add_argument("--drag-steps", type=int, default=30, help="шагов перетаскивания")
+    parser.add_argument("--render-size", type=int, default=2048, help="размер изображения при отрисовке")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов каждого замера")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compact", action="store_true", help="устройства одним графическим элементом")
+    parser.add_argument("--output", help="json файл для результатов (по умолчанию stdout)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    for name, stats in report['results'].items():
+        print(f"{name:30s} min {stats['min'] * 1000:9.2f} мс   median {stats['median'] * 1000:9.2f} мс",
+              file=sys.stderr)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
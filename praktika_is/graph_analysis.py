@@ -0,0 +1,190 @@
+"""Анализ графа схемы: компоненты связности, пути, нижестоящие устройства
+и занятость портов.
+
+Граф - устройства модели и соединения между ними; направление сигнала -
+от начала соединения к его концу. Анализ подключается к модели
+(SchemaModel.enable_analytics) и обновляется вместе с ней:
+
+- занятость портов по типам - счетчики, которые меняются за O(1);
+- компоненты связности: при добавлении соединения меньшая компонента
+  вливается в большую, а при удалении компонента только помечается, и
+  проверка на распад делается обходом одной этой компоненты при
+  следующем запросе;
+- кратчайшие пути и нижестоящие устройства считаются обходом в ширину
+  и кэшируются до следующего изменения соединений.
+"""
+from collections import deque
+
+class SchemaGraph: #Аналитика графа устройств модели, обновляемая вместе с моделью
+    def __init__(self, model):
+        self.model = model
+        self.component = {}  # DeviceRecord -> номер компоненты
+        self.members = {}  # номер компоненты -> множество устройств
+        self._dirty = set()  # компоненты, которые могли распасться после удаления соединений
+        self._next_id = 0
+        self.port_usage = {}  # тип порта -> [всего портов, занятых портов]
+        self._paths = {}  # (начало, конец, по направлению) -> путь
+        self._downstream = {}  # DeviceRecord -> frozenset нижестоящих устройств
+
+        for device in model.devices.values():
+            self.device_added(device)
+        for connection in model.connections:
+            self.connection_added(connection)
+
+    # Обновление (вызывается моделью)
+
+    def device_added(self, device):
+        self._new_component({device})
+        for port in device.ports:
+            self.port_usage.setdefault(port.port_type, [0, 0])[0] += 1
+
+    def device_removed(self, device): #Устройство удаляется после своих соединений, поэтому оно одно в компоненте
+        cid = self.component.pop(device)
+        members = self.members[cid]
+        members.discard(device)
+        if not members:
+            del self.members[cid]
+            self._dirty.discard(cid)
+        for port in device.ports:
+            self.port_usage[port.port_type][0] -= 1
+        self._downstream.pop(device, None)
+
+    def connection_added(self, connection):
+        self._connections_changed()
+        for port in (connection.start, connection.end):
+            self.port_usage[port.port_type][1] += 1
+
+        first = self.component[connection.start.device]
+        second = self.component[connection.end.device]
+        if first == second:
+            return
+        if len(self.members[first]) < len(self.members[second]):
+            first, second = second, first
+        moved = self.members.pop(second)
+        for device in moved:
+            self.component[device] = first
+        self.members[first] |= moved
+        if second in self._dirty:
+            self._dirty.discard(second)
+            self._dirty.add(first)
+
+    def connection_removed(self, connection):
+        self._connections_changed()
+        for port in (connection.start, connection.end):
+            self.port_usage[port.port_type][1] -= 1
+        self._dirty.add(self.component[connection.start.device])
+
+    def _connections_changed(self):
+        self._paths.clear()
+        self._downstream.clear()
+
+    def _new_component(self, devices):
+        cid = self._next_id
+        self._next_id += 1
+        self.members[cid] = devices
+        for device in devices:
+            self.component[device] = cid
+        return cid
+
+    def neighbours(self, device): #Соседние устройства (без учета направления)
+        port_connections = self.model.port_connections
+        for port in device.ports:
+            connection = port_connections.get(port)
+            if connection is not None:
+                yield connection.other_port(port).device
+
+    def _reachable(self, device): #Устройства, достижимые из device без учета направления
+        seen = {device}
+        queue = deque([device])
+        while queue:
+            for other in self.neighbours(queue.popleft()):
+                if other not in seen:
+                    seen.add(other)
+                    queue.append(other)
+        return seen
+
+    def _refresh(self): #Разделяет помеченные компоненты, если они распались
+        while self._dirty:
+            cid = self._dirty.pop()
+            remaining = set(self.members[cid])
+            part = self._reachable(next(iter(remaining)))
+            if len(part) == len(remaining):
+                continue
+            self.members[cid] = part
+            remaining -= part
+            while remaining:
+                part = self._reachable(next(iter(remaining)))
+                self._new_component(part)
+                remaining -= part
+
+    # Запросы
+
+    def components(self): #Компоненты связности (множества устройств), самые большие первыми
+        self._refresh()
+        return sorted(self.members.values(), key=len, reverse=True)
+
+    def component_of(self, device): #Устройства, связанные с device
+        self._refresh()
+        return self.members[self.component[device]]
+
+    def connected(self, first, second): #Связаны ли устройства каким-либо путем
+        self._refresh()
+        return self.component[first] == self.component[second]
+
+    def downstream(self, device): #Устройства, до которых доходит сигнал от device (по направлению соединений)
+        result = self._downstream.get(device)
+        if result is not None:
+            return result
+        port_connections = self.model.port_connections
+        seen = {device}
+        queue = deque([device])
+        while queue:
+            current = queue.popleft()
+            for port in current.ports:
+                connection = port_connections.get(port)
+                if connection is not None and connection.start is port:
+                    other = connection.end.device
+                    if other not in seen:
+                        seen.add(other)
+                        queue.append(other)
+        seen.discard(device)
+        result = self._downstream[device] = frozenset(seen)
+        return result
+
+    def shortest_path(self, start, goal, directed=False): #Кратчайший по числу соединений путь [start, ..., goal] или None
+        key = (start, goal, directed)
+        if key in self._paths:
+            return self._paths[key]
+        path = None
+        if start is goal:
+            path = [start]
+        elif self.connected(start, goal):
+            path = self._bfs_path(start, goal, directed)
+        self._paths[key] = path
+        return path
+
+    def _bfs_path(self, start, goal, directed):
+        port_connections = self.model.port_connections
+        parents = {start: None}
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            for port in current.ports:
+                connection = port_connections.get(port)
+                if connection is None or (directed and connection.start is not port):
+                    continue
+                other = connection.other_port(port).device
+                if other in parents:
+                    continue
+                parents[other] = current
+                if other is goal:
+                    path = [goal]
+                    while parents[path[-1]] is not None:
+                        path.append(parents[path[-1]])
+                    return path[::-1]
+                queue.append(other)
+        return None
+
+    def port_utilization(self): #Занятость портов: тип -> (занято, свободно)
+        return {port_type: (used, total - used)
+                for port_type, (total, used) in sorted(self.port_usage.items()) if total}
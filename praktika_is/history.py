@@ -0,0 +1,230 @@
+"""История изменений схемы для отмены и повтора.
+
+Каждая команда хранит только разницу: запись добавленного или удаленного
+устройства (вместе с удаленными соединениями), записи соединений,
+старый и новый стиль, старые и новые координаты перемещенных устройств.
+Команда записывается в историю уже выполненной, а отмена и повтор
+вызывают у цели (сцены) методы, которые меняют модель, ее индексы и
+графические элементы точечно, без перечитывания и полной перерисовки
+схемы:
+
+    insert_device(device), remove_device(device)
+    insert_connection(connection), remove_connection(connection)
+    move_devices({device: (x, y)}), restyle_connection(connection, style)
+    insert_group(group), remove_group(group)
+
+Размер истории ограничен числом команд и примерной занимаемой памятью;
+при превышении забываются самые старые команды.
+"""
+from abc import ABC, abstractmethod
+from collections import deque
+
+UNDO_DEPTH = 200  # Сколько команд можно отменить
+UNDO_MEMORY_LIMIT = 8 * 1024 * 1024  # Примерный предел памяти истории (байт)
+
+# Примерные размеры для оценки памяти команд (байт)
+_COMMAND_SIZE = 64
+_REFERENCE_SIZE = 8
+_POSITION_SIZE = 120  # ключ словаря и кортеж (x, y, x, y)
+_STYLE_SIZE = 400  # словарь стиля соединения
+
+class Command(ABC): #Изменение схемы, которое можно отменить и повторить
+    __slots__ = ()
+    text = ""
+
+    @abstractmethod
+    def undo(self, target):
+        pass
+
+    @abstractmethod
+    def redo(self, target):
+        pass
+
+    def size(self): #Примерная память команды в байтах
+        return _COMMAND_SIZE
+
+class AddDevice(Command):
+    __slots__ = ('device',)
+    text = "Добавление устройства"
+
+    def __init__(self, device):
+        self.device = device
+
+    def undo(self, target):
+        target.remove_device(self.device)
+
+    def redo(self, target):
+        target.insert_device(self.device)
+
+class RemoveDevice(Command):
+    __slots__ = ('device', 'connections')
+    text = "Удаление устройства"
+
+    def __init__(self, device, connections):
+        self.device = device
+        self.connections = tuple(connections)  # соединения, удаленные вместе с устройством
+
+    def undo(self, target):
+        target.insert_device(self.device)
+        for connection in self.connections:
+            target.insert_connection(connection)
+
+    def redo(self, target):
+        target.remove_device(self.device)
+
+    def size(self):
+        return _COMMAND_SIZE + _REFERENCE_SIZE * len(self.connections)
+
+class AddConnection(Command):
+    __slots__ = ('connection',)
+    text = "Добавление соединения"
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def undo(self, target):
+        target.remove_connection(self.connection)
+
+    def redo(self, target):
+        target.insert_connection(self.connection)
+
+class RemoveConnection(Command):
+    __slots__ = ('connection',)
+    text = "Удаление соединения"
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def undo(self, target):
+        target.insert_connection(self.connection)
+
+    def redo(self, target):
+        target.remove_connection(self.connection)
+
+class MoveDevices(Command):
+    __slots__ = ('moves',)
+    text = "Перемещение устройств"
+
+    def __init__(self, moves):
+        self.moves = moves  # DeviceRecord -> (старый x, старый y, новый x, новый y)
+
+    def undo(self, target):
+        target.move_devices({device: (x, y) for device, (x, y, _, _) in self.moves.items()})
+
+    def redo(self, target):
+        target.move_devices({device: (x, y) for device, (_, _, x, y) in self.moves.items()})
+
+    def size(self):
+        return _COMMAND_SIZE + _POSITION_SIZE * len(self.moves)
+
+class RestyleConnection(Command):
+    __slots__ = ('connection', 'old_style', 'new_style')
+    text = "Изменение стиля соединения"
+
+    def __init__(self, connection, old_style, new_style):
+        self.connection = connection
+        self.old_style = old_style
+        self.new_style = new_style
+
+    def undo(self, target):
+        target.restyle_connection(self.connection, self.old_style)
+
+    def redo(self, target):
+        target.restyle_connection(self.connection, self.new_style)
+
+    def size(self):
+        return _COMMAND_SIZE + 2 * _STYLE_SIZE
+
+class AddGroup(Command):
+    __slots__ = ('group',)
+    text = "Группировка устройств"
+
+    def __init__(self, group):
+        self.group = group  # GroupRecord, состав хранится в самой записи
+
+    def undo(self, target):
+        target.remove_group(self.group)
+
+    def redo(self, target):
+        target.insert_group(self.group)
+
+    def size(self):
+        return _COMMAND_SIZE + _REFERENCE_SIZE * (len(self.group.members) + len(self.group.children))
+
+class RemoveGroup(AddGroup):
+    __slots__ = ()
+    text = "Разгруппировка устройств"
+
+    def undo(self, target):
+        target.insert_group(self.group)
+
+    def redo(self, target):
+        target.remove_group(self.group)
+
+class CommandGroup(Command): #Несколько изменений, которые отменяются и повторяются вместе
+    __slots__ = ('commands',)
+    text = "Групповое изменение"
+
+    def __init__(self, commands):
+        self.commands = tuple(commands)
+
+    def undo(self, target):
+        for command in reversed(self.commands):
+            command.undo(target)
+
+    def redo(self, target):
+        for command in self.commands:
+            command.redo(target)
+
+    def size(self):
+        return _COMMAND_SIZE + sum(command.size() for command in self.commands)
+
+class UndoStack: #Стек отмены и повтора с ограничением глубины и памяти
+    def __init__(self, depth=UNDO_DEPTH, memory_limit=UNDO_MEMORY_LIMIT):
+        self.depth = depth
+        self.memory_limit = memory_limit
+        self._undo = deque()
+        self._redo = []
+        self.memory = 0  # Примерная память обоих стеков
+
+    def __len__(self):
+        return len(self._undo)
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def push(self, command): #Записывает уже выполненную команду; история повтора сбрасывается
+        for redo_command in self._redo:
+            self.memory -= redo_command.size()
+        self._redo.clear()
+        self._undo.append(command)
+        self.memory += command.size()
+        self._trim()
+
+    def undo(self, target): #Отменяет последнюю команду, возвращает ее или None
+        if not self._undo:
+            return None
+        command = self._undo.pop()
+        command.undo(target)
+        self._redo.append(command)
+        return command
+
+    def redo(self, target): #Повторяет последнюю отмененную команду, возвращает ее или None
+        if not self._redo:
+            return None
+        command = self._redo.pop()
+        command.redo(target)
+        self._undo.append(command)
+        return command
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+        self.memory = 0
+
+    def _trim(self): #Забывает самые старые команды сверх глубины и предела памяти
+        while self._undo and (len(self._undo) > self.depth or self.memory > self.memory_limit):
+            self.memory -= self._undo.popleft().size()
@@ -0,0 +1,226 @@
+"""Массовый импорт устройств и соединений из таблиц (csv) и списков цепей.
+
+Файлы читаются построчно, каждая строка сразу добавляется в модель,
+поэтому весь файл в памяти не хранится. Строки, которые нельзя
+добавить, не прерывают импорт, а попадают в список отказов с номером
+строки и причиной.
+
+Таблица устройств (разделитель , ; или табуляция, первая строка -
+заголовок):
+    name, type[, ports][, x, y]
+ports - типы портов через пробел; если столбца нет, порты берутся из
+типа оборудования (equipment_types/<type>.xml). Если у схемы есть типы
+оборудования, устройства неизвестного типа не импортируются. Устройства
+без координат расставляются рядом с соединенными с ними устройствами.
+
+Таблица соединений:
+    from, to, from_port, to_port[, from_port_index, to_port_index]
+    [, name, color, line_style, start_style, end_style, width]
+from_port/to_port - тип порта; без индекса берется первый свободный
+порт этого типа. Вместо from_port/to_port можно указать
+from_port_id/to_port_id.
+
+Если файл не удается прочитать (ошибка ввода-вывода, кодировки или
+формата csv), все уже добавленное этим импортом удаляется из модели, и
+ошибка передается вызывающему.
+
+Список цепей (.net): по соединению в строке, # - комментарий:
+    <устройство>:<тип порта>[:<индекс>] <устройство>:<тип порта>[:<индекс>] [название]
+"""
+import csv
+import os
+
+from schema_model import DEFAULT_STYLE, SchemaError
+
+TABLE_DEVICES = "devices"
+TABLE_CONNECTIONS = "connections"
+TABLE_NETLIST = "netlist"
+
+NETLIST_EXTENSIONS = (".net", ".netlist")
+STYLE_COLUMNS = ('name', 'color', 'line_style', 'start_style', 'end_style', 'width')
+# Ошибки чтения файла, при которых импорт отменяется целиком
+IMPORT_ERRORS = (OSError, UnicodeDecodeError, csv.Error)
+
+class ImportResult: #Итог импорта: добавленные записи модели и отказы
+    def __init__(self):
+        self.devices = []  # добавленные DeviceRecord
+        self.connections = []  # добавленные ConnectionRecord
+        self.unplaced = []  # устройства без координат (расставляются после импорта соединений)
+        self.rejects = []  # (файл, номер строки, причина)
+
+    def reject(self, path, line, reason):
+        self.rejects.append((os.path.basename(path), line, reason))
+
+def _open_table(path): #Открывает csv таблицу и возвращает (файл, DictReader) с определенным разделителем
+    f = open(path, "r", encoding="utf-8-sig", newline="")
+    sample = f.read(4096)
+    f.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    return f, csv.DictReader(f, dialect=dialect)
+
+def table_kind(path): #Вид файла импорта по расширению и заголовку таблицы
+    if path.lower().endswith(NETLIST_EXTENSIONS):
+        return TABLE_NETLIST
+    f, reader = _open_table(path)
+    with f:
+        columns = set(reader.fieldnames or ())
+    return TABLE_CONNECTIONS if 'from' in columns and 'to' in columns else TABLE_DEVICES
+
+def import_devices(model, path, types, result): #Импортирует таблицу устройств
+    f, reader = _open_table(path)
+    with f:
+        for row in reader:
+            line = reader.line_num
+            name = (row.get('name') or "").strip()
+            eq_type = (row.get('type') or "").strip()
+            if not name or not eq_type:
+                result.reject(path, line, "не указано имя или тип устройства")
+                continue
+
+            expected = types.get(eq_type)
+            if types and expected is None:
+                result.reject(path, line, f"{name}: неизвестный тип оборудования {eq_type}")
+                continue
+            ports = row.get('ports')
+            if ports and ports.strip():
+                port_types = ports.split()
+                if expected is not None and expected != port_types:
+                    result.reject(path, line, f"{name}: порты {port_types} не совпадают с типом {eq_type}")
+                    continue
+            elif expected is not None:
+                port_types = expected
+            else:
+                result.reject(path, line, f"{name}: неизвестный тип оборудования {eq_type}")
+                continue
+
+            try:
+                x, y = row.get('x'), row.get('y')
+                placed = bool(x and x.strip() and y and y.strip())
+                device = model.add_device(name, eq_type, port_types,
+                                          float(x) if placed else None, float(y) if placed else None)
+            except ValueError:
+                result.reject(path, line, f"{name}: неверные координаты")
+                continue
+            except SchemaError as e:
+                result.reject(path, line, str(e))
+                continue
+            result.devices.append(device)
+            if not placed:
+                result.unplaced.append(device)
+
+def _find_port(model, device_name, port_type, index): #Порт устройства по типу и номеру среди портов этого типа (None - первый свободный)
+    device = model.devices.get(device_name)
+    if device is None:
+        raise SchemaError(f"нет устройства {device_name}")
+    ports = [port for port in device.ports if port.port_type == port_type]
+    if not ports:
+        raise SchemaError(f"у {device_name} нет портов {port_type}")
+    if index is None:
+        for port in ports:
+            if port not in model.port_connections:
+                return port
+        raise SchemaError(f"у {device_name} все порты {port_type} заняты")
+    if not 0 <= index < len(ports):
+        raise SchemaError(f"у {device_name} нет порта {port_type} №{index}")
+    return ports[index]
+
+def _connection_style(row): #Стиль соединения из необязательных столбцов
+    style = dict(DEFAULT_STYLE)
+    for column in STYLE_COLUMNS:
+        value = row.get(column)
+        if value is None or not value.strip():
+            continue
+        value = value.strip()
+        if column in ('name', 'color'):
+            style[column] = value
+        elif column == 'width':
+            style[column] = float(value) if "." in value else int(value)
+        else:
+            style[column] = int(value)
+    return style
+
+def _add_connection(model, row, path, line, result): #Добавляет соединение из строки таблицы или списка цепей
+    try:
+        if row.get('from_port_id') and row.get('to_port_id'):
+            start = model.ports.get(row['from_port_id'].strip())
+            end = model.ports.get(row['to_port_id'].strip())
+            if start is None or end is None:
+                raise SchemaError("порт не найден")
+        else:
+            from_index = row.get('from_port_index')
+            to_index = row.get('to_port_index')
+            start = _find_port(model, (row.get('from') or "").strip(), (row.get('from_port') or "").strip(),
+                               int(from_index) if from_index and from_index.strip() else None)
+            end = _find_port(model, (row.get('to') or "").strip(), (row.get('to_port') or "").strip(),
+                             int(to_index) if to_index and to_index.strip() else None)
+        if start.port_type != end.port_type:
+            raise SchemaError(f"разные типы портов {start.port_type} и {end.port_type}")
+        result.connections.append(model.add_connection(start, end, _connection_style(row)))
+    except ValueError:
+        result.reject(path, line, "неверное число в строке")
+    except SchemaError as e:
+        result.reject(path, line, str(e))
+
+def import_connections(model, path, result): #Импортирует таблицу соединений
+    f, reader = _open_table(path)
+    with f:
+        for row in reader:
+            _add_connection(model, row, path, reader.line_num, result)
+
+def _netlist_port(text): #Разбирает "<устройство>:<тип порта>[:<индекс>]"
+    parts = text.rsplit(":", 2)
+    if len(parts) == 3 and parts[2].isdigit():
+        return parts[0], parts[1], parts[2]
+    device, _, port_type = text.rpartition(":")
+    return device, port_type, ""
+
+def import_netlist(model, path, result): #Импортирует список цепей
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for line, text in enumerate(f, 1):
+            text = text.split("#", 1)[0].strip()
+            if not text:
+                continue
+            fields = text.split(None, 2)
+            if len(fields) < 2:
+                result.reject(path, line, "ожидается два порта")
+                continue
+            start, end = _netlist_port(fields[0]), _netlist_port(fields[1])
+            row = {
+                'from': start[0], 'from_port': start[1], 'from_port_index': start[2],
+                'to': end[0], 'to_port': end[1], 'to_port_index': end[2],
+                'name': fields[2] if len(fields) > 2 else ""
+            }
+            _add_connection(model, row, path, line, result)
+
+def rollback(model, result): #Удаляет из модели все, что добавил импорт
+    for connection in reversed(result.connections):
+        model.remove_connection(connection)
+    for device in reversed(result.devices):
+        model.remove_device(device)
+    result.devices, result.connections, result.unplaced = [], [], []
+
+def import_files(model, paths, types=None, place=None): #Импортирует файлы (сначала устройства, затем соединения) целиком или никак
+    types = types or {}
+    result = ImportResult()
+    try:
+        kinds = [(table_kind(path), path) for path in paths]
+        for kind, path in kinds:
+            if kind == TABLE_DEVICES:
+                import_devices(model, path, types, result)
+        for kind, path in kinds:
+            if kind == TABLE_CONNECTIONS:
+                import_connections(model, path, result)
+            elif kind == TABLE_NETLIST:
+                import_netlist(model, path, result)
+    except IMPORT_ERRORS:
+        rollback(model, result)
+        raise
+
+    # Устройства без координат расставляются, когда известны их соединения
+    if result.unplaced and place is not None:
+        for device, (x, y) in place(model, result.unplaced).items():
+            model.move_device(device, x, y)
+    return result
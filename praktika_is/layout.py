@@ -0,0 +1,345 @@
+"""Автоматическая раскладка устройств схемы (NumPy).
+
+Силовая раскладка (Fruchterman-Reingold, отталкивание только между
+близкими устройствами через сетку) и раскладка слоями слева направо
+считаются пакетно для всех устройств сразу. Функции не меняют модель,
+а возвращают новые координаты {DeviceRecord: (x, y)}.
+place_new_devices расставляет только новые устройства рядом с уже
+соединенными с ними, не сдвигая остальные.
+
+Расчет ведется в единицах ячейки раскладки (CELL_WIDTH x CELL_HEIGHT),
+поэтому широкие устройства с подписями портов не накладываются друг на
+друга после привязки к сетке.
+"""
+import functools
+import math
+from collections import deque
+
+import numpy as np
+
+from schema_model import DEVICE_WIDTH, DEVICE_HEIGHT, LABEL_MARGIN, SchemaModel
+
+# Ячейка раскладки: устройство с подписями портов и зазор между соседями
+CELL_WIDTH = DEVICE_WIDTH + 2 * LABEL_MARGIN + 40
+CELL_HEIGHT = DEVICE_HEIGHT + 50
+ORIGIN = (50.0, 50.0)  # Левый верхний угол раскладки всей схемы
+
+FORCE_ITERATIONS = 100
+INCREMENTAL_ITERATIONS = 40
+LAYER_SWEEPS = 8  # Проходы упорядочивания устройств внутри слоев
+GRAVITY = 0.01  # Притяжение к центру, чтобы несвязанные части не расползались
+PAIRS_REFRESH = 3  # Через сколько итераций заново ищутся близкие пары устройств
+
+_NEIGHBOR_CELLS = ((0, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+def graph_arrays(model, devices=None): #Список устройств, их номера и массив ребер (число соединений, 2)
+    devices = list(model.devices.values()) if devices is None else list(devices)
+    index = {device: i for i, device in enumerate(devices)}
+    edges = [(index[conn.start.device], index[conn.end.device]) for conn in model.connections
+             if conn.start.device in index and conn.end.device in index]
+    return devices, index, np.array(edges, dtype=np.int64).reshape(-1, 2)
+
+def _close_pairs(pos, radius): #Пары точек (i, j), i != j, расположенных ближе radius
+    cells = np.floor(pos / radius).astype(np.int64)
+    cells -= cells.min(axis=0) - 1  # соседние ячейки тоже неотрицательны
+    width = int(cells[:, 0].max()) + 2
+    keys = cells[:, 1] * width + cells[:, 0]
+
+    order = np.argsort(keys, kind="stable")
+    unique, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+    pairs_i, pairs_j = [], []
+    for dx, dy in _NEIGHBOR_CELLS:
+        target = keys + dy * width + dx
+        slot = np.minimum(np.searchsorted(unique, target), len(unique) - 1)
+        source = np.nonzero(unique[slot] == target)[0]
+        n = counts[slot[source]]
+        i = np.repeat(source, n)
+        within = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        j = order[np.repeat(starts[slot[source]], n) + within]
+        if dx == 0 and dy == 0:
+            keep = i < j
+            i, j = i[keep], j[keep]
+        pairs_i.append(i)
+        pairs_j.append(j)
+
+    i = np.concatenate(pairs_i)
+    j = np.concatenate(pairs_j)
+    delta = pos[i] - pos[j]
+    keep = (delta ** 2).sum(axis=1) < radius * radius
+    return i[keep], j[keep]
+
+def _force_iterations(pos, edges, movable, iterations, temperature): #Итерации силовой раскладки (идеальное расстояние 1)
+    n = len(pos)
+    for step in range(iterations):
+        disp = np.zeros_like(pos)
+
+        # Отталкивание k^2 / d только между устройствами ближе 2k. Пары ищутся
+        # с запасом по радиусу и переиспользуются несколько итераций
+        if step % PAIRS_REFRESH == 0:
+            i, j = _close_pairs(pos, 2.5)
+        if len(i):
+            delta = pos[i] - pos[j]
+            dist2 = np.maximum((delta ** 2).sum(axis=1), 1e-4)
+            force = delta * ((dist2 < 4.0) / dist2)[:, None]
+            for axis in (0, 1):
+                disp[:, axis] += (np.bincount(i, force[:, axis], n) -
+                                  np.bincount(j, force[:, axis], n))
+
+        # Притяжение d^2 / k вдоль соединений
+        if len(edges):
+            a, b = edges[:, 0], edges[:, 1]
+            delta = pos[a] - pos[b]
+            force = delta * np.sqrt((delta ** 2).sum(axis=1))[:, None]
+            for axis in (0, 1):
+                disp[:, axis] += (np.bincount(b, force[:, axis], n) -
+                                  np.bincount(a, force[:, axis], n))
+
+        disp -= GRAVITY * (pos - pos.mean(axis=0))
+
+        # Сдвиг ограничен "температурой", которая линейно падает до нуля
+        limit = temperature * (1.0 - step / iterations)
+        length = np.sqrt((disp ** 2).sum(axis=1))
+        disp *= (np.minimum(length, limit) / np.maximum(length, 1e-9))[:, None]
+        if movable is None:
+            pos += disp
+        else:
+            pos[movable] += disp[movable]
+    return pos
+
+@functools.lru_cache(maxsize=64)
+def _ring(radius): #Смещения ячеек на квадратном кольце радиуса radius, ближние первыми
+    if radius == 0:
+        return [(0, 0)]
+    cells = [(dx, dy) for dx in range(-radius, radius + 1) for dy in (-radius, radius)]
+    cells += [(dx, dy) for dx in (-radius, radius) for dy in range(-radius + 1, radius)]
+    cells.sort(key=lambda c: c[0] * c[0] + c[1] * c[1])
+    return tuple(cells)
+
+def _snap_to_cells(pos): #Привязывает точки к целочисленным ячейкам без совпадений (ближайшая свободная)
+    wanted = np.rint(pos).astype(np.int64)
+    # Сначала расставляются точки, ближе всего лежащие к центру своей ячейки
+    order = np.argsort(((pos - wanted) ** 2).sum(axis=1), kind="stable")
+    occupied = set()
+    result = np.empty_like(wanted)
+    for i in order:
+        cx, cy = int(wanted[i, 0]), int(wanted[i, 1])
+        radius = 0
+        while True:
+            cell = next(((cx + dx, cy + dy) for dx, dy in _ring(radius)
+                         if (cx + dx, cy + dy) not in occupied), None)
+            if cell is not None:
+                break
+            radius += 1
+        occupied.add(cell)
+        result[i] = cell
+    return result
+
+def _cells_to_positions(devices, cells): #Координаты сцены для ячеек раскладки (начиная с ORIGIN)
+    cells = cells - cells.min(axis=0)
+    return {device: (ORIGIN[0] + float(cx) * CELL_WIDTH, ORIGIN[1] + float(cy) * CELL_HEIGHT)
+            for device, (cx, cy) in zip(devices, cells.tolist())}
+
+def _bfs_order(n, edges): #Порядок обхода в ширину по всем компонентам связности
+    adjacency = [[] for _ in range(n)]
+    for a, b in edges.tolist():
+        adjacency[a].append(b)
+        adjacency[b].append(a)
+
+    seen = [False] * n
+    order = []
+    for start in range(n):
+        if seen[start]:
+            continue
+        seen[start] = True
+        queue = deque([start])
+        while queue:
+            v = queue.popleft()
+            order.append(v)
+            for w in adjacency[v]:
+                if not seen[w]:
+                    seen[w] = True
+                    queue.append(w)
+    return np.array(order, dtype=np.int64)
+
+def force_directed_layout(model, iterations=FORCE_ITERATIONS): #Силовая раскладка всей схемы
+    devices, _, edges = graph_arrays(model)
+    n = len(devices)
+    if not n:
+        return {}
+
+    # Начальное положение: устройства в порядке обхода в ширину змейкой по
+    # квадрату, так что соединенные устройства сразу оказываются рядом и
+    # силам остается только локально улучшить раскладку
+    side = int(math.ceil(math.sqrt(n)))
+    k = np.arange(n)
+    row = k // side
+    pos = np.empty((n, 2))
+    order = _bfs_order(n, edges)
+    pos[order, 0] = np.where(row % 2 == 0, k % side, side - 1 - k % side)
+    pos[order, 1] = row
+
+    pos = _force_iterations(pos, edges, None, iterations, 2.0)
+    return _cells_to_positions(devices, _snap_to_cells(pos))
+
+def _longest_path_layers(n, edges): #Номер слоя каждого устройства: длина самого длинного пути до него
+    successors = [[] for _ in range(n)]
+    indegree = [0] * n
+    for a, b in edges.tolist():
+        if a != b:
+            successors[a].append(b)
+            indegree[b] += 1
+
+    layers = [0] * n
+    done = [False] * n
+    ready = [v for v in range(n) if indegree[v] == 0]
+    processed = 0
+    while processed < n:
+        if not ready:
+            # Цикл: он разрывается на устройстве с наименьшим числом входящих соединений
+            ready.append(min((v for v in range(n) if not done[v]), key=indegree.__getitem__))
+        v = ready.pop()
+        if done[v]:
+            continue
+        done[v] = True
+        processed += 1
+        for w in successors[v]:
+            if not done[w]:
+                layers[w] = max(layers[w], layers[v] + 1)
+                indegree[w] -= 1
+                if indegree[w] == 0:
+                    ready.append(w)
+    return np.array(layers, dtype=np.int64)
+
+def layered_layout(model, sweeps=LAYER_SWEEPS): #Раскладка слоями слева направо по направлению соединений (from -> to)
+    devices, _, edges = graph_arrays(model)
+    n = len(devices)
+    if not n:
+        return {}
+
+    connected = np.zeros(n, dtype=bool)
+    connected[edges.ravel()] = True
+    linked = np.nonzero(connected)[0]
+    isolated = np.nonzero(~connected)[0]
+    cells = np.zeros((n, 2), dtype=np.int64)
+
+    if len(linked):
+        remap = np.full(n, -1, dtype=np.int64)
+        remap[linked] = np.arange(len(linked))
+        sub_edges = remap[edges]
+        m = len(linked)
+        layers = _longest_path_layers(m, sub_edges)
+        layer_sizes = np.bincount(layers)
+        layer_starts = np.concatenate(([0], np.cumsum(layer_sizes)[:-1]))
+
+        # Порядок внутри слоя: по среднему положению соседей (метод барицентров).
+        # Слои выравниваются по центру самого высокого слоя
+        offset = (layer_sizes.max() - layer_sizes[layers]) // 2
+        order = np.lexsort((np.arange(m), layers))
+        row = np.empty(m, dtype=np.int64)
+        row[order] = np.arange(m) - layer_starts[layers[order]] + offset[order]
+        a, b = sub_edges[:, 0], sub_edges[:, 1]
+        degree = np.bincount(a, minlength=m) + np.bincount(b, minlength=m)
+        for _ in range(sweeps):
+            barycenter = (np.bincount(a, row[b], m) + np.bincount(b, row[a], m)) / np.maximum(degree, 1)
+            order = np.lexsort((row, barycenter, layers))
+            row[order] = np.arange(m) - layer_starts[layers[order]] + offset[order]
+
+        cells[linked, 0] = layers
+        cells[linked, 1] = row
+        top = int(layer_sizes.max()) + 1
+    else:
+        top = 0
+
+    # Устройства без соединений - отдельным блоком под графом
+    if len(isolated):
+        columns = max(1, int(math.ceil(math.sqrt(len(isolated)))))
+        cells[isolated, 0] = np.arange(len(isolated)) % columns
+        cells[isolated, 1] = top + np.arange(len(isolated)) // columns
+
+    return _cells_to_positions(devices, cells)
+
+def _free_cell(model, cx, cy, skip, blocked): #Ближайшая к (cx, cy) ячейка, где устройство ни с чем не пересекается
+    # Расставленные устройства не двигаются, поэтому занятая ячейка
+    # запоминается в blocked и больше не проверяется по модели
+    radius = 0
+    while True:
+        for dx, dy in _ring(radius):
+            cell = (cx + dx, cy + dy)
+            if cell in blocked:
+                continue
+            blocked.add(cell)
+            x0, y0, x1, y1 = SchemaModel.device_rect_at(cell[0] * CELL_WIDTH, cell[1] * CELL_HEIGHT)
+            if not (model.devices_in_rect((x0 + 1, y0 + 1, x1 - 1, y1 - 1)) - skip):
+                return cell
+        radius += 1
+
+def place_new_devices(model, devices, anchor=None, iterations=INCREMENTAL_ITERATIONS): #Расставляет только новые устройства
+    new = list(devices)
+    if not new:
+        return {}
+    new_set = set(new)
+
+    # Уже расставленные соседи новых устройств участвуют в расчете, но не двигаются
+    neighbors = []
+    seen = set(new)
+    for device in new:
+        for conn in model.device_connections(device):
+            other = conn.other_port(conn.start if conn.start.device is device else conn.end).device
+            if other not in seen:
+                seen.add(other)
+                neighbors.append(other)
+
+    devices, _, edges = graph_arrays(model, new + neighbors)
+    count = len(new)
+    scale = np.array([CELL_WIDTH, CELL_HEIGHT], dtype=np.float64)
+    pos = np.zeros((len(devices), 2))
+    if neighbors:
+        pos[count:] = np.array([(d.x, d.y) for d in neighbors]) / scale
+
+    if anchor is None:
+        placed = [d for d in model.devices.values() if d not in new_set]
+        if placed:
+            # Справа от уже расставленной схемы
+            anchor = (max(d.x for d in placed) + CELL_WIDTH, min(d.y for d in placed))
+        else:
+            anchor = ORIGIN
+
+    # Начальное положение: среднее положение расставленных соседей или
+    # змейка в порядке обхода в ширину около anchor (как в
+    # force_directed_layout), чтобы большая пачка новых устройств, например
+    # из импорта, не сжималась силами в одну кучу
+    side = math.sqrt(count)
+    rng = np.random.default_rng(count)
+    columns = int(math.ceil(side))
+    k = np.arange(count)
+    row = k // columns
+    order = _bfs_order(count, edges[(edges < count).all(axis=1)])
+    pos[order, 0] = np.where(row % 2 == 0, k % columns, columns - 1 - k % columns)
+    pos[order, 1] = row
+    pos[:count] += np.array(anchor) / scale
+    if len(edges):
+        fixed_edges = edges[(edges[:, 0] < count) != (edges[:, 1] < count)]
+        new_end = np.where(fixed_edges[:, 0] < count, fixed_edges[:, 0], fixed_edges[:, 1])
+        old_end = np.where(fixed_edges[:, 0] < count, fixed_edges[:, 1], fixed_edges[:, 0])
+        links = np.bincount(new_end, minlength=count)
+        has_links = links > 0
+        for axis in (0, 1):
+            total = np.bincount(new_end, pos[old_end, axis], count)
+            pos[:count, axis][has_links] = total[has_links] / links[has_links]
+        # Небольшой разброс, чтобы устройства с общим соседом не совпадали
+        pos[:count][has_links] += rng.random((int(has_links.sum()), 2)) - 0.5
+
+    movable = np.zeros(len(devices), dtype=bool)
+    movable[:count] = True
+    pos = _force_iterations(pos, edges, movable, iterations, side / 4 + 1.0)
+
+    # Новые устройства сначала разводятся по разным ячейкам между собой,
+    # поэтому поиск свободного места обычно обходит только уже
+    # расставленные устройства
+    positions = {}
+    blocked = set()  # ячейки, занятые старыми или уже расставленными новыми устройствами
+    for device, (cx, cy) in zip(new, _snap_to_cells(pos[:count]).tolist()):
+        cx, cy = _free_cell(model, cx, cy, new_set, blocked)
+        positions[device] = (float(cx * CELL_WIDTH), float(cy * CELL_HEIGHT))
+    return positions
@@ -0,0 +1,86 @@
+"""Необязательные замеры горячих участков редактора.
+
+Включаются переменной окружения EDITOR_PROFILE=1 до запуска программы.
+Когда замеры выключены, декоратор profiled возвращает функцию без
+изменений, поэтому обычный запуск не платит за инструментирование.
+Путь для json отчета при выходе задается EDITOR_PROFILE_OUTPUT. Время
+этапов загрузки, импорта и раскладки тоже печатается только при
+включенных замерах (PERF.report).
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+MAX_SAMPLES = 4096  # Сколько последних замеров хранится для перцентилей
+
+class HotPathStats: #Счетчики вызовов и времени выполнения по именам участков
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats = {}  # имя -> [число вызовов, суммарное время, deque последних замеров]
+
+    def record(self, name, seconds): #Добавляет один замер
+        with self._lock:
+            entry = self._stats.get(name)
+            if entry is None:
+                entry = self._stats[name] = [0, 0.0, deque(maxlen=MAX_SAMPLES)]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2].append(seconds)
+
+    def report(self, name, timings): #Записывает замеры этапов {этап: секунды} и печатает их одной строкой (только при включенных замерах)
+        if not self.enabled:
+            return
+        for phase, seconds in timings.items():
+            self.record(f"{name}.{phase}", seconds)
+        print(f"{name}:", ", ".join(f"{phase} {seconds:.3f} с" for phase, seconds in timings.items()))
+
+    def reset(self): #Сбрасывает все счетчики
+        with self._lock:
+            self._stats.clear()
+
+    @staticmethod
+    def _percentile(samples, fraction): #Перцентиль по отсортированному списку
+        index = min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))
+        return samples[index]
+
+    def summary(self): #Сводка: число вызовов, суммарное и среднее время, перцентили (в секундах)
+        with self._lock:
+            items = [(name, count, total, sorted(samples))
+                     for name, (count, total, samples) in self._stats.items()]
+        result = {}
+        for name, count, total, samples in items:
+            result[name] = {
+                'count': count,
+                'total': total,
+                'mean': total / count,
+                'p50': self._percentile(samples, 0.50),
+                'p95': self._percentile(samples, 0.95),
+                'p99': self._percentile(samples, 0.99),
+                'max': samples[-1]
+            }
+        return result
+
+    def export_json(self, path): #Записывает сводку в json файл
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2, ensure_ascii=False)
+
+PERF = HotPathStats(enabled=os.environ.get("EDITOR_PROFILE") == "1")
+
+def profiled(name): #Декоратор замера; при выключенных замерах функция не оборачивается
+    def decorator(func):
+        if not PERF.enabled:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PERF.record(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
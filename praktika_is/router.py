@@ -0,0 +1,252 @@
+"""Ортогональная трассировка ломаных соединений в обход устройств.
+
+Маршрут ищется A* по разреженной сетке: ее линии проходят по границам
+устройств (с зазором ROUTE_CLEARANCE) и через выходы портов, поэтому
+число узлов зависит от числа устройств около соединения, а не от
+расстояния между портами. Стоимость пути - длина плюс штраф за каждый
+поворот.
+
+Маршруты кэшируются. Для каждого соединения запоминается его коридор
+(область поиска) и устройства, которые в нем были препятствиями: при
+перемещении устройства перестраиваются только соединения, чьи коридоры
+оно задело. Поиск маршрута может занимать миллисекунды, поэтому
+cached_or_queue не считает маршрут сразу, а ставит соединение в очередь,
+которую сцена обрабатывает порциями (process_pending).
+
+Размер сетки и число раскрытых узлов A* ограничены (ROUTE_MAX_GRID_CELLS,
+ROUTE_MAX_EXPANDED на соединение вместе с повторами), поэтому одно
+соединение трассируется не дольше нескольких десятков миллисекунд; при
+превышении остается простая ломаная.
+"""
+import heapq
+import time
+from bisect import bisect_left
+
+from schema_model import DEVICE_WIDTH, DEVICE_HEIGHT, GRID_CELL_SIZE, SpatialGrid
+
+ROUTE_CLEARANCE = 10  # Зазор между линией и устройством
+PORT_EXIT = 20  # Длина прямого участка от порта наружу
+ROUTE_MARGIN = 2 * DEVICE_HEIGHT  # Запас коридора вокруг концов соединения
+ROUTE_RETRIES = 2  # Сколько раз коридор расширяется, если путь не найден
+BEND_PENALTY = 40  # Штраф за поворот (в пикселях длины)
+MAX_ROUTE_OBSTACLES = 250  # Для более загруженных коридоров остается простая ломаная
+ROUTE_MAX_GRID_CELLS = 40000  # Предельное число узлов сетки поиска
+ROUTE_MAX_EXPANDED = 6000  # Сколько узлов A* может раскрыть на одно соединение (вместе с повторами)
+
+# Направления: вправо, вниз, влево, вверх
+_DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+
+def _exit_point(device, port): #Выход порта: точка на PORT_EXIT снаружи от стороны устройства
+    x, y = device.port_position(port)
+    side = -1 if port.index % 2 == 0 else 1  # четные порты слева, нечетные справа
+    return (x, y), (x + side * PORT_EXIT, y)
+
+def _simplify(points): #Убирает повторяющиеся точки и точки на прямых участках
+    result = []
+    for point in points:
+        if result and point == result[-1]:
+            continue
+        if len(result) >= 2:
+            (x0, y0), (x1, y1) = result[-2], result[-1]
+            if (x0 == x1 == point[0]) or (y0 == y1 == point[1]):
+                result[-1] = point
+                continue
+        result.append(point)
+    return result
+
+class RouteLimitExceeded(Exception): #Поиск маршрута превысил предел сетки или раскрытых узлов
+    def __init__(self, expanded):
+        super().__init__(f"превышен предел поиска маршрута ({expanded} узлов)")
+        self.expanded = expanded
+
+def dogleg(start, end): #Ломаная из трех отрезков через середину по x (запасной вариант)
+    mid_x = (start[0] + end[0]) / 2
+    return [start, (mid_x, start[1]), (mid_x, end[1]), end]
+
+def find_path(start, goal, obstacles, window, max_expanded=ROUTE_MAX_EXPANDED, max_cells=ROUTE_MAX_GRID_CELLS): #A* от start до goal в обход obstacles в коридоре window: (путь или None, раскрыто узлов)
+    # При превышении пределов сетки или раскрытых узлов - RouteLimitExceeded
+    wx0, wy0, wx1, wy1 = window
+    clear = ROUTE_CLEARANCE
+    boxes = [(x0 - clear, y0 - clear, x1 + clear, y1 + clear) for x0, y0, x1, y1 in obstacles]
+
+    xs = {wx0, wx1, start[0], goal[0]}
+    ys = {wy0, wy1, start[1], goal[1]}
+    for x0, y0, x1, y1 in boxes:
+        xs.update((x0, x1))
+        ys.update((y0, y1))
+    xs = sorted(xs)  # препятствия на краю коридора расширяют сетку за его пределы
+    ys = sorted(ys)
+    cols, rows = len(xs), len(ys)
+    if cols * rows > max_cells:
+        raise RouteLimitExceeded(0)
+
+    # Заблокированные узлы и отрезки сетки. Границы препятствий лежат на
+    # линиях сетки, поэтому отрезок между соседними линиями либо целиком
+    # внутри препятствия, либо целиком снаружи
+    node_blocked = [bytearray(cols) for _ in range(rows)]
+    h_blocked = [bytearray(cols) for _ in range(rows)]  # отрезок (i, j) -> (i + 1, j)
+    v_blocked = [bytearray(cols) for _ in range(rows)]  # отрезок (i, j) -> (i, j + 1)
+    for x0, y0, x1, y1 in boxes:
+        i0, i1 = bisect_left(xs, x0), bisect_left(xs, x1)
+        j0, j1 = bisect_left(ys, y0), bisect_left(ys, y1)
+        for j in range(j0 + 1, j1):
+            node_blocked[j][i0 + 1:i1] = b"\x01" * max(0, i1 - i0 - 1)
+            h_blocked[j][i0:i1] = b"\x01" * (i1 - i0)
+        for j in range(j0, j1):
+            v_blocked[j][i0 + 1:i1] = b"\x01" * max(0, i1 - i0 - 1)
+
+    si, sj = bisect_left(xs, start[0]), bisect_left(ys, start[1])
+    gi, gj = bisect_left(xs, goal[0]), bisect_left(ys, goal[1])
+    gx, gy = goal
+
+    # Состояние: (узел, направление прихода); начальное направление не задано
+    best = {(si, sj, -1): 0.0}
+    parents = {}
+    heap = [(abs(start[0] - gx) + abs(start[1] - gy), 0.0, si, sj, -1)]
+    expanded = 0
+    while heap:
+        _, cost, i, j, direction = heapq.heappop(heap)
+        if (i, j) == (gi, gj):
+            points = [(xs[i], ys[j])]
+            state = (i, j, direction)
+            while state in parents:
+                state = parents[state]
+                points.append((xs[state[0]], ys[state[1]]))
+            return points[::-1], expanded
+        if cost > best.get((i, j, direction), float("inf")):
+            continue
+        expanded += 1
+        if expanded > max_expanded:
+            raise RouteLimitExceeded(expanded)
+
+        for d, (di, dj) in enumerate(_DIRECTIONS):
+            if direction >= 0 and d == (direction + 2) % 4:
+                continue  # разворот назад
+            ni, nj = i + di, j + dj
+            if not (0 <= ni < cols and 0 <= nj < rows):
+                continue
+            if di:
+                if h_blocked[j][min(i, ni)]:
+                    continue
+            elif v_blocked[min(j, nj)][i]:
+                continue
+            if node_blocked[nj][ni] and (ni, nj) != (gi, gj):
+                continue
+
+            step = abs(xs[ni] - xs[i]) + abs(ys[nj] - ys[j])
+            new_cost = cost + step + (BEND_PENALTY if direction >= 0 and d != direction else 0)
+            state = (ni, nj, d)
+            if new_cost < best.get(state, float("inf")):
+                best[state] = new_cost
+                parents[state] = (i, j, direction)
+                estimate = new_cost + abs(xs[ni] - gx) + abs(ys[nj] - gy)
+                heapq.heappush(heap, (estimate, new_cost, ni, nj, d))
+    return None, expanded
+
+class OrthogonalRouter: #Кэш ортогональных маршрутов соединений модели
+    def __init__(self, model):
+        self.model = model
+        self.routes = {}  # ConnectionRecord -> [(x, y), ...]
+        self.corridors = SpatialGrid(GRID_CELL_SIZE)  # ConnectionRecord -> область поиска маршрута
+        self.obstacles = {}  # ConnectionRecord -> устройства-препятствия в коридоре
+        self.obstacle_users = {}  # DeviceRecord -> соединения, в коридорах которых оно было
+        self.pending = {}  # Соединения, ждущие трассировки (словарь как упорядоченное множество)
+        self.route_count = 0
+        self.expanded_nodes = 0  # Всего раскрыто узлов A*
+        self.limit_fallbacks = 0  # Сколько раз поиск прерван по пределу
+
+    @staticmethod
+    def device_box(device): #Прямоугольник устройства без подписей портов
+        return (device.x, device.y, device.x + DEVICE_WIDTH, device.y + DEVICE_HEIGHT)
+
+    def route(self, conn): #Маршрут соединения (из кэша или новый)
+        points = self.routes.get(conn)
+        if points is None:
+            points = self._compute(conn)
+        return points
+
+    def cached_or_queue(self, conn): #Маршрут из кэша; если его нет - ставит соединение в очередь и возвращает None
+        points = self.routes.get(conn)
+        if points is None:
+            self.pending[conn] = None
+        return points
+
+    def process_pending(self, deadline): #Трассирует соединения из очереди до момента deadline (perf_counter)
+        routed = []
+        while self.pending and time.perf_counter() < deadline:
+            conn = next(iter(self.pending))
+            del self.pending[conn]
+            if conn in self.model.connections and conn not in self.routes:
+                self._compute(conn)
+                routed.append(conn)
+        return routed
+
+    def _compute(self, conn): #Ищет маршрут, расширяя коридор, если путь не найден
+        start, start_exit = _exit_point(conn.start.device, conn.start)
+        end, end_exit = _exit_point(conn.end.device, conn.end)
+        margin = ROUTE_MARGIN
+        budget = ROUTE_MAX_EXPANDED
+        points = None
+        for _ in range(ROUTE_RETRIES + 1):
+            window = (min(start_exit[0], end_exit[0]) - margin, min(start_exit[1], end_exit[1]) - margin,
+                      max(start_exit[0], end_exit[0]) + margin, max(start_exit[1], end_exit[1]) + margin)
+            devices = self.model.devices_in_rect(window)
+            if len(devices) > MAX_ROUTE_OBSTACLES:
+                break
+            try:
+                path, expanded = find_path(start_exit, end_exit, [self.device_box(d) for d in devices],
+                                           window, max_expanded=budget)
+            except RouteLimitExceeded as e:
+                self.expanded_nodes += e.expanded
+                self.limit_fallbacks += 1
+                break
+            self.expanded_nodes += expanded
+            budget -= expanded
+            if path is not None:
+                points = _simplify([start] + path + [end])
+                break
+            margin *= 3
+        if points is None:
+            # Путь не найден или коридор слишком загружен: простая ломаная,
+            # которая зависит только от концов соединения
+            points = dogleg(start, end)
+            devices = ()
+            # Коридор - область самой ломаной: устройство, поставленное на нее, вызовет новую трассировку
+            window = (min(x for x, _ in points), min(y for _, y in points),
+                      max(x for x, _ in points), max(y for _, y in points))
+
+        self.invalidate(conn)
+        self.routes[conn] = points
+        self.corridors.insert(conn, window)
+        self.obstacles[conn] = devices
+        for device in devices:
+            self.obstacle_users.setdefault(device, set()).add(conn)
+        self.route_count += 1
+        return points
+
+    def forget(self, conn): #Забывает соединение совсем (при удалении или смене стиля)
+        self.pending.pop(conn, None)
+        self.invalidate(conn)
+
+    def invalidate(self, conn): #Сбрасывает кэшированный маршрут соединения
+        if self.routes.pop(conn, None) is None:
+            return
+        self.corridors.remove(conn)
+        for device in self.obstacles.pop(conn, ()):
+            users = self.obstacle_users.get(device)
+            if users is not None:
+                users.discard(conn)
+                if not users:
+                    del self.obstacle_users[device]
+
+    def devices_changed(self, devices): #Сбрасывает маршруты, затронутые перемещением/добавлением/удалением устройств
+        affected = set()
+        for device in devices:
+            affected.update(self.obstacle_users.get(device, ()))
+            affected.update(self.corridors.query(self.device_box(device)))
+            for conn in self.model.device_connections(device):
+                if conn in self.routes:
+                    affected.add(conn)
+        for conn in affected:
+            self.invalidate(conn)
+        return affected
@@ -0,0 +1,266 @@
+"""Компактный двоичный формат схемы (.schb) с загрузкой через mmap.
+
+Все строки (имена, типы, названия и цвета соединений) хранятся один раз
+в таблице строк, одинаковые стили соединений - один раз в таблице
+стилей, а устройства, порты и соединения записаны записями
+фиксированной длины с целочисленными ссылками. Файл отображается в
+память, и записи декодируются только при обращении к ним.
+
+Структура файла (little-endian):
+    заголовок   HEADER
+    строки      (count + 1) смещений u32 и затем utf-8 данные
+    стили       STYLE_RECORD * count
+    устройства  DEVICE_RECORD * count
+    порты       u32 (индекс строки типа) * count
+    соединения  CONNECTION_RECORD * count
+    группы      GROUP_RECORD * count (родительская раньше вложенных)
+    состав      u32 (индекс устройства) * count
+
+Файлы версии 1 (без групп) по-прежнему читаются.
+
+Пример:
+    python schema_binary.py pack schemas/plant/plant.json plant.schb
+    python schema_binary.py unpack plant.schb plant.json
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+
+from schema_model import ConnectionRecord, GroupRecord, SchemaModel
+
+MAGIC = b"SCHB"
+VERSION = 2
+
+# magic, версия
+PREFIX = struct.Struct("<4sH")
+# magic, версия, число строк/стилей/устройств/портов/соединений/групп/устройств в группах, смещения секций
+HEADER = struct.Struct("<4sH2x7I7Q")
+# заголовок версии 1: без групп
+HEADER_V1 = struct.Struct("<4sH2x5I5Q")
+# имя, цвет (индексы строк), стиль линии, начала, конца, признак целой толщины, толщина
+STYLE_RECORD = struct.Struct("<IIBBBBd")
+# имя, тип (индексы строк), x, y, индекс первого порта, число портов
+DEVICE_RECORD = struct.Struct("<IIddII")
+PORT_RECORD = struct.Struct("<I")
+# порт начала, порт конца (глобальные индексы портов), индекс стиля
+CONNECTION_RECORD = struct.Struct("<III")
+# имя (индекс строки), индекс родительской группы, признак свернутой группы, индекс первого устройства, число устройств
+GROUP_RECORD = struct.Struct("<IIB3xII")
+MEMBER_RECORD = struct.Struct("<I")
+NO_GROUP = 0xFFFFFFFF
+
+def binary_file_path(schema_path): #Путь к двоичному файлу схемы в ее каталоге
+    return os.path.join(schema_path, os.path.basename(schema_path) + ".schb")
+
+class _StringTable: #Построитель таблицы строк
+    def __init__(self):
+        self.index = {}
+        self.strings = []
+
+    def add(self, text):
+        i = self.index.get(text)
+        if i is None:
+            i = self.index[text] = len(self.strings)
+            self.strings.append(text)
+        return i
+
+    def pack(self):
+        encoded = [s.encode("utf-8") for s in self.strings]
+        offsets = [0]
+        for data in encoded:
+            offsets.append(offsets[-1] + len(data))
+        return struct.pack(f"<{len(offsets)}I", *offsets) + b"".join(encoded)
+
+def save_binary(model, path): #Сохраняет модель схемы в двоичный файл (атомарно)
+    strings = _StringTable()
+    styles = {}
+    style_data = []
+    device_data = []
+    port_data = []
+    port_numbers = {}
+    device_numbers = {}
+
+    for device in model.devices.values():
+        device_numbers[device] = len(device_numbers)
+        first_port = len(port_numbers)
+        for port in device.ports:
+            port_numbers[port] = len(port_numbers)
+            port_data.append(PORT_RECORD.pack(strings.add(port.port_type)))
+        device_data.append(DEVICE_RECORD.pack(strings.add(device.name), strings.add(device.eq_type),
+                                              device.x, device.y, first_port, len(device.ports)))
+
+    connection_data = []
+    for conn in model.connections:
+        key = (conn.name, conn.color, conn.line_style, conn.start_style, conn.end_style,
+               isinstance(conn.width, int), conn.width)
+        style_index = styles.get(key)
+        if style_index is None:
+            style_index = styles[key] = len(style_data)
+            style_data.append(STYLE_RECORD.pack(strings.add(conn.name), strings.add(conn.color),
+                                                conn.line_style, conn.start_style, conn.end_style,
+                                                key[5], conn.width))
+        connection_data.append(CONNECTION_RECORD.pack(port_numbers[conn.start], port_numbers[conn.end],
+                                                      style_index))
+
+    group_data = []
+    member_data = []
+    group_numbers = {}
+    for group in model.saved_groups():
+        group_numbers[group] = len(group_data)
+        parent = group_numbers[group.parent] if group.parent is not None else NO_GROUP
+        group_data.append(GROUP_RECORD.pack(strings.add(group.name), parent, group.collapsed,
+                                            len(member_data), len(group.members)))
+        member_data.extend(MEMBER_RECORD.pack(device_numbers[device]) for device in group.members)
+
+    sections = [strings.pack(), b"".join(style_data), b"".join(device_data),
+                b"".join(port_data), b"".join(connection_data), b"".join(group_data), b"".join(member_data)]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+
+    header = HEADER.pack(MAGIC, VERSION, len(strings.strings), len(style_data), len(device_data),
+                         len(port_data), len(connection_data), len(group_data), len(member_data), *offsets)
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(header)
+        for section in sections:
+            f.write(section)
+    os.replace(tmp_file, path)
+
+class BinarySchema: #Двоичный файл схемы, отображенный в память; записи декодируются по требованию
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # пустой файл нельзя отобразить в память
+            self._file.close()
+            raise ValueError(f"{path}: пустой файл")
+
+        try:
+            magic, version = PREFIX.unpack_from(self._map, 0)
+            if magic != MAGIC or version not in (1, VERSION):
+                raise ValueError
+            if version == 1:
+                (_, _, self.string_count, self.style_count, self.device_count, self.port_count,
+                 self.connection_count, *offsets) = HEADER_V1.unpack_from(self._map, 0)
+                self.group_count = self.member_count = 0
+                offsets += [0, 0]
+            else:
+                (_, _, self.string_count, self.style_count, self.device_count, self.port_count,
+                 self.connection_count, self.group_count, self.member_count,
+                 *offsets) = HEADER.unpack_from(self._map, 0)
+        except (ValueError, struct.error):
+            self.close()
+            raise ValueError(f"{path}: неизвестный формат файла")
+        (self._strings_offset, self._styles_offset, self._devices_offset, self._ports_offset,
+         self._connections_offset, self._groups_offset, self._members_offset) = offsets
+        self._strings_data = self._strings_offset + 4 * (self.string_count + 1)
+        self._string_cache = {}
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def string(self, index): #Строка из таблицы строк
+        text = self._string_cache.get(index)
+        if text is None:
+            start, end = struct.unpack_from("<II", self._map, self._strings_offset + 4 * index)
+            text = self._string_cache[index] = self._map[self._strings_data + start:self._strings_data + end].decode("utf-8")
+        return text
+
+    def style(self, index): #Стиль соединения в виде словаря
+        name, color, line_style, start_style, end_style, is_int, width = STYLE_RECORD.unpack_from(
+            self._map, self._styles_offset + STYLE_RECORD.size * index)
+        return {
+            'name': self.string(name),
+            'color': self.string(color),
+            'line_style': line_style,
+            'start_style': start_style,
+            'end_style': end_style,
+            'width': int(width) if is_int else width
+        }
+
+    def device(self, index): #Устройство: (имя, тип, x, y, индекс первого порта, число портов)
+        name, eq_type, x, y, first_port, port_count = DEVICE_RECORD.unpack_from(
+            self._map, self._devices_offset + DEVICE_RECORD.size * index)
+        return self.string(name), self.string(eq_type), x, y, first_port, port_count
+
+    def port_types(self, first_port, port_count): #Типы портов устройства
+        return [self.string(PORT_RECORD.unpack_from(self._map, self._ports_offset + PORT_RECORD.size * i)[0])
+                for i in range(first_port, first_port + port_count)]
+
+    def connection(self, index): #Соединение: (глобальный порт начала, порт конца, индекс стиля)
+        return CONNECTION_RECORD.unpack_from(self._map, self._connections_offset + CONNECTION_RECORD.size * index)
+
+    def group(self, index): #Группа: (имя, индекс родительской группы или None, свернута, индексы устройств)
+        name, parent, collapsed, first_member, member_count = GROUP_RECORD.unpack_from(
+            self._map, self._groups_offset + GROUP_RECORD.size * index)
+        members = [MEMBER_RECORD.unpack_from(self._map, self._members_offset + MEMBER_RECORD.size * i)[0]
+                   for i in range(first_member, first_member + member_count)]
+        return self.string(name), None if parent == NO_GROUP else parent, bool(collapsed), members
+
+    def iter_devices(self): #Перебор устройств без построения модели
+        for i in range(self.device_count):
+            yield self.device(i)
+
+    def to_model(self): #Строит полную модель схемы
+        model = SchemaModel()
+        ports = []
+        for name, eq_type, x, y, first_port, port_count in self.iter_devices():
+            device = model.add_device(name, eq_type, self.port_types(first_port, port_count), x, y)
+            ports.extend(device.ports)
+
+        styles = {}
+        for i in range(self.connection_count):
+            start, end, style_index = self.connection(i)
+            style = styles.get(style_index)
+            if style is None:
+                style = styles[style_index] = self.style(style_index)
+            model.insert_connection(ConnectionRecord(ports[start], ports[end], style))
+
+        devices = list(model.devices.values())
+        groups = []
+        for i in range(self.group_count):
+            name, parent, collapsed, members = self.group(i)
+            group = GroupRecord(name, groups[parent] if parent is not None else None, collapsed)
+            group.members = dict.fromkeys(devices[member] for member in members)
+            groups.append(model.insert_group(group))
+        return model
+
+def load_binary(path): #Загружает модель схемы из двоичного файла
+    with BinarySchema(path) as schema:
+        return schema.to_model()
+
+def json_to_binary(json_path, binary_path, errors=None): #Переводит json схему в двоичный формат
+    save_binary(SchemaModel.load_json(json_path, errors), binary_path)
+
+def binary_to_json(binary_path, json_path): #Переводит двоичную схему в json формат редактора
+    load_binary(binary_path).save_json(json_path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Преобразование схемы между json и двоичным форматом")
+    parser.add_argument("command", choices=["pack", "unpack"], help="pack: json -> schb, unpack: schb -> json")
+    parser.add_argument("source")
+    parser.add_argument("target")
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        errors = []
+        json_to_binary(args.source, args.target, errors)
+        for error in errors:
+            print(error, file=sys.stderr)
+    else:
+        binary_to_json(args.source, args.target)
+
+if __name__ == "__main__":
+    main()
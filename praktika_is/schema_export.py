@@ -0,0 +1,290 @@
+"""Экспорт схемы в PNG, SVG и PDF без участия вида (EquipmentView).
+
+Экспортируется вся схема или заданная область сцены. Размеры сцены
+считаются в точках экрана (SCENE_DPI на дюйм), поэтому разрешение
+растрового экспорта задается в dpi, а масштаб векторного - относительно
+размера на экране.
+
+PNG собирается по горизонтальным полосам во всю ширину картинки (строки
+PNG должны идти сверху вниз). Каждая полоса записывается в QPicture в
+потоке интерфейса (только там можно обходить элементы сцены), а
+растеризация в QImage и сжатие выполняются в рабочих потоках. Полосы
+сжимаются независимо (deflate с Z_SYNC_FLUSH, контрольные суммы adler32
+объединяются) и сразу пишутся в файл, поэтому в памяти одновременно
+находится лишь несколько полос, а не вся картинка.
+
+SVG и PDF разбиваются на страницы для печати: PDF - одним многостраничным
+файлом, SVG - файлом на каждую страницу (<имя>_<номер>.svg).
+
+В виртуализированном режиме сцены перед отрисовкой каждой полосы или
+страницы для нее создаются графические элементы, как при прокрутке вида.
+
+Пример:
+    python schema_export.py schemas/plant plant.png --dpi 300
+    python schema_export.py schemas/plant plant.pdf --page A3 --scale 0.5
+    python schema_export.py schemas/plant part.svg --region 0 0 2000 1500
+"""
+import argparse
+import contextlib
+import math
+import os
+import struct
+import sys
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QMarginsF, QRectF, QSize, Qt
+from PyQt5.QtGui import QImage, QPageLayout, QPageSize, QPainter, QPdfWriter, QPicture
+from PyQt5.QtSvg import QSvgGenerator
+
+from perf_stats import profiled
+
+SCENE_DPI = 96  # Точек сцены на дюйм (масштаб 1:1 с экраном)
+EXPORT_MARGIN = 40  # Поля вокруг схемы при экспорте всей сцены (в единицах сцены)
+STRIP_PIXELS = 4 * 1024 * 1024  # Примерный размер одной полосы PNG (пикселей)
+PNG_COMPRESSION = 6
+VECTOR_RESOLUTION = 1200  # Разрешение страниц SVG/PDF; с запасом, чтобы не включалась упрощенная отрисовка
+PAGE_MARGIN_MM = 10
+
+PAGE_SIZES = {
+    'A4': QPageSize.A4,
+    'A3': QPageSize.A3,
+    'A2': QPageSize.A2,
+    'A1': QPageSize.A1,
+    'A0': QPageSize.A0,
+    'Letter': QPageSize.Letter
+}
+
+_RENDER_HINTS = QPainter.Antialiasing | QPainter.TextAntialiasing | QPainter.SmoothPixmapTransform
+
+def scene_region(scene): #Область всей схемы с полями (по модели, если она есть, иначе по элементам)
+    model = getattr(scene, 'model', None)
+    bounds = model.device_grid.bounds() if model is not None else None
+    if bounds:
+        x0, y0, x1, y1 = bounds
+        rect = QRectF(x0, y0, x1 - x0, y1 - y0)
+    else:
+        rect = scene.itemsBoundingRect()
+    return rect.adjusted(-EXPORT_MARGIN, -EXPORT_MARGIN, EXPORT_MARGIN, EXPORT_MARGIN)
+
+def _session(scene): #Подготовка сцены к экспорту (снятие выделения и т.п.), если сцена ее поддерживает
+    if hasattr(scene, 'export_session'):
+        return scene.export_session()
+    return contextlib.nullcontext()
+
+def _render(scene, painter, target, source): #Рисует область сцены, создавая ее элементы в виртуализированном режиме
+    if getattr(scene, 'virtualized', False):
+        scene.set_visible_region(source)
+    scene.render(painter, target, source, Qt.IgnoreAspectRatio)
+
+# PNG
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+def _adler32_combine(first, second, second_length): #adler32 склеенных данных по суммам частей
+    base = 65521
+    rem = second_length % base
+    low1, high1 = first & 0xffff, first >> 16
+    low2, high2 = second & 0xffff, second >> 16
+    low = (low1 + low2 - 1) % base
+    high = (rem * low1 + high1 + high2 - rem) % base
+    return low | (high << 16)
+
+def _rasterize_strip(picture, width, height): #Растеризует и сжимает полосу в блок IDAT (выполняется в рабочем потоке)
+    image = QImage(width, height, QImage.Format_RGB888)
+    image.fill(Qt.white)
+    painter = QPainter(image)
+    painter.setRenderHints(_RENDER_HINTS)
+    picture.play(painter)
+    painter.end()
+
+    # Строки QImage выровнены по 4 байта, в PNG перед каждой строкой байт фильтра
+    stride = image.bytesPerLine()
+    row = width * 3
+    data = image.constBits().asstring(stride * height)
+    raw = b"".join(b"\0" + data[i * stride:i * stride + row] for i in range(height))
+    compressor = zlib.compressobj(PNG_COMPRESSION, zlib.DEFLATED, -15)
+    data = compressor.compress(raw) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return _png_chunk(b"IDAT", data), zlib.adler32(raw), len(raw)
+
+@profiled("schema_export.export_png")
+def export_png(scene, path, rect=None, dpi=SCENE_DPI, jobs=None, progress=None): #Экспортирует область сцены в PNG, возвращает размер картинки
+    rect = QRectF(rect) if rect is not None else scene_region(scene)
+    scale = dpi / SCENE_DPI
+    width = max(1, int(math.ceil(rect.width() * scale)))
+    height = max(1, int(math.ceil(rect.height() * scale)))
+    strip_height = max(1, min(height, STRIP_PIXELS // width))
+    strips = (height + strip_height - 1) // strip_height
+    jobs = jobs or os.cpu_count() or 1
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)  # 8 бит, RGB
+    pixels_per_meter = int(round(dpi / 0.0254))
+    adler = 1
+    with _session(scene), open(path, "wb") as f, ThreadPoolExecutor(max_workers=jobs) as executor:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(_png_chunk(b"IHDR", header))
+        f.write(_png_chunk(b"pHYs", struct.pack(">IIB", pixels_per_meter, pixels_per_meter, 1)))
+        f.write(_png_chunk(b"IDAT", b"\x78\x9c"))  # заголовок zlib потока
+
+        def write_strip(future):
+            nonlocal adler
+            chunk, strip_adler, length = future.result()
+            adler = _adler32_combine(adler, strip_adler, length)
+            f.write(chunk)
+
+        pending = deque()
+        for number in range(strips):
+            top = number * strip_height
+            rows = min(strip_height, height - top)
+            picture = QPicture()
+            painter = QPainter(picture)
+            painter.setRenderHints(_RENDER_HINTS)
+            _render(scene, painter, QRectF(0, 0, width, rows),
+                    QRectF(rect.left(), rect.top() + top / scale, width / scale, rows / scale))
+            painter.end()
+            pending.append(executor.submit(_rasterize_strip, picture, width, rows))
+
+            # Не больше полос в работе, чем потоков (+1 в очереди): память ограничена
+            while len(pending) > jobs:
+                write_strip(pending.popleft())
+            if progress is not None:
+                progress(number + 1, strips)
+        while pending:
+            write_strip(pending.popleft())
+
+        f.write(_png_chunk(b"IDAT", zlib.compressobj(PNG_COMPRESSION, zlib.DEFLATED, -15).flush() +
+                           struct.pack(">I", adler)))
+        f.write(_png_chunk(b"IEND", b""))
+    return width, height
+
+# SVG и PDF
+
+def page_layout(page="A4", landscape=True): #Макет страницы печати с полями
+    orientation = QPageLayout.Landscape if landscape else QPageLayout.Portrait
+    margins = QMarginsF(PAGE_MARGIN_MM, PAGE_MARGIN_MM, PAGE_MARGIN_MM, PAGE_MARGIN_MM)
+    return QPageLayout(QPageSize(PAGE_SIZES[page]), orientation, margins, QPageLayout.Millimeter)
+
+def paginate(rect, layout, scale=1.0): #Области сцены для страниц (по строкам) и масштаб из единиц сцены в точки страницы
+    paint = layout.paintRectPixels(VECTOR_RESOLUTION)
+    factor = scale * VECTOR_RESOLUTION / SCENE_DPI
+    page_width, page_height = paint.width() / factor, paint.height() / factor
+    columns = max(1, int(math.ceil(rect.width() / page_width - 1e-9)))
+    rows = max(1, int(math.ceil(rect.height() / page_height - 1e-9)))
+    pages = []
+    for row in range(rows):
+        for column in range(columns):
+            left, top = rect.left() + column * page_width, rect.top() + row * page_height
+            pages.append(QRectF(left, top,
+                                min(page_width, rect.right() - left), min(page_height, rect.bottom() - top)))
+    return pages, factor
+
+def _render_page(scene, painter, source, factor):
+    _render(scene, painter, QRectF(0, 0, source.width() * factor, source.height() * factor), source)
+
+@profiled("schema_export.export_pdf")
+def export_pdf(scene, path, rect=None, page="A4", landscape=True, scale=1.0, progress=None): #Экспортирует область сцены в многостраничный PDF, возвращает число страниц
+    rect = QRectF(rect) if rect is not None else scene_region(scene)
+    layout = page_layout(page, landscape)
+    pages, factor = paginate(rect, layout, scale)
+
+    writer = QPdfWriter(path)
+    writer.setPageLayout(layout)
+    writer.setResolution(VECTOR_RESOLUTION)
+    writer.setCreator("Редактор схем оборудования")
+    with _session(scene):
+        painter = QPainter(writer)
+        painter.setRenderHints(_RENDER_HINTS)
+        for number, source in enumerate(pages):
+            if number:
+                writer.newPage()
+            _render_page(scene, painter, source, factor)
+            if progress is not None:
+                progress(number + 1, len(pages))
+        painter.end()
+    return len(pages)
+
+def svg_page_paths(path, count): #Имена файлов страниц SVG
+    if count == 1:
+        return [path]
+    base, extension = os.path.splitext(path)
+    return [f"{base}_{number}{extension}" for number in range(1, count + 1)]
+
+@profiled("schema_export.export_svg")
+def export_svg(scene, path, rect=None, page="A4", landscape=True, scale=1.0, progress=None): #Экспортирует область сцены в SVG по странице на файл, возвращает пути файлов
+    rect = QRectF(rect) if rect is not None else scene_region(scene)
+    layout = page_layout(page, landscape)
+    pages, factor = paginate(rect, layout, scale)
+    paint = layout.paintRectPixels(VECTOR_RESOLUTION)
+    page_mm = layout.paintRect(QPageLayout.Millimeter)
+
+    paths = svg_page_paths(path, len(pages))
+    with _session(scene):
+        for number, (source, page_path) in enumerate(zip(pages, paths)):
+            generator = QSvgGenerator()
+            generator.setFileName(page_path)
+            generator.setResolution(VECTOR_RESOLUTION)
+            generator.setSize(QSize(paint.width(), paint.height()))
+            generator.setViewBox(QRectF(0, 0, paint.width(), paint.height()))
+            generator.setTitle(f"{os.path.basename(path)} ({number + 1}/{len(pages)})")
+            generator.setDescription(f"{page_mm.width():.0f} x {page_mm.height():.0f} мм")
+            painter = QPainter(generator)
+            painter.setRenderHints(_RENDER_HINTS)
+            _render_page(scene, painter, source, factor)
+            painter.end()
+            if progress is not None:
+                progress(number + 1, len(pages))
+    return paths
+
+def export_file(scene, path, rect=None, dpi=SCENE_DPI, page="A4", landscape=True, scale=1.0,
+                jobs=None, progress=None): #Экспорт в формат по расширению файла (.png, .svg, .pdf)
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".png":
+        return export_png(scene, path, rect, dpi, jobs, progress)
+    if extension == ".pdf":
+        return export_pdf(scene, path, rect, page, landscape, scale, progress)
+    if extension == ".svg":
+        return export_svg(scene, path, rect, page, landscape, scale, progress)
+    raise ValueError(f"Неизвестный формат экспорта: {extension}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Экспорт схемы оборудования в PNG, SVG или PDF")
+    parser.add_argument("schema", help="каталог схемы")
+    parser.add_argument("output", help="файл результата (.png, .svg, .pdf)")
+    parser.add_argument("--dpi", type=int, default=150, help="разрешение PNG")
+    parser.add_argument("--region", type=float, nargs=4, metavar=("X", "Y", "W", "H"),
+                        help="область сцены (по умолчанию вся схема)")
+    parser.add_argument("--page", choices=sorted(PAGE_SIZES), default="A4", help="размер страницы SVG/PDF")
+    parser.add_argument("--portrait", action="store_true", help="книжная ориентация страниц")
+    parser.add_argument("--scale", type=float, default=1.0, help="масштаб SVG/PDF относительно экрана")
+    parser.add_argument("--jobs", type=int, default=None, help="число потоков растеризации PNG")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    from Editor import EquipmentScene
+
+    # QApplication нужен для шрифтов и отрисовки; ссылка держит его до конца экспорта
+    # (без нее созданный здесь объект сразу удаляется сборщиком)
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    app.setApplicationName("schema_export")
+    scene = EquipmentScene()
+    scene.set_virtualized(True)  # элементы создаются только для текущей полосы или страницы
+    scene.load_schema(args.schema)
+    if not scene.model.devices:
+        print("Схема пуста или не найдена:", args.schema)
+        return 1
+
+    rect = QRectF(*args.region) if args.region else None
+    try:
+        result = export_file(scene, args.output, rect, args.dpi, args.page, not args.portrait,
+                             args.scale, args.jobs)
+    except (OSError, ValueError) as e:
+        print("Ошибка экспорта:", e)
+        return 1
+    print("Экспорт:", result)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
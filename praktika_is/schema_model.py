@@ -0,0 +1,638 @@
+"""Модель схемы оборудования без зависимости от Qt.
+
+Хранит устройства, порты и соединения в компактных записях со __slots__,
+поддерживает индексы занятости портов и соединенных пар устройств и
+читает/пишет json файл схемы в том же формате, что и редактор.
+Устройства можно объединять во вложенные именованные группы (стойки,
+помещения); свернутая группа показывается одним узлом со сводными
+связями.
+Графическая сцена (Editor.py) является представлением этой модели.
+"""
+import json
+import os
+import random
+
+from graph_analysis import SchemaGraph
+from search_index import MATCH_CONNECTION, SearchIndex
+
+# Константы для стилей соединений
+LINE_STYLE_STRAIGHT = 0
+LINE_STYLE_POLYLINE = 1
+LINE_STYLE_CURVE = 2
+
+END_STYLE_NONE = 0
+END_STYLE_ARROW = 1
+END_STYLE_CIRCLE = 2
+END_STYLE_SQUARE = 3
+
+# Геометрия устройства по умолчанию
+DEVICE_WIDTH = 160
+DEVICE_HEIGHT = 110
+PORT_SIZE = 10
+LABEL_MARGIN = 80  # Запас по ширине под подписи портов слева и справа от устройства
+
+GRID_CELL_SIZE = 400  # Размер ячейки пространственной сетки устройств
+PORT_GRID_CELL_SIZE = 100  # Размер ячейки сетки портов
+
+DEFAULT_STYLE = {
+    'name': "",
+    'color': "#000000",
+    'line_style': LINE_STYLE_CURVE,
+    'start_style': END_STYLE_NONE,
+    'end_style': END_STYLE_ARROW,
+    'width': 2
+}
+
+class SchemaError(Exception): #Ошибка изменения схемы (сообщение показывается пользователю)
+    pass
+
+def schema_file_path(schema_path): #Возвращает путь к json файлу схемы в ее каталоге
+    return os.path.join(schema_path, os.path.basename(schema_path) + ".json")
+
+def port_unique_id(device_name, port_type, port_index): #Уникальный идентификатор порта
+    return f"{device_name}_{port_type}_{port_index}"
+
+def port_offset(port_index, total_ports, width=DEVICE_WIDTH, height=DEVICE_HEIGHT,
+                port_size=PORT_SIZE): #Положение порта относительно левого верхнего угла устройства
+    pos_on_side = (port_index // 2) + 1
+    ports_per_side = (total_ports + 1) // 2
+    y = float(height) * pos_on_side // (ports_per_side + 1)
+    if port_index % 2 == 0:
+        x = 0 - port_size // 2
+    else:
+        x = width + port_size // 2
+    return float(x), y
+
+def write_schema_file(schema_file, schema): #Атомарно записывает схему в json файл
+    tmp_file = schema_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(schema, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_file, schema_file)
+
+class SpatialGrid: #Равномерная сетка для поиска объектов, пересекающих прямоугольную область
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # (столбец, строка) -> множество ключей
+        self.rects = {}  # ключ -> (x0, y0, x1, y1)
+
+    def _cells(self, rect): #Ячейки, которые покрывает прямоугольник
+        size = self.cell_size
+        x0, y0, x1, y1 = rect
+        for col in range(int(x0 // size), int(x1 // size) + 1):
+            for row in range(int(y0 // size), int(y1 // size) + 1):
+                yield col, row
+
+    def insert(self, key, rect): #Добавляет объект с прямоугольником rect
+        self.rects[key] = rect
+        for cell in self._cells(rect):
+            self.cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key): #Удаляет объект из сетки
+        rect = self.rects.pop(key, None)
+        if rect is None:
+            return
+        for cell in self._cells(rect):
+            bucket = self.cells.get(cell)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.cells[cell]
+
+    def update(self, key, rect): #Перемещает объект (ячейки меняются, только если он пересек их границу)
+        old_rect = self.rects.get(key)
+        if old_rect is not None and list(self._cells(old_rect)) == list(self._cells(rect)):
+            self.rects[key] = rect
+            return
+        self.remove(key)
+        self.insert(key, rect)
+
+    def query(self, rect): #Возвращает множество объектов, пересекающих прямоугольник
+        x0, y0, x1, y1 = rect
+        candidates = set()
+        for cell in self._cells(rect):
+            bucket = self.cells.get(cell)
+            if bucket:
+                candidates |= bucket
+        result = set()
+        for key in candidates:
+            kx0, ky0, kx1, ky1 = self.rects[key]
+            if kx0 <= x1 and kx1 >= x0 and ky0 <= y1 and ky1 >= y0:
+                result.add(key)
+        return result
+
+    def bounds(self): #Общий прямоугольник всех объектов или None
+        if not self.rects:
+            return None
+        rects = self.rects.values()
+        return (min(r[0] for r in rects), min(r[1] for r in rects),
+                max(r[2] for r in rects), max(r[3] for r in rects))
+
+class PortRecord: #Порт устройства
+    __slots__ = ('device', 'index', 'port_type', 'unique_id')
+
+    def __init__(self, device, index, port_type):
+        self.device = device
+        self.index = index
+        self.port_type = port_type
+        self.unique_id = port_unique_id(device.name, port_type, index)
+
+    def __repr__(self):
+        return f"PortRecord({self.unique_id!r})"
+
+class DeviceRecord: #Экземпляр оборудования
+    __slots__ = ('name', 'eq_type', 'ports', 'x', 'y', 'group')
+
+    def __init__(self, name, eq_type, port_types, x=0.0, y=0.0):
+        self.name = name
+        self.eq_type = eq_type
+        self.x = float(x)
+        self.y = float(y)
+        # Ближайшая группа устройства; остается и после удаления устройства,
+        # чтобы при отмене удаления оно вернулось в свою группу
+        self.group = None
+        self.ports = tuple(PortRecord(self, i, port_type) for i, port_type in enumerate(port_types))
+
+    def ports_data(self): #Список портов в формате json файла
+        return [{'type': port.port_type} for port in self.ports]
+
+    def port_position(self, port): #Положение порта в координатах сцены
+        x, y = port_offset(port.index, len(self.ports))
+        return self.x + x, self.y + y
+
+    def __repr__(self):
+        return f"DeviceRecord({self.name!r}, {self.eq_type!r})"
+
+class GroupRecord: #Именованная группа устройств (стойка, помещение), может входить в другую группу
+    __slots__ = ('name', 'parent', 'members', 'children', 'collapsed')
+
+    def __init__(self, name, parent=None, collapsed=False):
+        self.name = name
+        self.parent = parent  # GroupRecord или None
+        # Упорядоченные множества: устройства и вложенные группы непосредственно в этой группе
+        self.members = {}
+        self.children = {}
+        self.collapsed = collapsed  # Группа показывается одним узлом
+
+    def ancestors(self): #Сама группа и все группы, в которые она входит
+        group = self
+        while group is not None:
+            yield group
+            group = group.parent
+
+    def devices(self): #Все устройства группы вместе с вложенными группами
+        yield from self.members
+        for child in self.children:
+            yield from child.devices()
+
+    def __repr__(self):
+        return f"GroupRecord({self.name!r})"
+
+class ConnectionRecord: #Соединение между портами двух устройств
+    __slots__ = ('start', 'end', 'name', 'color', 'line_style', 'start_style', 'end_style', 'width')
+
+    def __init__(self, start, end, style=None):
+        self.start = start
+        self.end = end
+        self.apply_style(style or DEFAULT_STYLE)
+
+    def apply_style(self, style): #Применяет параметры стиля к соединению
+        self.name = style.get('name', DEFAULT_STYLE['name'])
+        self.color = style.get('color', DEFAULT_STYLE['color'])
+        self.line_style = style.get('line_style', DEFAULT_STYLE['line_style'])
+        self.start_style = style.get('start_style', DEFAULT_STYLE['start_style'])
+        self.end_style = style.get('end_style', DEFAULT_STYLE['end_style'])
+        self.width = style.get('width', DEFAULT_STYLE['width'])
+
+    def style(self): #Возвращает стиль соединения в виде словаря
+        return {
+            'name': self.name,
+            'color': self.color,
+            'line_style': self.line_style,
+            'start_style': self.start_style,
+            'end_style': self.end_style,
+            'width': self.width
+        }
+
+    def device_pair(self): #Пара соединенных устройств (ключ индекса)
+        return frozenset((self.start.device, self.end.device))
+
+    def other_port(self, port): #Возвращает противоположный конец соединения
+        return self.end if port is self.start else self.start
+
+    def __repr__(self):
+        return f"ConnectionRecord({self.start.unique_id!r}, {self.end.unique_id!r})"
+
+class SchemaModel: #Схема: устройства, порты, соединения и индексы по ним
+    def __init__(self):
+        self.devices = {}  # имя -> DeviceRecord
+        self.ports = {}  # unique_id -> PortRecord
+        # Соединения хранятся в словаре как упорядоченное множество (удаление за O(1))
+        self.connections = {}
+        self.port_connections = {}  # PortRecord -> ConnectionRecord
+        self.device_pair_connections = {}  # frozenset(DeviceRecord, DeviceRecord) -> ConnectionRecord
+        self.device_grid = SpatialGrid()  # DeviceRecord -> занимаемая область (с подписями портов)
+        self.port_grids = {}  # port_type -> SpatialGrid: PortRecord -> положение порта (точка)
+        self.unplaced = []  # Устройства из файла без координат (расставляются автоматически)
+        self.groups = {}  # имя -> GroupRecord
+        self.search = None  # SearchIndex; строится при первом поиске (enable_search)
+        self.analytics = None  # SchemaGraph; строится при первом запросе (enable_analytics)
+
+    @staticmethod
+    def device_rect_at(x, y): #Область, которую займет устройство в точке (x, y) вместе с подписями портов
+        return (x - LABEL_MARGIN, y, x + DEVICE_WIDTH + LABEL_MARGIN, y + DEVICE_HEIGHT)
+
+    @staticmethod
+    def device_rect(device): #Область, занимаемая устройством вместе с портами и подписями
+        return SchemaModel.device_rect_at(device.x, device.y)
+
+    def devices_in_rect(self, rect): #Устройства, пересекающие область (x0, y0, x1, y1)
+        return self.device_grid.query(rect)
+
+    def add_device(self, name, eq_type, port_types, x=None, y=None): #Добавляет устройство
+        if name in self.devices:
+            raise SchemaError(f"Устройство {name} уже существует!")
+        if x is None:
+            x = random.randint(50, 500)
+        if y is None:
+            y = random.randint(50, 400)
+
+        return self.insert_device(DeviceRecord(name, eq_type, port_types, x, y))
+
+    def insert_device(self, device): #Добавляет готовое устройство в индексы (например, при отмене удаления)
+        if device.name in self.devices:
+            raise SchemaError(f"Устройство {device.name} уже существует!")
+        self.devices[device.name] = device
+        for port in device.ports:
+            self.ports[port.unique_id] = port
+            grid = self.port_grids.get(port.port_type)
+            if grid is None:
+                grid = self.port_grids[port.port_type] = SpatialGrid(PORT_GRID_CELL_SIZE)
+            x, y = device.port_position(port)
+            grid.insert(port, (x, y, x, y))
+        self.device_grid.insert(device, self.device_rect(device))
+        group = device.group
+        if group is not None:
+            if self.groups.get(group.name) is group:
+                group.members[device] = None
+            else:
+                device.group = None  # группу успели удалить
+        if self.search is not None:
+            self.search.add_device(device)
+        if self.analytics is not None:
+            self.analytics.device_added(device)
+        return device
+
+    def remove_device(self, device): #Удаляет устройство и возвращает удаленные соединения
+        removed = []
+        for port in device.ports:
+            conn = self.port_connections.get(port)
+            if conn:
+                self.remove_connection(conn)
+                removed.append(conn)
+            self.ports.pop(port.unique_id, None)
+            self.port_grids[port.port_type].remove(port)
+        del self.devices[device.name]
+        self.device_grid.remove(device)
+        if device.group is not None:
+            device.group.members.pop(device, None)
+        if self.search is not None:
+            self.search.remove_device(device)
+        if self.analytics is not None:
+            self.analytics.device_removed(device)
+        return removed
+
+    def move_device(self, device, x, y): #Перемещает устройство
+        device.x = x
+        device.y = y
+        self.device_grid.update(device, self.device_rect(device))
+        for port in device.ports:
+            px, py = device.port_position(port)
+            self.port_grids[port.port_type].update(port, (px, py, px, py))
+
+    def add_group(self, name, devices=(), groups=(), collapsed=False): #Объединяет устройства и группы одного уровня в новую группу
+        if not name:
+            raise SchemaError("Не указано имя группы!")
+        if name in self.groups:
+            raise SchemaError(f"Группа {name} уже существует!")
+        devices, groups = list(devices), list(groups)
+        if not devices and not groups:
+            raise SchemaError("Группа должна содержать устройства или другие группы!")
+        parents = {device.group for device in devices} | {group.parent for group in groups}
+        if len(parents) > 1:
+            raise SchemaError("Можно объединить только устройства и группы, входящие в одну группу!")
+
+        group = GroupRecord(name, parents.pop(), collapsed)
+        group.members = dict.fromkeys(devices)
+        group.children = dict.fromkeys(groups)
+        return self.insert_group(group)
+
+    @staticmethod
+    def common_level(devices, groups): #Поднимает устройства и группы до общей родительской группы, возвращает (устройства, группы)
+        # Устройство или группа из вложенной группы заменяется вложенной группой,
+        # которая входит непосредственно в общую родительскую
+        entries = [(device, device.group) for device in devices] + [(group, group.parent) for group in groups]
+        chains = [list(container.ancestors()) if container is not None else [] for _, container in entries]
+        common = None
+        if chains:
+            others = [set(chain) for chain in chains[1:]]
+            common = next((group for group in chains[0] if all(group in chain for chain in others)), None)
+
+        result_devices, result_groups = {}, {}
+        for (entry, container), chain in zip(entries, chains):
+            if container is common:
+                (result_devices if isinstance(entry, DeviceRecord) else result_groups)[entry] = None
+                continue
+            for group in chain:
+                if group.parent is common:
+                    result_groups[group] = None
+                    break
+        return list(result_devices), list(result_groups)
+
+    def insert_group(self, group): #Добавляет готовую группу: ее устройства и вложенные группы переходят в нее
+        if group.name in self.groups:
+            raise SchemaError(f"Группа {group.name} уже существует!")
+        if group.parent is not None and self.groups.get(group.parent.name) is not group.parent:
+            group.parent = None
+        self.groups[group.name] = group
+        if group.parent is not None:
+            group.parent.children[group] = None
+
+        for device in list(group.members):
+            if self.devices.get(device.name) is not device:
+                del group.members[device]
+                continue
+            if device.group is not None:
+                device.group.members.pop(device, None)
+            device.group = group
+        for child in list(group.children):
+            if self.groups.get(child.name) is not child:
+                del group.children[child]
+                continue
+            if child.parent is not None:
+                child.parent.children.pop(child, None)
+            child.parent = group
+        return group
+
+    def remove_group(self, group): #Удаляет группу; ее устройства и вложенные группы переходят в родительскую
+        parent = group.parent
+        # Состав группы сохраняется в записи, чтобы ее можно было вернуть
+        for device in group.members:
+            device.group = parent
+            if parent is not None:
+                parent.members[device] = None
+        for child in group.children:
+            child.parent = parent
+            if parent is not None:
+                parent.children[child] = None
+        if parent is not None:
+            parent.children.pop(group, None)
+        del self.groups[group.name]
+
+    @staticmethod
+    def collapsed_group(device): #Самая внешняя свернутая группа устройства (узел, которым оно показано) или None
+        node = None
+        group = device.group
+        while group is not None:
+            if group.collapsed:
+                node = group
+            group = group.parent
+        return node
+
+    @staticmethod
+    def group_shown(group): #Видна ли группа (узлом или рамкой): все группы, в которые она входит, развернуты
+        return group.parent is None or not any(g.collapsed for g in group.parent.ancestors())
+
+    def group_bounds(self, group): #Общая область устройств группы (x0, y0, x1, y1) или None
+        rects = [self.device_rect(device) for device in group.devices()]
+        if not rects:
+            return None
+        return (min(r[0] for r in rects), min(r[1] for r in rects),
+                max(r[2] for r in rects), max(r[3] for r in rects))
+
+    def group_links(self): #Сводные связи свернутых групп: {frozenset(узел, узел): [соединения]}
+        # Узел - свернутая группа или устройство вне свернутых групп
+        links = {}
+        seen = set()
+        for group in self.groups.values():
+            if not group.collapsed or not self.group_shown(group):
+                continue
+            for device in group.devices():
+                for connection in self.device_connections(device):
+                    if connection in seen:
+                        continue
+                    seen.add(connection)
+                    start = self.collapsed_group(connection.start.device) or connection.start.device
+                    end = self.collapsed_group(connection.end.device) or connection.end.device
+                    if start is not end:
+                        links.setdefault(frozenset((start, end)), []).append(connection)
+        return links
+
+    def ports_near(self, x, y, radius, port_type=None): #Порты не дальше radius от точки (ближние первыми), можно только одного типа
+        if port_type is None:
+            grids = self.port_grids.values()
+        else:
+            grids = [self.port_grids[port_type]] if port_type in self.port_grids else []
+
+        found = []
+        for grid in grids:
+            for port in grid.query((x - radius, y - radius, x + radius, y + radius)):
+                px, py = grid.rects[port][:2]
+                distance = (px - x) ** 2 + (py - y) ** 2
+                if distance <= radius * radius:
+                    found.append((distance, port))
+        found.sort(key=lambda item: item[0])
+        return [port for _, port in found]
+
+    def connection_error(self, start, end): #Проверяет возможность соединения, возвращает текст ошибки или None
+        if start.device is end.device:
+            return "Нельзя соединять порты одного устройства!"
+        if self.connection_between(start.device, end.device):
+            return "Эти устройства уже соединены!"
+        if start in self.port_connections:
+            return f"Порт {start.port_type} уже используется!"
+        if end in self.port_connections:
+            return f"Порт {end.port_type} уже используется!"
+        return None
+
+    def add_connection(self, start, end, style=None): #Соединяет два порта
+        error = self.connection_error(start, end)
+        if error:
+            raise SchemaError(error)
+        return self.insert_connection(ConnectionRecord(start, end, style))
+
+    def insert_connection(self, connection): #Добавляет готовое соединение в индексы без проверок
+        self.connections[connection] = None
+        self.port_connections[connection.start] = connection
+        self.port_connections[connection.end] = connection
+        self.device_pair_connections[connection.device_pair()] = connection
+        if self.search is not None:
+            self.search.add(connection.name, connection, MATCH_CONNECTION)
+        if self.analytics is not None:
+            self.analytics.connection_added(connection)
+        return connection
+
+    def remove_connection(self, connection): #Удаляет соединение
+        del self.connections[connection]
+        self.port_connections.pop(connection.start, None)
+        self.port_connections.pop(connection.end, None)
+        self.device_pair_connections.pop(connection.device_pair(), None)
+        if self.search is not None:
+            self.search.remove(connection.name, connection, MATCH_CONNECTION)
+        if self.analytics is not None:
+            self.analytics.connection_removed(connection)
+
+    def set_connection_style(self, connection, style): #Меняет стиль соединения (название соединения есть в поиске)
+        if self.search is not None:
+            self.search.remove(connection.name, connection, MATCH_CONNECTION)
+        connection.apply_style(style)
+        if self.search is not None and connection in self.connections:
+            self.search.add(connection.name, connection, MATCH_CONNECTION)
+
+    def enable_analytics(self): #Строит аналитику графа; дальше она обновляется вместе с моделью
+        if self.analytics is None:
+            self.analytics = SchemaGraph(self)
+        return self.analytics
+
+    def enable_search(self): #Строит индекс поиска; дальше он обновляется вместе с моделью
+        if self.search is None:
+            self.search = SearchIndex()
+            for device in self.devices.values():
+                self.search.add_device(device)
+            for connection in self.connections:
+                self.search.add(connection.name, connection, MATCH_CONNECTION)
+        return self.search
+
+    def connection_for_port(self, port): #Возвращает соединение порта или None
+        return self.port_connections.get(port)
+
+    def connection_between(self, first_device, second_device): #Возвращает соединение между устройствами или None
+        return self.device_pair_connections.get(frozenset((first_device, second_device)))
+
+    def device_connections(self, device): #Соединения устройства
+        return [self.port_connections[port] for port in device.ports if port in self.port_connections]
+
+    def resolve_legacy_ports(self, connection): #Находит порты соединения старого формата (по типу и индексу)
+        from_device = self.devices.get(connection.get('from'))
+        to_device = self.devices.get(connection.get('to'))
+        if not from_device or not to_device:
+            return None, None
+
+        from_ports = [p for p in from_device.ports if p.port_type == connection.get('from_port')]
+        to_ports = [p for p in to_device.ports if p.port_type == connection.get('to_port')]
+        from_port_idx = connection.get('from_port_index', 0)
+        to_port_idx = connection.get('to_port_index', 0)
+        if from_port_idx < len(from_ports) and to_port_idx < len(to_ports):
+            return from_ports[from_port_idx], to_ports[to_port_idx]
+        return None, None
+
+    @classmethod
+    def from_dict(cls, schema, errors=None): #Строит модель из словаря json схемы
+        model = cls()
+        if errors is None:
+            errors = []
+
+        for instance in schema.get("instances", []):
+            try:
+                device = model.add_device(instance['name'], instance['type'],
+                                          [port['type'] for port in instance['ports']],
+                                          instance.get('x'), instance.get('y'))
+                if instance.get('x') is None or instance.get('y') is None:
+                    model.unplaced.append(device)
+            except (KeyError, TypeError, SchemaError) as e:
+                errors.append(f"Ошибка загрузки устройства: {e}")
+
+        for connection in schema.get("connections", []):
+            # Пробуем загрузить по новому формату (с unique_id), иначе по индексам
+            if 'from_port_id' in connection and 'to_port_id' in connection:
+                start = model.ports.get(connection['from_port_id'])
+                end = model.ports.get(connection['to_port_id'])
+            else:
+                start, end = model.resolve_legacy_ports(connection)
+
+            if not start or not end:
+                errors.append(f"Ошибка загрузки соединения: порт не найден "
+                              f"({connection.get('from')} - {connection.get('to')})")
+                continue
+
+            error = model.connection_error(start, end)
+            if error:
+                errors.append(f"Пропущено соединение {start.unique_id} - {end.unique_id}: {error}")
+                continue
+            model.insert_connection(ConnectionRecord(start, end, connection.get('style')))
+
+        # Родительская группа записывается раньше вложенных
+        for entry in schema.get("groups", []):
+            try:
+                name = entry['name']
+                if name in model.groups:
+                    raise SchemaError(f"группа {name} уже существует")
+                parent = model.groups.get(entry.get('parent')) if entry.get('parent') is not None else None
+                if entry.get('parent') is not None and parent is None:
+                    errors.append(f"Ошибка загрузки группы {name}: нет родительской группы {entry['parent']}")
+                devices = []
+                for device_name in entry.get('devices', []):
+                    device = model.devices.get(device_name)
+                    if device is None or device.group is not None or device in devices:
+                        errors.append(f"Ошибка загрузки группы {name}: устройство {device_name} "
+                                      f"{'не найдено' if device is None else 'уже в группе'}")
+                        continue
+                    devices.append(device)
+                group = GroupRecord(name, parent, bool(entry.get('collapsed', False)))
+                group.members = dict.fromkeys(devices)
+                model.insert_group(group)
+            except (KeyError, TypeError, SchemaError) as e:
+                errors.append(f"Ошибка загрузки группы: {e}")
+
+        return model
+
+    def to_dict(self): #Возвращает схему в виде словаря для json файла
+        schema = {
+            "instances": [],
+            "connections": []
+        }
+
+        for device in self.devices.values():
+            schema["instances"].append({
+                'name': device.name,
+                'type': device.eq_type,
+                'ports': device.ports_data(),
+                'x': device.x,
+                'y': device.y
+            })
+
+        for conn in self.connections:
+            schema["connections"].append({
+                'from': conn.start.device.name,
+                'to': conn.end.device.name,
+                'from_port_id': conn.start.unique_id,
+                'to_port_id': conn.end.unique_id,
+                'style': conn.style()
+            })
+
+        # Ключ groups пишется, только если группы есть (схемы без групп не меняются)
+        for group in self.saved_groups():
+            schema.setdefault("groups", []).append({
+                'name': group.name,
+                'parent': group.parent.name if group.parent is not None else None,
+                'devices': [device.name for device in group.members],
+                'collapsed': group.collapsed
+            })
+
+        return schema
+
+    def saved_groups(self): #Группы для сохранения: родительская раньше вложенных, группы без устройств пропускаются
+        stack = [group for group in self.groups.values() if group.parent is None][::-1]
+        while stack:
+            group = stack.pop()
+            if any(True for _ in group.devices()):
+                yield group
+            stack.extend(list(group.children)[::-1])
+
+    @classmethod
+    def load_json(cls, schema_file, errors=None): #Загружает модель из json файла
+        with open(schema_file, "r", encoding="utf-8") as f:
+            schema = json.load(f)
+        return cls.from_dict(schema, errors)
+
+    def save_json(self, schema_file): #Сохраняет модель в json файл
+        write_schema_file(schema_file, self.to_dict())
@@ -0,0 +1,265 @@
+"""Проверка и преобразование каталогов схем без графического интерфейса.
+
+Находит все каталоги схем (schemas/<имя>/<имя>.json) в указанных
+каталогах и проверяет их параллельно в нескольких процессах:
+
+- соединения ссылаются на существующие порты (from_port_id/to_port_id
+  или старый формат с индексами портов);
+- порт занят не более чем одним соединением, устройства соединены не
+  более одного раза, порты соединения одного типа;
+- имена устройств не повторяются;
+- группы ссылаются на существующие устройства и ранее описанные
+  родительские группы, устройство входит не более чем в одну группу;
+- порты экземпляров совпадают с их типом из equipment_types/*.xml.
+
+По всем схемам печатается общий отчет (или записывается в json). С
+ключом --convert-legacy соединения старого формата переписываются в
+формат с unique_id портов.
+
+Пример:
+    python schema_tool.py schemas
+    python schema_tool.py schemas --jobs 4 --report report.json
+    python schema_tool.py schemas --convert-legacy
+"""
+import argparse
+import json
+import os
+import sys
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from schema_model import SchemaError, SchemaModel, schema_file_path, write_schema_file
+
+ERROR = "error"
+WARNING = "warning"
+
+# Ключи старого формата соединений, которые заменяются на from_port_id/to_port_id
+LEGACY_KEYS = ('from_port', 'to_port', 'from_port_index', 'to_port_index')
+
+def find_schema_dirs(root): #Каталоги схем внутри root (включая сам root)
+    found = []
+    for path, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if d != "equipment_types")
+        if os.path.basename(schema_file_path(path)) in files:
+            found.append(path)
+    return found
+
+def read_equipment_types(schema_path, problems): #Типы оборудования схемы: имя -> список типов портов
+    types = {}
+    types_dir = os.path.join(schema_path, "equipment_types")
+    if not os.path.isdir(types_dir):
+        return types
+    for filename in sorted(os.listdir(types_dir)):
+        if not filename.endswith(".xml"):
+            continue
+        try:
+            root = ET.parse(os.path.join(types_dir, filename)).getroot()
+            types[root.find("name").text] = [port.text for port in root.find("ports")]
+        except Exception as e:
+            problems.append((ERROR, "invalid_type_file", f"Ошибка в типе {filename}: {e}"))
+    return types
+
+def _check_instances(schema, types, problems): #Модель из устройств схемы (соединения проверяются отдельно)
+    model = SchemaModel()
+    for number, instance in enumerate(schema.get("instances", [])):
+        try:
+            name, eq_type = instance['name'], instance['type']
+            port_types = [port['type'] for port in instance['ports']]
+        except (KeyError, TypeError) as e:
+            problems.append((ERROR, "invalid_instance", f"Устройство №{number}: нет поля {e}"))
+            continue
+        try:
+            model.add_device(name, eq_type, port_types, instance.get('x', 0), instance.get('y', 0))
+        except SchemaError:
+            problems.append((ERROR, "duplicate_device", f"Повторяется имя устройства {name}"))
+            continue
+        except (TypeError, ValueError):
+            problems.append((ERROR, "invalid_instance", f"Устройство №{number} ({name}): неверные координаты "
+                                                        f"({instance.get('x')}, {instance.get('y')})"))
+            continue
+
+        if types:
+            expected = types.get(eq_type)
+            if expected is None:
+                problems.append((WARNING, "unknown_type", f"{name}: нет описания типа {eq_type}"))
+            elif expected != port_types:
+                problems.append((ERROR, "ports_mismatch",
+                                 f"{name}: порты {port_types} не совпадают с типом {eq_type} {expected}"))
+    return model
+
+def _resolve_ports(model, connection): #Порты соединения и признак старого формата
+    if 'from_port_id' in connection and 'to_port_id' in connection:
+        return model.ports.get(connection['from_port_id']), model.ports.get(connection['to_port_id']), False
+    start, end = model.resolve_legacy_ports(connection)
+    return start, end, True
+
+def check_schema(schema, types=None): #Проверяет словарь схемы, возвращает (модель устройств, проблемы, число старых соединений)
+    problems = []
+    model = _check_instances(schema, types or {}, problems)
+
+    occupied = {}  # PortRecord -> описание соединения, которое его заняло
+    pairs = set()
+    legacy = 0
+    for number, connection in enumerate(schema.get("connections", [])):
+        if not isinstance(connection, dict):
+            problems.append((ERROR, "invalid_connection", f"Соединение №{number}: неверный формат"))
+            continue
+        title = f"Соединение №{number} ({connection.get('from')} - {connection.get('to')})"
+        try:
+            start, end, is_legacy = _resolve_ports(model, connection)
+        except (TypeError, ValueError):
+            problems.append((ERROR, "invalid_connection", f"{title}: неверные ссылки на порты"))
+            continue
+        legacy += is_legacy
+        if start is None or end is None:
+            missing = []
+            if start is None:
+                missing.append(connection.get('from_port_id', connection.get('from_port')))
+            if end is None:
+                missing.append(connection.get('to_port_id', connection.get('to_port')))
+            problems.append((ERROR, "dangling_port", f"{title}: порт не найден: {', '.join(map(str, missing))}"))
+            continue
+
+        if start.port_type != end.port_type:
+            problems.append((ERROR, "type_mismatch",
+                             f"{title}: разные типы портов {start.port_type} и {end.port_type}"))
+        if start.device is end.device:
+            problems.append((ERROR, "self_connection", f"{title}: порты одного устройства"))
+        else:
+            pair = frozenset((start.device, end.device))
+            if pair in pairs:
+                problems.append((ERROR, "duplicate_pair", f"{title}: устройства уже соединены"))
+            pairs.add(pair)
+        for port in (start, end):
+            if port in occupied:
+                problems.append((ERROR, "port_occupied",
+                                 f"{title}: порт {port.unique_id} уже занят ({occupied[port]})"))
+            else:
+                occupied[port] = title
+
+    _check_groups(schema, model, problems)
+    return model, problems, legacy
+
+def _check_groups(schema, model, problems): #Проверяет группы устройств (родительская группа описывается раньше вложенных)
+    groups = set()
+    grouped = {}  # имя устройства -> группа
+    for number, group in enumerate(schema.get("groups", [])):
+        if not isinstance(group, dict) or 'name' not in group:
+            problems.append((ERROR, "invalid_group", f"Группа №{number}: неверный формат"))
+            continue
+        name = group['name']
+        if name in groups:
+            problems.append((ERROR, "duplicate_group", f"Повторяется имя группы {name}"))
+        groups.add(name)
+        parent = group.get('parent')
+        if parent is not None and (parent not in groups or parent == name):
+            problems.append((ERROR, "unknown_parent_group", f"Группа {name}: нет родительской группы {parent}"))
+        for device in group.get('devices', []):
+            if device not in model.devices:
+                problems.append((ERROR, "unknown_group_device", f"Группа {name}: нет устройства {device}"))
+            elif device in grouped:
+                problems.append((ERROR, "duplicate_group_device",
+                                 f"Группа {name}: устройство {device} уже в группе {grouped[device]}"))
+            else:
+                grouped[device] = name
+
+def convert_legacy_connections(schema, model): #Переписывает соединения старого формата на unique_id портов, возвращает число измененных
+    converted = 0
+    for connection in schema.get("connections", []):
+        if not isinstance(connection, dict) or ('from_port_id' in connection and 'to_port_id' in connection):
+            continue
+        try:
+            start, end = model.resolve_legacy_ports(connection)
+        except (TypeError, ValueError):
+            continue  # о таких соединениях сообщает проверка
+        if start is None or end is None:
+            continue
+        for key in LEGACY_KEYS:
+            connection.pop(key, None)
+        connection['from_port_id'] = start.unique_id
+        connection['to_port_id'] = end.unique_id
+        converted += 1
+    return converted
+
+def check_schema_dir(schema_path, convert=False): #Проверяет каталог схемы (выполняется в процессе пула), возвращает отчет
+    report = {
+        'path': schema_path,
+        'devices': 0,
+        'connections': 0,
+        'legacy_connections': 0,
+        'converted': 0,
+        'problems': []
+    }
+    try:
+        with open(schema_file_path(schema_path), "r", encoding="utf-8") as f:
+            schema = json.load(f)
+    except (OSError, ValueError) as e:
+        report['problems'].append((ERROR, "invalid_json", f"Не удалось прочитать схему: {e}"))
+        return report
+
+    problems = []
+    types = read_equipment_types(schema_path, problems)
+    model, schema_problems, legacy = check_schema(schema, types)
+    problems.extend(schema_problems)
+    report.update(devices=len(model.devices), connections=len(schema.get("connections", [])),
+                  legacy_connections=legacy, problems=problems)
+
+    if convert and legacy:
+        converted = convert_legacy_connections(schema, model)
+        if converted:
+            try:
+                write_schema_file(schema_file_path(schema_path), schema)
+                report['converted'] = converted
+            except OSError as e:
+                problems.append((ERROR, "write_failed", f"Не удалось записать схему: {e}"))
+    return report
+
+def check_all(roots, jobs=None, convert=False): #Проверяет все схемы в каталогах roots параллельно, возвращает отчеты
+    paths = []
+    for root in roots:
+        paths.extend(find_schema_dirs(root))
+    check = partial(check_schema_dir, convert=convert)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(paths) <= 1:
+        return [check(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(check, paths, chunksize=max(1, len(paths) // (4 * jobs))))
+
+def print_report(reports, out=sys.stdout): #Печатает общий отчет по схемам
+    errors = warnings = 0
+    for report in reports:
+        problems = report['problems']
+        schema_errors = sum(1 for severity, _, _ in problems if severity == ERROR)
+        errors += schema_errors
+        warnings += len(problems) - schema_errors
+        status = "ошибок: " + str(schema_errors) if problems else "OK"
+        line = f"{report['path']}: {status} (устройств {report['devices']}, соединений {report['connections']}"
+        if report['legacy_connections']:
+            line += f", в старом формате {report['legacy_connections']}"
+        if report['converted']:
+            line += f", преобразовано {report['converted']}"
+        print(line + ")", file=out)
+        for severity, _, message in problems:
+            print(f"    {'ошибка' if severity == ERROR else 'предупреждение'}: {message}", file=out)
+    print(f"Схем: {len(reports)}, ошибок: {errors}, предупреждений: {warnings}", file=out)
+    return errors
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Проверка каталогов схем оборудования")
+    parser.add_argument("roots", nargs="+", help="каталоги со схемами")
+    parser.add_argument("--jobs", type=int, default=None, help="число процессов (по умолчанию - по числу ядер)")
+    parser.add_argument("--report", help="json файл для отчета")
+    parser.add_argument("--convert-legacy", action="store_true",
+                        help="переписать соединения старого формата на unique_id портов")
+    args = parser.parse_args(argv)
+
+    reports = check_all(args.roots, args.jobs, args.convert_legacy)
+    errors = print_report(reports)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2, ensure_ascii=False)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
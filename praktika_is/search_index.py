@@ -0,0 +1,118 @@
+"""Поиск по именам и типам устройств, типам портов и названиям соединений.
+
+Индекс хранит различающиеся строки в нижнем регистре: отсортированный
+список для поиска по префиксу (bisect) и триграммы строк для поиска
+подстроки. Каждой строке соответствуют найденные по ней объекты модели.
+Индекс обновляется точечно при добавлении и удалении записей, поэтому
+поиск на каждое нажатие клавиши не перебирает всю схему.
+"""
+from bisect import bisect_left
+from itertools import islice
+
+MATCH_DEVICE = "device"  # имя устройства
+MATCH_TYPE = "type"  # тип устройства
+MATCH_PORT = "port"  # тип порта
+MATCH_CONNECTION = "connection"  # название соединения
+
+# Порядок видов совпадений в результатах для одной строки
+_KIND_ORDER = (MATCH_DEVICE, MATCH_TYPE, MATCH_CONNECTION, MATCH_PORT)
+
+SEARCH_LIMIT = 50  # Сколько результатов возвращается по умолчанию
+
+def _trigrams(key): #Множество триграмм строки
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+class SearchIndex: #Индекс строк для поиска по префиксу и подстроке
+    def __init__(self):
+        self._targets = {}  # строка -> {вид: {объект: исходный текст}}
+        self._keys = []  # отсортированные строки индекса
+        self._trigrams = {}  # триграмма -> множество строк
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, text, target, kind): #Добавляет объект, найденный по строке text
+        if not text:
+            return
+        key = text.casefold()
+        targets = self._targets.get(key)
+        if targets is None:
+            targets = self._targets[key] = {}
+            self._keys.insert(bisect_left(self._keys, key), key)
+            for gram in _trigrams(key):
+                self._trigrams.setdefault(gram, set()).add(key)
+        targets.setdefault(kind, {})[target] = text
+
+    def remove(self, text, target, kind): #Удаляет объект из индекса
+        if not text:
+            return
+        key = text.casefold()
+        targets = self._targets.get(key)
+        if targets is None:
+            return
+        kind_targets = targets.get(kind)
+        if kind_targets is not None:
+            kind_targets.pop(target, None)
+            if not kind_targets:
+                del targets[kind]
+        if targets:
+            return
+        del self._targets[key]
+        del self._keys[bisect_left(self._keys, key)]
+        for gram in _trigrams(key):
+            keys = self._trigrams[gram]
+            keys.discard(key)
+            if not keys:
+                del self._trigrams[gram]
+
+    def add_device(self, device): #Индексирует устройство и его порты
+        self.add(device.name, device, MATCH_DEVICE)
+        self.add(device.eq_type, device, MATCH_TYPE)
+        for port in device.ports:
+            self.add(port.port_type, port, MATCH_PORT)
+
+    def remove_device(self, device):
+        self.remove(device.name, device, MATCH_DEVICE)
+        self.remove(device.eq_type, device, MATCH_TYPE)
+        for port in device.ports:
+            self.remove(port.port_type, port, MATCH_PORT)
+
+    def _substring_keys(self, key): #Строки, содержащие key (кандидаты по триграммам)
+        if len(key) < 3:
+            return (k for k in self._keys if key in k)
+        sets = []
+        for gram in _trigrams(key):
+            keys = self._trigrams.get(gram)
+            if keys is None:
+                return ()
+            sets.append(keys)
+        sets.sort(key=len)
+        candidates = sets[0].intersection(*sets[1:])
+        return sorted(k for k in candidates if key in k)
+
+    def search(self, query, limit=SEARCH_LIMIT): #Результаты (вид, текст, объект): сначала совпадения по префиксу, затем по подстроке
+        key = query.strip().casefold()
+        if not key:
+            return []
+        results = []
+
+        def collect(k):
+            targets = self._targets[k]
+            for kind in _KIND_ORDER:
+                if kind in targets:
+                    for target, text in islice(targets[kind].items(), limit - len(results)):
+                        results.append((kind, text, target))
+
+        keys = self._keys
+        i = bisect_left(keys, key)
+        while i < len(keys) and keys[i].startswith(key) and len(results) < limit:
+            collect(keys[i])
+            i += 1
+
+        if len(results) < limit:
+            for k in self._substring_keys(key):
+                if not k.startswith(key):
+                    collect(k)
+                    if len(results) >= limit:
+                        break
+        return results
@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+# Модули редактора импортируются по имени файла (как при запуске Editor.py из его каталога)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="session")
+def qapp(): #Приложение Qt для тестов сцены (без экрана)
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
@@ -0,0 +1,182 @@
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from PyQt5.QtCore import QPointF
+from PyQt5.QtTest import QTest
+
+from Editor import AUTOSAVE_DELAY_MS, ConnectionItem, EquipmentScene, port_type_color
+from schema_binary import binary_file_path, save_binary
+from schema_model import DEFAULT_STYLE, SchemaModel, schema_file_path
+
+PORTS = [{'type': "Eth"}] * 4
+
+@pytest.fixture
+def scene(qapp, tmp_path, monkeypatch):
+    scene = EquipmentScene()
+    scene.schema_path = str(tmp_path)
+    scene.writes = []
+
+    def write_snapshot(schema_file, schema):
+        scene.writes.append(schema)
+        EquipmentScene._write_snapshot(schema_file, schema)
+
+    monkeypatch.setattr(scene, "_write_snapshot", write_snapshot)
+    yield scene
+    scene.wait_for_save()
+    scene.clear_schema()
+
+def _chain(scene, count=5): #Устройства в ряд, соседние соединены
+    items = [scene.add_equipment_instance(f"d{i}", "Switch", PORTS, pos=QPointF(i * 400, 0)) for i in range(count)]
+    for first, second in zip(items, items[1:]):
+        scene.add_connection(first.port_items[1], second.port_items[0], dict(DEFAULT_STYLE))
+    return items
+
+def _settle(scene): #Дожидается автосохранения
+    QTest.qWait(AUTOSAVE_DELAY_MS + 200)
+    scene.wait_for_save()
+
+def test_autosave_coalesces_changes(scene):
+    _chain(scene)
+    assert scene.writes == []
+    _settle(scene)
+    assert len(scene.writes) == 1
+    assert len(scene.writes[0]["instances"]) == 5 and len(scene.writes[0]["connections"]) == 4
+    _settle(scene)
+    assert len(scene.writes) == 1
+
+def _write_schema(path, count=40): #Схема на диске: устройства в ряд, соседние соединены
+    model = SchemaModel()
+    devices = [model.add_device(f"d{i}", "Switch", ["Eth"] * 4, (i % 10) * 400, (i // 10) * 300) for i in range(count)]
+    for first, second in zip(devices, devices[1:]):
+        model.add_connection(first.ports[1], second.ports[0])
+    model.save_json(schema_file_path(path))
+    return model
+
+def test_load_schema_does_not_autosave(scene):
+    model = _write_schema(scene.schema_path)
+    scene.load_schema(scene.schema_path)
+    assert len(scene.device_items) == len(model.devices)
+    assert len(scene.connection_items) == len(model.connections)
+    _settle(scene)
+    assert scene.writes == []
+
+def test_bulk_update_saves_once_at_the_end(scene):
+    _write_schema(scene.schema_path)
+    scene.load_schema(scene.schema_path)
+    with scene.bulk_update():
+        for record in list(scene.model.devices.values())[:10]:
+            scene.delete_equipment_item(scene.device_items[record])
+        QTest.qWait(AUTOSAVE_DELAY_MS + 200)
+        assert scene.writes == []
+    _settle(scene)
+    assert len(scene.writes) == 1 and len(scene.writes[0]["instances"]) == 30
+
+def _assert_consistent(scene): #Элементы сцены и индексы модели описывают одни и те же записи
+    model = scene.model
+    assert set(scene.device_items) == set(model.devices.values())
+    assert set(scene.connection_items) == set(model.connections)
+    assert set(model.device_grid.rects) == set(model.devices.values())
+    assert set(model.port_connections) == {port for c in model.connections for port in (c.start, c.end)}
+    assert set(model.device_pair_connections.values()) == set(model.connections)
+    scene_items = set(scene.items())
+    assert all(item in scene_items for item in scene.device_items.values())
+    assert all(item in scene_items for item in scene.connection_items.values())
+
+def test_delete_device_keeps_indexes_consistent(scene):
+    items = _chain(scene)
+    middle = items[2]
+    record = middle.record
+    x, y = record.port_position(record.ports[0])
+    scene.delete_equipment_item(middle)
+
+    assert middle.scene() is None
+    assert scene.port_item_at(QPointF(x, y)) is None
+    assert scene.model.devices_in_rect(SchemaModel.device_rect(record)) == set()
+    assert scene.model.connection_between(items[1].record, record) is None
+    _assert_consistent(scene)
+    assert len(scene.connection_items) == 2
+
+    scene.undo()
+    _assert_consistent(scene)
+    assert scene.port_item_at(QPointF(x, y)).record is record.ports[0]
+    assert scene.get_connection_between(items[1], scene.device_items[record]) is not None
+
+def test_moved_devices_are_flushed_once_per_frame(scene, qapp, monkeypatch):
+    items = _chain(scene)
+    updates = []
+    original = ConnectionItem.update_path
+
+    def update_path(item):
+        updates.append(item)
+        original(item)
+
+    monkeypatch.setattr(ConnectionItem, "update_path", update_path)
+
+    middle = items[2]
+    for step in range(1, 6):
+        middle.setPos(800 + step * 10, step * 20)
+    assert updates == []
+    assert (middle.record.x, middle.record.y) == (850, 100)
+
+    qapp.processEvents()
+    links = {scene.get_connection_between(items[1], middle), scene.get_connection_between(middle, items[3])}
+    assert len(updates) == 2 and set(updates) == links
+    end = scene.get_connection_between(items[1], middle).path().currentPosition()
+    assert end == middle.port_items[0].scenePos()
+
+def _state(model): #Состав схемы без учета порядка записей
+    return ({d.name: (d.x, d.y) for d in model.devices.values()},
+            {(c.start.unique_id, c.end.unique_id) for c in model.connections})
+
+def test_delete_selection_is_one_undo_step(scene):
+    items = _chain(scene, 8)
+    before = _state(scene.model)
+    history = len(scene.history)
+    for item in items[2:5]:
+        item.setSelected(True)
+    scene.get_connection_between(items[6], items[7]).setSelected(True)
+
+    scene.delete_selection()
+    assert sorted(r.name for r in scene.model.devices.values()) == ["d0", "d1", "d5", "d6", "d7"]
+    assert len(scene.model.connections) == 2
+    assert len(scene.history) == history + 1
+    _assert_consistent(scene)
+
+    scene.undo()
+    assert _state(scene.model) == before
+    _assert_consistent(scene)
+    scene.redo()
+    assert len(scene.model.devices) == 5 and len(scene.model.connections) == 2
+    _assert_consistent(scene)
+
+def test_collapsed_group_has_no_member_items(scene, tmp_path):
+    items = _chain(scene, 6)
+    members = [item.record for item in items[1:4]]
+    group = scene.group_records("rack", members)
+    scene.set_group_collapsed(group, True)
+
+    assert not any(record in scene.device_items for record in members)
+    assert [(c.start.device.name, c.end.device.name) for c in scene.connection_items] == [("d4", "d5")]
+    assert list(scene.group_items) == [group] and not scene.group_frames
+    assert sorted(len(link.connections) for link in scene.group_link_items) == [1, 1]
+
+    # Свернутая группа сохраняется в двоичный файл и открывается снова свернутой
+    packed = tmp_path / "packed"
+    packed.mkdir()
+    save_binary(scene.model, binary_file_path(str(packed)))
+    scene.load_schema(str(packed))
+    loaded = scene.model.groups["rack"]
+    assert loaded.collapsed and [d.name for d in loaded.members] == ["d1", "d2", "d3"]
+    assert sorted(record.name for record in scene.device_items) == ["d0", "d4", "d5"]
+    assert list(scene.group_items) == [loaded]
+
+    scene.set_group_collapsed(loaded, False)
+    assert len(scene.device_items) == 6 and len(scene.connection_items) == 5
+    assert list(scene.group_frames) == [loaded] and not scene.group_link_items
+
+def test_port_colour_depends_on_type_only(scene):
+    item = scene.add_equipment_instance("mixed", "Switch", [{'type': "Eth"}, {'type': "Fiber"}, {'type': "Eth"}],
+                                        pos=QPointF(0, 0))
+    colours = [port.brush().color() for port in item.port_items]
+    assert colours == [port_type_color("Eth"), port_type_color("Fiber"), port_type_color("Eth")]
@@ -0,0 +1,48 @@
+from schema_model import SchemaModel
+
+def _chain(count=5):
+    model = SchemaModel()
+    for i in range(count):
+        model.add_device(f"d{i}", "Switch", ["Eth", "Eth", "Pipe"], i * 300, 0)
+    graph = model.enable_analytics()
+    devices = list(model.devices.values())
+    for first, second in zip(devices, devices[1:]):
+        model.add_connection(first.ports[1], second.ports[0])
+    return model, graph, devices
+
+def test_components_merge_and_split():
+    model, graph, d = _chain()
+    assert [len(c) for c in graph.components()] == [5]
+    middle = model.connection_between(d[1], d[2])
+    model.remove_connection(middle)
+    assert [sorted(x.name for x in c) for c in graph.components()] == [["d2", "d3", "d4"], ["d0", "d1"]]
+    assert not graph.connected(d[0], d[4])
+
+    model.insert_connection(middle)
+    assert graph.connected(d[0], d[4])
+    model.remove_device(d[2])
+    assert sorted(len(c) for c in graph.components()) == [2, 2]
+    assert graph.component_of(d[3]) == {d[3], d[4]}
+
+def test_shortest_path_and_downstream():
+    model, graph, d = _chain()
+    assert graph.shortest_path(d[0], d[3]) == d[:4]
+    assert graph.shortest_path(d[3], d[0]) == d[3::-1]
+    assert graph.shortest_path(d[3], d[0], directed=True) is None
+    assert graph.downstream(d[2]) == {d[3], d[4]}
+    assert graph.downstream(d[4]) == frozenset()
+
+    model.remove_connection(model.connection_between(d[2], d[3]))
+    assert graph.shortest_path(d[0], d[3]) is None
+    assert graph.downstream(d[2]) == frozenset()
+
+def test_port_utilization():
+    model, graph, d = _chain(3)
+    assert graph.port_utilization() == {'Eth': (4, 2), 'Pipe': (0, 3)}
+    model.remove_device(d[0])
+    assert graph.port_utilization() == {'Eth': (2, 2), 'Pipe': (0, 2)}
+
+def test_analytics_built_for_existing_model():
+    model, _, _ = _chain(4)
+    rebuilt = SchemaModel.from_dict(model.to_dict()).enable_analytics()
+    assert [len(c) for c in rebuilt.components()] == [4]
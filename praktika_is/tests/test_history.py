@@ -0,0 +1,91 @@
+from history import AddDevice, CommandGroup, MoveDevices, RemoveDevice, RestyleConnection, UndoStack
+from schema_model import SchemaModel
+
+class ModelTarget: #Цель команд без сцены: изменения применяются прямо к модели
+    def __init__(self, model):
+        self.model = model
+        self.calls = []
+
+    def insert_device(self, device):
+        self.calls.append("insert_device")
+        self.model.insert_device(device)
+
+    def remove_device(self, device):
+        self.calls.append("remove_device")
+        self.model.remove_device(device)
+
+    def insert_connection(self, connection):
+        self.model.insert_connection(connection)
+
+    def remove_connection(self, connection):
+        self.model.remove_connection(connection)
+
+    def move_devices(self, positions):
+        for device, (x, y) in positions.items():
+            self.model.move_device(device, x, y)
+
+    def restyle_connection(self, connection, style):
+        self.model.set_connection_style(connection, style)
+
+def _target():
+    model = SchemaModel()
+    model.add_device("a", "Switch", ["Eth", "Eth"], 0, 0)
+    model.add_device("b", "Switch", ["Eth", "Eth"], 500, 0)
+    return ModelTarget(model)
+
+def test_remove_device_restores_connections():
+    target = _target()
+    model = target.model
+    a = model.devices["a"]
+    connection = model.add_connection(a.ports[0], model.devices["b"].ports[0])
+    stack = UndoStack()
+    stack.push(RemoveDevice(a, model.remove_device(a)))
+
+    assert stack.undo(target) is not None
+    assert model.devices["a"] is a
+    assert model.connection_for_port(a.ports[0]) is connection
+    stack.redo(target)
+    assert "a" not in model.devices and not model.connections
+    assert stack.redo(target) is None
+
+def test_group_undo_order_and_redo_reset():
+    target = _target()
+    model = target.model
+    a, b = model.devices["a"], model.devices["b"]
+    connection = model.add_connection(a.ports[0], b.ports[0])
+    old_style = connection.style()
+    model.move_device(a, 100, 100)
+    model.set_connection_style(connection, dict(old_style, color="#ff0000"))
+    stack = UndoStack()
+    stack.push(CommandGroup([MoveDevices({a: (0, 0, 100, 100)}),
+                             RestyleConnection(connection, old_style, connection.style())]))
+
+    stack.undo(target)
+    assert (a.x, a.y) == (0, 0) and connection.color == old_style['color']
+    stack.redo(target)
+    assert (a.x, a.y) == (100, 100) and connection.color == "#ff0000"
+
+    stack.undo(target)
+    assert stack.can_redo()
+    device = model.add_device("c", "Switch", ["Eth"], 0, 500)
+    stack.push(AddDevice(device))
+    assert not stack.can_redo()
+    stack.undo(target)
+    assert "c" not in model.devices and target.calls == ["remove_device"]
+
+def test_depth_and_memory_limits():
+    target = _target()
+    a = target.model.devices["a"]
+    stack = UndoStack(depth=3)
+    for i in range(5):
+        stack.push(MoveDevices({a: (i, 0, i + 1, 0)}))
+    assert len(stack) == 3
+    stack.undo(target)
+    assert a.x == 4
+
+    small = UndoStack(memory_limit=MoveDevices({a: (0, 0, 0, 0)}).size() * 2)
+    for i in range(5):
+        small.push(MoveDevices({a: (i, 0, i + 1, 0)}))
+    assert len(small) == 2 and small.memory <= small.memory_limit
+    small.clear()
+    assert small.memory == 0 and not small.can_undo()
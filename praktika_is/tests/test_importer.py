@@ -0,0 +1,91 @@
+import pytest
+
+from importer import TABLE_CONNECTIONS, TABLE_DEVICES, TABLE_NETLIST, import_files, table_kind
+from schema_model import SchemaModel
+
+TYPES = {'Switch': ["Eth", "Eth", "Eth"], 'Pump': ["Pipe", "Pipe"]}
+
+def _write(path, text, encoding="utf-8"):
+    path.write_text(text, encoding=encoding)
+    return str(path)
+
+def test_table_kind(tmp_path):
+    devices = _write(tmp_path / "devices.csv", "name,type\ns1,Switch\n")
+    connections = _write(tmp_path / "links.csv", "from;to;from_port;to_port\n")
+    netlist = _write(tmp_path / "plant.net", "s1:Eth s2:Eth\n")
+    assert table_kind(devices) == TABLE_DEVICES
+    assert table_kind(connections) == TABLE_CONNECTIONS
+    assert table_kind(netlist) == TABLE_NETLIST
+
+def test_devices_and_rejects(tmp_path):
+    model = SchemaModel()
+    model.add_device("old", "Switch", TYPES['Switch'], 0, 0)
+    devices = _write(tmp_path / "devices.csv", "\n".join([
+        "name,type,ports,x,y",
+        "s1,Switch,,0,300",
+        "s2,Switch,,,",
+        "old,Switch,,10,10",  # уже есть в модели
+        "p1,Pump,Eth Eth,,",  # порты не совпадают с типом
+        "x1,Unknown,,,",  # неизвестный тип без столбца ports
+        "s3,Switch,,abc,1",  # неверные координаты
+        ",Switch,,,",  # нет имени
+        "c1,Custom,A B,5,5",  # неизвестный тип с явными портами
+    ]) + "\n")
+    result = import_files(model, [devices], TYPES, place=lambda model, devices: {d: (1000, 1000) for d in devices})
+    assert [device.name for device in result.devices] == ["s1", "s2"]
+    assert [line for _, line, _ in result.rejects] == [4, 5, 6, 7, 8, 9]
+    assert all(filename == "devices.csv" for filename, _, _ in result.rejects)
+    assert "неизвестный тип" in result.rejects[-1][2]
+    assert (model.devices["s2"].x, model.devices["s2"].y) == (1000, 1000)
+
+def test_explicit_ports_without_type_library(tmp_path):
+    model = SchemaModel()
+    devices = _write(tmp_path / "devices.csv", "name,type,ports,x,y\nc1,Custom,A B,5,5\nc2,Custom,,5,5\n")
+    result = import_files(model, [devices])
+    assert [device.name for device in result.devices] == ["c1"]
+    assert [port.port_type for port in model.devices["c1"].ports] == ["A", "B"]
+    assert [line for _, line, _ in result.rejects] == [3]
+
+def test_connections_and_netlist(tmp_path):
+    model = SchemaModel()
+    for name in ("s1", "s2", "s3"):
+        model.add_device(name, "Switch", TYPES['Switch'], 0, 0)
+    model.add_device("p1", "Pump", TYPES['Pump'], 0, 0)
+    connections = _write(tmp_path / "links.csv", "\n".join([
+        "from,to,from_port,to_port,to_port_index,name,width",
+        "s1,s2,Eth,Eth,,uplink,3",
+        "s1,s2,Eth,Eth,,,",  # устройства уже соединены
+        "s1,p1,Eth,Pipe,,,",  # у s1 нет портов Pipe
+        "s1,s3,Eth,Eth,7,,",  # нет порта с таким номером
+        "s1,zz,Eth,Eth,,,",  # нет устройства
+    ]) + "\n")
+    netlist = _write(tmp_path / "plant.net", "# комментарий\ns2:Eth s3:Eth:2 trunk\ns3:Eth\n")
+    result = import_files(model, [connections, netlist])
+    assert [c.name for c in result.connections] == ["uplink", "trunk"]
+    assert result.connections[0].width == 3
+    assert result.connections[1].end.index == 2
+    assert [(f, line) for f, line, _ in result.rejects] == [
+        ("links.csv", 3), ("links.csv", 4), ("links.csv", 5), ("links.csv", 6), ("plant.net", 3)]
+
+def test_read_error_rolls_back_whole_import(tmp_path):
+    model = SchemaModel()
+    rows = "".join(f"d{i},Switch,,{i * 10},0\n" for i in range(500))  # больше образца для определения формата
+    path = tmp_path / "devices.csv"
+    path.write_bytes(("name,type,ports,x,y\n" + rows).encode("utf-8") + b"bad,\xff\xfe,,1,1\n")
+    with pytest.raises(UnicodeDecodeError):
+        import_files(model, [str(path)], TYPES)
+    assert not model.devices
+    assert not model.device_grid.bounds()
+
+def test_read_error_removes_imported_connections(tmp_path):
+    model = SchemaModel()
+    model.add_device("a", "Switch", TYPES['Switch'], 0, 0)
+    model.add_device("b", "Switch", TYPES['Switch'], 0, 0)
+    devices = _write(tmp_path / "devices.csv", "name,type\nc,Switch\n")
+    netlist = tmp_path / "plant.net"
+    netlist.write_bytes(b"a:Eth b:Eth\nc:Eth a:Eth\n\xff\n")
+    with pytest.raises(UnicodeDecodeError):
+        import_files(model, [devices, str(netlist)], TYPES)
+    assert sorted(model.devices) == ["a", "b"]
+    assert not model.connections
+    assert not model.port_connections
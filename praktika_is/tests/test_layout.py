@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from layout import force_directed_layout, layered_layout, place_new_devices
+from schema_model import SchemaModel
+
+def _model(count=30):
+    model = SchemaModel()
+    for i in range(count):
+        model.add_device(f"d{i}", "Switch", ["Eth", "Eth", "Eth", "Eth"], 0, 0)
+    devices = list(model.devices.values())
+    for i in range(1, count):
+        parent = devices[(i - 1) // 3]
+        port = next(p for p in parent.ports[1:] if p not in model.port_connections)
+        model.add_connection(port, devices[i].ports[0])
+    return model
+
+def _overlaps(model, positions):
+    rects = [SchemaModel.device_rect_at(x, y) for x, y in positions.values()]
+    return [(a, b) for i, a in enumerate(rects) for b in rects[i + 1:]
+            if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]]
+
+@pytest.mark.parametrize("layout", [force_directed_layout, layered_layout])
+def test_layout_has_no_overlaps(layout):
+    model = _model()
+    positions = layout(model)
+    assert set(positions) == set(model.devices.values())
+    assert not _overlaps(model, positions)
+
+def test_layered_layout_goes_left_to_right():
+    model = _model()
+    positions = layered_layout(model)
+    for connection in model.connections:
+        assert positions[connection.start.device][0] < positions[connection.end.device][0]
+
+def test_place_new_devices_keeps_placed():
+    model = _model()
+    for device, (x, y) in force_directed_layout(model).items():
+        model.move_device(device, x, y)
+    before = {device: (device.x, device.y) for device in model.devices.values()}
+    new = [model.add_device(f"n{i}", "Switch", ["Eth"], 0, 0) for i in range(5)]
+    leaf = next(d for d in model.devices.values() if d in before and d.ports[3] not in model.port_connections)
+    model.add_connection(leaf.ports[3], new[0].ports[0])
+
+    positions = place_new_devices(model, new)
+    assert set(positions) == set(new)
+    assert all((device.x, device.y) == xy for device, xy in before.items())
+    assert not _overlaps(model, {**before, **positions})
+    assert place_new_devices(model, []) == {}
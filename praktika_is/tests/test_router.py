@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+from router import (
+    ROUTE_MAX_EXPANDED, OrthogonalRouter, RouteLimitExceeded, dogleg, find_path
+)
+from schema_model import DEFAULT_STYLE, LINE_STYLE_POLYLINE, SchemaModel
+
+def _polyline():
+    return dict(DEFAULT_STYLE, line_style=LINE_STYLE_POLYLINE)
+
+def _crosses(points, box): #Проходит ли ломаная через внутренность прямоугольника
+    x0, y0, x1, y1 = box
+    for (ax, ay), (bx, by) in zip(points, points[1:]):
+        if ay == by and y0 < ay < y1 and min(ax, bx) < x1 and max(ax, bx) > x0:
+            return True
+        if ax == bx and x0 < ax < x1 and min(ay, by) < y1 and max(ay, by) > y0:
+            return True
+    return False
+
+def test_find_path_goes_around_obstacle():
+    box = (100, -50, 200, 50)
+    path, expanded = find_path((0, 0), (300, 0), [box], (-100, -200, 400, 200))
+    assert path[0] == (0, 0) and path[-1] == (300, 0)
+    assert not _crosses(path, box)
+    assert 0 < expanded <= ROUTE_MAX_EXPANDED
+
+def test_find_path_respects_node_budget():
+    obstacles = [(x, y, x + 40, y + 40) for x in range(0, 2000, 100) for y in range(0, 2000, 100)]
+    with pytest.raises(RouteLimitExceeded):
+        find_path((-50, -50), (2050, 2050), obstacles, (-100, -100, 2100, 2100), max_expanded=50)
+
+def test_find_path_respects_grid_limit():
+    obstacles = [(x, y, x + 40, y + 40) for x in range(0, 2000, 100) for y in range(0, 2000, 100)]
+    with pytest.raises(RouteLimitExceeded):
+        find_path((-50, -50), (2050, 2050), obstacles, (-100, -100, 2100, 2100), max_cells=100)
+
+def _dense_model(devices=200, connections=120, seed=1): #Случайная плотная раскладка с ломаными соединениями
+    rng = random.Random(seed)
+    model = SchemaModel()
+    records = [model.add_device(f"d{i}", "T", ["X"] * 6, rng.uniform(0, 3000), rng.uniform(0, 2000))
+               for i in range(devices)]
+    free = [port for record in records for port in record.ports]
+    rng.shuffle(free)
+    while len(model.connections) < connections and len(free) >= 2:
+        start, end = free.pop(), free.pop()
+        if start.device is not end.device and model.connection_between(start.device, end.device) is None:
+            model.add_connection(start, end, _polyline())
+    return model
+
+def test_dense_layout_routes_within_node_budget():
+    model = _dense_model()
+    router = OrthogonalRouter(model)
+    for conn in list(model.connections):
+        before = router.expanded_nodes
+        points = router.route(conn)
+        assert router.expanded_nodes - before <= ROUTE_MAX_EXPANDED + 1
+        assert points[0] == conn.start.device.port_position(conn.start)
+        assert points[-1] == conn.end.device.port_position(conn.end)
+    assert router.route_count == len(model.connections)
+
+def test_limit_falls_back_to_dogleg(monkeypatch):
+    import router as router_module
+    monkeypatch.setattr(router_module, "ROUTE_MAX_EXPANDED", 1)
+    model = _dense_model(devices=60, connections=10)
+    router = OrthogonalRouter(model)
+    conn = next(iter(model.connections))
+    points = router.route(conn)
+    start = conn.start.device.port_position(conn.start)
+    end = conn.end.device.port_position(conn.end)
+    assert router.limit_fallbacks == 1
+    assert points == dogleg(start, end)
+
+def test_moved_obstacle_invalidates_route():
+    model = SchemaModel()
+    first = model.add_device("A", "T", ["X", "X"], 0, 0)
+    second = model.add_device("B", "T", ["X", "X"], 600, 0)
+    middle = model.add_device("C", "T", ["Y"], 300, 0)
+    conn = model.add_connection(first.ports[1], second.ports[0], _polyline())
+    router = OrthogonalRouter(model)
+    router.route(conn)
+    assert conn in router.routes
+    assert conn in router.devices_changed([middle])
+    assert conn not in router.routes
+
+def test_device_moved_onto_dogleg_invalidates_route(monkeypatch):
+    import router as router_module
+    monkeypatch.setattr(router_module, "ROUTE_MAX_EXPANDED", 1)
+    model = SchemaModel()
+    first = model.add_device("A", "T", ["X", "X"], 0, 0)
+    second = model.add_device("B", "T", ["X", "X"], 1000, 600)
+    other = model.add_device("C", "T", ["Y"], 3000, 3000)
+    conn = model.add_connection(first.ports[1], second.ports[0], _polyline())
+    router = OrthogonalRouter(model)
+    points = router.route(conn)
+    assert router.limit_fallbacks == 1 and len(points) == 4
+
+    assert conn not in router.devices_changed([other])
+    model.move_device(other, points[1][0] - 50, 200)
+    assert conn in router.devices_changed([other])
+    assert conn not in router.routes and conn not in router.corridors.rects
@@ -0,0 +1,84 @@
+import pytest
+
+from schema_binary import HEADER, HEADER_V1, load_binary, save_binary
+from schema_model import SchemaModel
+
+def _model():
+    model = SchemaModel()
+    for i in range(6):
+        model.add_device(f"d{i}", "Switch", ["Eth", "Eth", "Pipe"], i * 100, 50)
+    model.add_connection(model.devices["d0"].ports[0], model.devices["d1"].ports[0],
+                         {'name': "uplink", 'color': "#ff0000", 'width': 2.5})
+    model.add_connection(model.devices["d1"].ports[1], model.devices["d2"].ports[0])
+    return model
+
+def _grouped_model():
+    model = _model()
+    rack = model.add_group("rack", [model.devices["d0"], model.devices["d1"]])
+    room = model.add_group("room", [model.devices["d2"]], [rack], collapsed=True)
+    model.add_group("empty", [model.devices["d5"]])
+    model.remove_device(model.devices["d5"])  # группа без устройств не сохраняется
+    assert rack.parent is room
+    return model
+
+def _groups(model):
+    return {name: (group.parent.name if group.parent else None, [d.name for d in group.members], group.collapsed)
+            for name, group in model.groups.items()}
+
+def test_round_trip(tmp_path):
+    model = _model()
+    path = str(tmp_path / "plant.schb")
+    save_binary(model, path)
+    loaded = load_binary(path)
+    assert loaded.to_dict() == model.to_dict()
+    uplink, plain = loaded.connections
+    assert uplink.width == 2.5
+    assert isinstance(plain.width, int)
+
+def test_groups_round_trip(tmp_path):
+    model = _grouped_model()
+    path = str(tmp_path / "plant.schb")
+    save_binary(model, path)
+    loaded = load_binary(path)
+    assert _groups(loaded) == {'room': (None, ["d2"], True), 'rack': ("room", ["d0", "d1"], False)}
+    assert loaded.devices["d0"].group is loaded.groups["rack"]
+    assert loaded.to_dict() == model.to_dict()
+
+def test_groups_json_round_trip():
+    model = _grouped_model()
+    loaded = SchemaModel.from_dict(model.to_dict())
+    assert _groups(loaded) == {'room': (None, ["d2"], True), 'rack': ("room", ["d0", "d1"], False)}
+
+def test_groups_from_dict_errors():
+    schema = _model().to_dict()
+    schema["groups"] = [
+        {'name': "a", 'parent': None, 'devices': ["d0", "missing"]},
+        {'name': "b", 'parent': "nope", 'devices': ["d0", "d1"]},
+        {'name': "a", 'devices': ["d2"]},
+        {'devices': ["d3"]},
+    ]
+    errors = []
+    model = SchemaModel.from_dict(schema, errors)
+    assert _groups(model) == {'a': (None, ["d0"], False), 'b': (None, ["d1"], False)}
+    assert len(errors) == 5
+
+def test_reads_version_1(tmp_path):
+    model = _model()
+    path = tmp_path / "plant.schb"
+    save_binary(model, str(path))
+    data = path.read_bytes()
+    # Заголовок версии 1: без счетчиков и смещений групп, секции сдвигаются
+    values = HEADER.unpack_from(data, 0)
+    shift = HEADER.size - HEADER_V1.size
+    header = HEADER_V1.pack(values[0], 1, *values[2:7], *(offset - shift for offset in values[9:14]))
+    path.write_bytes(header + data[HEADER.size:])
+    assert load_binary(str(path)).to_dict() == model.to_dict()
+
+def test_unknown_format(tmp_path):
+    path = tmp_path / "plant.schb"
+    path.write_bytes(b"JUNK" + bytes(100))
+    with pytest.raises(ValueError):
+        load_binary(str(path))
+    path.write_bytes(b"SCHB")
+    with pytest.raises(ValueError):
+        load_binary(str(path))
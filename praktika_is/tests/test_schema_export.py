@@ -0,0 +1,63 @@
+import os
+import re
+import struct
+import zlib
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from PyQt5.QtCore import QRectF, Qt
+from PyQt5.QtGui import QBrush, QColor, QImage, QPen
+from PyQt5.QtWidgets import QGraphicsScene
+
+import schema_export
+from schema_export import _adler32_combine, _png_chunk, export_pdf, export_svg, page_layout, paginate
+
+@pytest.mark.parametrize("parts", [[b"", b"abc"], [b"abc", b""], [b"a" * 70000, bytes(range(256)) * 300, b"xyz"]])
+def test_adler32_combine(parts):
+    adler = 1
+    for part in parts:
+        adler = _adler32_combine(adler, zlib.adler32(part), len(part))
+    assert adler == zlib.adler32(b"".join(parts))
+
+def test_png_chunk():
+    chunk = _png_chunk(b"IEND", b"")
+    assert chunk == b"\0\0\0\0IEND" + struct.pack(">I", zlib.crc32(b"IEND"))
+    chunk = _png_chunk(b"tEXt", b"key\0value")
+    assert struct.unpack(">I", chunk[:4])[0] == 9
+    assert chunk[-4:] == struct.pack(">I", zlib.crc32(b"tEXtkey\0value"))
+
+@pytest.fixture
+def scene(qapp):
+    scene = QGraphicsScene()
+    scene.addRect(QRectF(0, 0, 3000, 1500), QPen(Qt.NoPen), QBrush(Qt.white))
+    scene.addRect(QRectF(100, 200, 300, 150), QPen(Qt.NoPen), QBrush(Qt.red))
+    return scene
+
+def test_png_export_in_strips(scene, tmp_path, monkeypatch):
+    monkeypatch.setattr(schema_export, "STRIP_PIXELS", 500 * 37)  # полоса в 37 строк, 14 полос
+    path = str(tmp_path / "part.png")
+    assert schema_export.export_png(scene, path, QRectF(0, 0, 500, 500), jobs=3) == (500, 500)
+
+    image = QImage(path)
+    assert not image.isNull() and (image.width(), image.height()) == (500, 500)
+    assert QColor(image.pixel(250, 275)) == QColor("red")
+    assert QColor(image.pixel(50, 50)) == QColor("white")
+    assert QColor(image.pixel(250, 450)) == QColor("white")
+    assert QColor(image.pixel(99, 275)) == QColor("white") and QColor(image.pixel(101, 275)) == QColor("red")
+
+def test_pdf_and_svg_pagination(scene, tmp_path):
+    rect = QRectF(0, 0, 3000, 1500)
+    pages, _ = paginate(rect, page_layout("A4"))
+    assert len(pages) == 9  # лист A4 вмещает около 1047 x 718 точек сцены
+    assert sum(page.width() * page.height() for page in pages) == pytest.approx(rect.width() * rect.height())
+
+    path = tmp_path / "big.pdf"
+    assert export_pdf(scene, str(path), rect) == 9
+    assert len(re.findall(rb"/Type\s*/Page\b", path.read_bytes())) == 9
+    assert export_pdf(scene, str(tmp_path / "small.pdf"), QRectF(0, 0, 500, 500)) == 1
+
+    paths = export_svg(scene, str(tmp_path / "big.svg"), rect, page="A3")
+    assert len(paths) == len(paginate(rect, page_layout("A3"))[0]) == 4
+    assert all(os.path.getsize(p) for p in paths)
@@ -0,0 +1,89 @@
+import pytest
+
+from schema_model import SchemaError, SchemaModel, SpatialGrid
+
+def _model():
+    model = SchemaModel()
+    model.add_device("s1", "Switch", ["Eth", "Eth", "Eth"], 0, 0)
+    model.add_device("s2", "Switch", ["Eth", "Eth", "Eth"], 1000, 0)
+    model.add_device("p1", "Pump", ["Pipe", "Pipe"], 0, 1000)
+    return model
+
+def test_add_and_remove_device():
+    model = _model()
+    s1 = model.devices["s1"]
+    assert model.ports["s1_Eth_2"] is s1.ports[2]
+    assert model.devices_in_rect((-10, -10, 10, 10)) == {s1}
+    assert model.ports_near(*s1.port_position(s1.ports[1]), 1) == [s1.ports[1]]
+    with pytest.raises(SchemaError):
+        model.add_device("s1", "Switch", ["Eth"], 0, 0)
+
+    connection = model.add_connection(s1.ports[0], model.devices["s2"].ports[0])
+    assert model.remove_device(s1) == [connection]
+    assert "s1_Eth_0" not in model.ports
+    assert not model.connections and not model.port_connections and not model.device_pair_connections
+    assert not model.devices_in_rect((-10, -10, 10, 10))
+    assert model.ports_near(*s1.port_position(s1.ports[1]), 1) == []
+
+def test_connection_indexes_and_errors():
+    model = _model()
+    s1, s2 = model.devices["s1"], model.devices["s2"]
+    connection = model.add_connection(s1.ports[0], s2.ports[1], {'name': "uplink"})
+    assert model.connection_for_port(s2.ports[1]) is connection
+    assert model.connection_between(s2, s1) is connection
+    assert model.device_connections(s1) == [connection]
+    assert connection.other_port(s1.ports[0]) is s2.ports[1]
+    for start, end in ((s1.ports[1], s1.ports[2]), (s1.ports[1], s2.ports[2]), (s1.ports[0], model.devices["p1"].ports[0])):
+        with pytest.raises(SchemaError):
+            model.add_connection(start, end)
+
+    model.remove_connection(connection)
+    assert model.connection_between(s1, s2) is None
+    assert model.connection_for_port(s1.ports[0]) is None
+
+def test_move_device_updates_grids():
+    model = _model()
+    s1 = model.devices["s1"]
+    model.move_device(s1, 5000, 5000)
+    assert not model.devices_in_rect((-10, -10, 10, 10))
+    assert model.devices_in_rect((5000, 5000, 5001, 5001)) == {s1}
+    assert model.ports_near(*s1.port_position(s1.ports[0]), 1) == [s1.ports[0]]
+
+def test_dict_round_trip():
+    model = _model()
+    model.add_connection(model.devices["s1"].ports[0], model.devices["s2"].ports[0], {'color': "#00ff00"})
+    schema = model.to_dict()
+    errors = []
+    loaded = SchemaModel.from_dict(schema, errors)
+    assert not errors
+    assert loaded.to_dict() == schema
+    assert [c.color for c in loaded.connections] == ["#00ff00"]
+
+def test_legacy_connections_and_errors():
+    schema = _model().to_dict()
+    schema["instances"].append({'name': "broken"})
+    schema["instances"].append({'name': "loose", 'type': "Switch", 'ports': [{'type': "Eth"}]})
+    schema["connections"] = [
+        {'from': "s1", 'to': "s2", 'from_port': "Eth", 'to_port': "Eth", 'to_port_index': 2},
+        {'from': "s1", 'to': "s2", 'from_port': "Eth", 'to_port': "Eth", 'from_port_index': 1},  # уже соединены
+        {'from': "s1", 'to': "p1", 'from_port': "Eth", 'to_port': "Eth"},  # у p1 нет портов Eth
+        {'from_port_id': "s2_Eth_1", 'to_port_id': "loose_Eth_0"},
+    ]
+    errors = []
+    model = SchemaModel.from_dict(schema, errors)
+    assert len(errors) == 3
+    assert [(c.start.unique_id, c.end.unique_id) for c in model.connections] == [
+        ("s1_Eth_0", "s2_Eth_2"), ("s2_Eth_1", "loose_Eth_0")]
+    assert model.unplaced == [model.devices["loose"]]
+
+def test_spatial_grid():
+    grid = SpatialGrid(100)
+    grid.insert("a", (0, 0, 50, 50))
+    grid.insert("b", (250, 250, 260, 260))
+    assert grid.query((40, 40, 300, 300)) == {"a", "b"}
+    grid.update("a", (1000, 1000, 1010, 1010))
+    assert grid.query((0, 0, 100, 100)) == set()
+    assert grid.bounds() == (250, 250, 1010, 1010)
+    grid.remove("a")
+    grid.remove("b")
+    assert grid.bounds() is None and not grid.cells
@@ -0,0 +1,87 @@
+import io
+import json
+
+from schema_model import schema_file_path
+from schema_tool import ERROR, WARNING, check_all, check_schema, convert_legacy_connections, print_report
+
+def _instance(name, eq_type="Switch", ports=("Eth", "Eth")):
+    return {'name': name, 'type': eq_type, 'ports': [{'type': port} for port in ports], 'x': 0, 'y': 0}
+
+def _kinds(problems):
+    return sorted(kind for _, kind, _ in problems)
+
+def test_check_schema_problems():
+    schema = {
+        'instances': [_instance("s1"), _instance("s2"), _instance("s1"), _instance("p1", "Pump", ["Pipe"]),
+                      {'name': "bad"}],
+        'connections': [
+            {'from_port_id': "s1_Eth_0", 'to_port_id': "s2_Eth_0"},
+            {'from_port_id': "s1_Eth_1", 'to_port_id': "s2_Eth_1"},  # устройства уже соединены
+            {'from_port_id': "s1_Eth_0", 'to_port_id': "p1_Pipe_0"},  # порт занят, типы разные
+            {'from_port_id': "s1_Eth_1", 'to_port_id': "zz_Eth_0"},
+            "junk",
+        ],
+        'groups': [{'name': "g", 'devices': ["s1", "nope"]}, {'name': "h", 'parent': "x", 'devices': ["s1"]}],
+    }
+    model, problems, legacy = check_schema(schema, {'Switch': ["Eth", "Eth"], 'Pump': ["Pipe", "Pipe"]})
+    assert sorted(model.devices) == ["p1", "s1", "s2"]
+    assert legacy == 0
+    assert _kinds(problems) == sorted([
+        "duplicate_device", "invalid_instance", "ports_mismatch", "duplicate_pair", "type_mismatch",
+        "port_occupied", "dangling_port", "invalid_connection", "unknown_group_device",
+        "unknown_parent_group", "duplicate_group_device"])
+    assert all(severity == ERROR for severity, _, _ in problems)
+
+    _, problems, _ = check_schema({'instances': [_instance("s1", "Router")]}, {'Switch': ["Eth", "Eth"]})
+    assert [(severity, kind) for severity, kind, _ in problems] == [(WARNING, "unknown_type")]
+
+def test_convert_legacy_connections():
+    schema = {
+        'instances': [_instance("s1"), _instance("s2")],
+        'connections': [
+            {'from': "s1", 'to': "s2", 'from_port': "Eth", 'to_port': "Eth", 'to_port_index': 1, 'style': {}},
+            {'from': "s1", 'to': "s9", 'from_port': "Eth", 'to_port': "Eth"},
+        ],
+    }
+    model, problems, legacy = check_schema(schema)
+    assert legacy == 2 and _kinds(problems) == ["dangling_port"]
+    assert convert_legacy_connections(schema, model) == 1
+    assert schema['connections'][0] == {'from': "s1", 'to': "s2", 'style': {},
+                                        'from_port_id': "s1_Eth_0", 'to_port_id': "s2_Eth_1"}
+    assert check_schema(schema)[2] == 1
+
+def test_check_all_writes_converted_schema(tmp_path):
+    path = tmp_path / "plant"
+    path.mkdir()
+    schema = {'instances': [_instance("s1"), _instance("s2")],
+              'connections': [{'from': "s1", 'to': "s2", 'from_port': "Eth", 'to_port': "Eth"}]}
+    (path / "plant.json").write_text(json.dumps(schema), encoding="utf-8")
+    (tmp_path / "broken").mkdir()
+    (tmp_path / "broken" / "broken.json").write_text("{", encoding="utf-8")
+
+    reports = check_all([str(tmp_path)], jobs=1, convert=True)
+    assert [(r['path'], r['converted']) for r in reports] == [(str(tmp_path / "broken"), 0), (str(path), 1)]
+    with open(schema_file_path(str(path)), encoding="utf-8") as f:
+        assert f.read().count("from_port_id") == 1
+    out = io.StringIO()
+    assert print_report(reports, out) == 1
+    assert "Не удалось прочитать схему" in out.getvalue()
+
+def test_invalid_coordinates_are_reported():
+    bad = dict(_instance("s2"), x="abc")
+    model, problems, _ = check_schema({'instances': [_instance("s1"), bad, dict(_instance("s3"), y=[1])]})
+    assert sorted(model.devices) == ["s1"]
+    assert _kinds(problems) == ["invalid_instance", "invalid_instance"]
+
+def test_invalid_legacy_port_index_is_reported():
+    schema = {
+        'instances': [_instance("s1"), _instance("s2")],
+        'connections': [
+            {'from': "s1", 'to': "s2", 'from_port': "Eth", 'to_port': "Eth", 'from_port_index': "1"},
+            {'from': "s1", 'to': "s2", 'from_port': "Eth", 'to_port': "Eth", 'to_port_index': 1},
+        ],
+    }
+    model, problems, legacy = check_schema(schema)
+    assert _kinds(problems) == ["invalid_connection"] and legacy == 1
+    assert convert_legacy_connections(schema, model) == 1
+    assert 'from_port_index' in schema['connections'][0]
@@ -0,0 +1,40 @@
+from schema_model import SchemaModel
+from search_index import MATCH_CONNECTION, MATCH_DEVICE, MATCH_PORT, MATCH_TYPE, SearchIndex
+
+def test_prefix_before_substring():
+    index = SearchIndex()
+    index.add("Pump-1", "p1", MATCH_DEVICE)
+    index.add("MainPump", "p2", MATCH_DEVICE)
+    index.add("pumping", "p3", MATCH_CONNECTION)
+    assert [target for _, _, target in index.search("PUMP")] == ["p1", "p3", "p2"]
+    assert [target for _, _, target in index.search("um")] == ["p2", "p1", "p3"]
+    assert index.search("pump", limit=1) == [(MATCH_DEVICE, "Pump-1", "p1")]
+    assert index.search("  ") == []
+    assert index.search("xyz") == []
+
+def test_remove():
+    index = SearchIndex()
+    index.add("Switch", "s1", MATCH_TYPE)
+    index.add("switch", "s2", MATCH_TYPE)
+    assert len(index) == 1
+    index.remove("Switch", "s1", MATCH_TYPE)
+    assert [target for _, _, target in index.search("swi")] == ["s2"]
+    index.remove("switch", "s2", MATCH_TYPE)
+    assert len(index) == 0 and index.search("itc") == []
+    index.remove("switch", "s2", MATCH_TYPE)  # повторное удаление ничего не делает
+
+def test_model_keeps_index_up_to_date():
+    model = SchemaModel()
+    model.enable_search()
+    s1 = model.add_device("core", "Switch", ["Eth", "Fiber"], 0, 0)
+    s2 = model.add_device("edge", "Switch", ["Eth"], 500, 0)
+    connection = model.add_connection(s1.ports[0], s2.ports[0], {'name': "uplink"})
+    assert {kind for kind, _, _ in model.search.search("e")} == {MATCH_DEVICE, MATCH_PORT}
+    assert model.search.search("link") == [(MATCH_CONNECTION, "uplink", connection)]
+    assert model.search.search("fib") == [(MATCH_PORT, "Fiber", s1.ports[1])]
+
+    model.set_connection_style(connection, {'name': "trunk"})
+    assert model.search.search("uplink") == []
+    assert model.search.search("trunk") == [(MATCH_CONNECTION, "trunk", connection)]
+    model.remove_device(s1)
+    assert model.search.search("core") == [] and model.search.search("trunk") == []